@@ -13,9 +13,11 @@
 '''
 TOSCA exception classes
 '''
+import linecache
 import logging
+import six
 import sys
-import traceback
+import threading
 
 from toscaparser.utils.gettextutils import _
 
@@ -23,6 +25,12 @@ from toscaparser.utils.gettextutils import _
 log = logging.getLogger('tosca-parser')
 
 
+def _restore_exception(cls, state):
+    exception = cls.__new__(cls)
+    exception.__dict__.update(state)
+    return exception
+
+
 class TOSCAException(Exception):
     '''Base exception class for TOSCA
 
@@ -32,18 +40,17 @@ class TOSCAException(Exception):
     '''
 
     _FATAL_EXCEPTION_FORMAT_ERRORS = False
-    _type = None
-    _node = None
 
     message = _('An unknown exception occurred.')
 
     def __init__(self, **kwargs):
         try:
+            context = ExceptionCollector.get_context()
             msg_prefix = ''
-            if TOSCAException._node:
-                msg_prefix = "{}".format(TOSCAException._node)
-                if TOSCAException._type:
-                    msg_prefix = msg_prefix + '({})'.format(TOSCAException._type)
+            if context.node:
+                msg_prefix = "{}".format(context.node)
+                if context.type:
+                    msg_prefix = msg_prefix + '({})'.format(context.type)
                 msg_prefix = msg_prefix + ': '
 
             self.message = msg_prefix + self.msg_fmt % kwargs
@@ -59,6 +66,10 @@ class TOSCAException(Exception):
     def __str__(self):
         return self.message
 
+    def __reduce__(self):
+        # Restore the formatted message rather than formatting it again
+        return _restore_exception, (self.__class__, self.__dict__)
+
     @staticmethod
     def generate_inv_schema_property_error(self, attr, value, valid_values):
         msg = (_('Schema definition of "%(propname)s" has '
@@ -78,8 +89,9 @@ class TOSCAException(Exception):
 
     @staticmethod
     def set_context(type_, node):
-        TOSCAException._type = type_
-        TOSCAException._node = node
+        context = ExceptionCollector.get_context()
+        context.type = type_
+        context.node = node
 
     @staticmethod
     def reset_context():
@@ -194,55 +206,166 @@ class InvalidGroupTargetException(TOSCAException):
     msg_fmt = _('"%(message)s"')
 
 
-class ExceptionCollector(object):
+class DependencyCycleError(TOSCAException):
+    msg_fmt = _('Node templates depend on each other in a cycle: '
+                '%(cycle)s.')
+
+
+class ExceptionContext(object):
+    '''State of one parse: the errors it collected and the entity in
+    progress that prefixes new exception messages.'''
+
+    def __init__(self, collecting=False):
+        self.exceptions = []
+        # Messages of the collected exceptions, to skip duplicates quickly
+        self.messages = set()
+        self.collecting = collecting
+        # Number of exceptions reported while collecting, duplicates included
+        self.reported = 0
+        self.type = None
+        self.node = None
+        # Template section in progress, see ExceptionCollector.set_section
+        self.section = None
+        # Called with each new exception collected in this context
+        self.listener = None
+
+    def set_exceptions(self, exceptions):
+        self.exceptions = exceptions
+        self.messages = set(str(e) for e in exceptions)
+
+
+class _ExceptionCollectorType(type):
+    '''Exposes the state of the current context as class attributes.'''
+
+    @property
+    def exceptions(cls):
+        return cls.get_context().exceptions
+
+    @exceptions.setter
+    def exceptions(cls, value):
+        cls.get_context().set_exceptions(value)
+
+    @property
+    def collecting(cls):
+        return cls.get_context().collecting
+
+    @collecting.setter
+    def collecting(cls, value):
+        cls.get_context().collecting = value
+
+    @property
+    def reported(cls):
+        return cls.get_context().reported
+
 
-    exceptions = []
-    collecting = False
+class ExceptionCollector(six.with_metaclass(_ExceptionCollectorType,
+                                            object)):
+    '''Collects the errors of the parse running in the current thread.
+
+    Each thread has its own stack of ExceptionContext objects and the
+    static API below works on the top one, so that parses in different
+    threads do not share state. A parse nested in another one, such as a
+    substituted template, pushes a fresh context and pops it when done.
+    '''
+
+    _local = threading.local()
+
+    @staticmethod
+    def _get_contexts():
+        contexts = getattr(ExceptionCollector._local, 'contexts', None)
+        if contexts is None:
+            contexts = ExceptionCollector._local.contexts = \
+                [ExceptionContext()]
+        return contexts
+
+    @staticmethod
+    def get_context():
+        return ExceptionCollector._get_contexts()[-1]
+
+    @staticmethod
+    def push_context(context=None):
+        if context is None:
+            context = ExceptionContext(ExceptionCollector.collecting)
+        ExceptionCollector._get_contexts().append(context)
+        return context
+
+    @staticmethod
+    def pop_context():
+        contexts = ExceptionCollector._get_contexts()
+        if len(contexts) > 1:
+            return contexts.pop()
 
     @staticmethod
     def clear():
-        del ExceptionCollector.exceptions[:]
+        context = ExceptionCollector.get_context()
+        del context.exceptions[:]
+        context.messages.clear()
 
     @staticmethod
     def start():
         ExceptionCollector.clear()
-        ExceptionCollector.collecting = True
+        context = ExceptionCollector.get_context()
+        context.collecting = True
+        context.section = None
 
     @staticmethod
     def stop():
-        ExceptionCollector.collecting = False
+        ExceptionCollector.get_context().collecting = False
+
+    @staticmethod
+    def set_section(section):
+        ExceptionCollector.get_context().section = section
 
     @staticmethod
     def contains(exception):
-        for ex in ExceptionCollector.exceptions:
-            if str(ex) == str(exception):
-                return True
-        return False
+        return str(exception) in ExceptionCollector.get_context().messages
 
     @staticmethod
     def appendException(exception):
-        if ExceptionCollector.collecting:
-            if not ExceptionCollector.contains(exception):
-                exception.trace = traceback.extract_stack()[:-1]
-                ExceptionCollector.exceptions.append(exception)
+        context = ExceptionCollector.get_context()
+        if context.collecting:
+            context.reported += 1
+            message = str(exception)
+            if message not in context.messages:
+                context.messages.add(message)
+                exception.trace = ExceptionCollector._extract_stack(
+                    sys._getframe(1))
+                context.exceptions.append(exception)
+                if context.listener is not None:
+                    context.listener(exception)
         else:
             raise exception
 
+    @staticmethod
+    def _extract_stack(frame):
+        # Like traceback.extract_stack() but the source lines are only
+        # read when a full report is formatted
+        stack = []
+        while frame is not None:
+            stack.append((frame.f_code.co_filename, frame.f_lineno,
+                          frame.f_code.co_name, None))
+            frame = frame.f_back
+        stack.reverse()
+        return stack
+
     @staticmethod
     def removeException(exception_type):
-        if ExceptionCollector.collecting and ExceptionCollector.exceptions:
-            ExceptionCollector.exceptions = [e for e in ExceptionCollector.exceptions
-                if isinstance(e, exception_type) is False ]
+        context = ExceptionCollector.get_context()
+        if context.collecting and context.exceptions:
+            context.set_exceptions([e for e in context.exceptions
+                if isinstance(e, exception_type) is False ])
 
     @staticmethod
     def exceptionsCaught():
-        return len(ExceptionCollector.exceptions) > 0
+        return len(ExceptionCollector.get_context().exceptions) > 0
 
     @staticmethod
     def getTraceString(traceList):
         traceString = ''
         for entry in traceList:
             f, l, m, c = entry[0], entry[1], entry[2], entry[3]
+            if c is None:
+                c = linecache.getline(f, l).strip()
             traceString += (_('\t\tFile %(file)s, line %(line)s, in '
                               '%(method)s\n\t\t\t%(call)s\n')
                             % {'file': f, 'line': l, 'method': m, 'call': c})
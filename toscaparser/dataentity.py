@@ -18,6 +18,7 @@ from toscaparser.common.exception import TypeMismatchError
 from toscaparser.common.exception import UnknownFieldError
 from toscaparser.elements.constraints import Schema
 from toscaparser.elements.datatype import DataType
+from toscaparser.elements.entity_type import TypeRegistry
 from toscaparser.elements.portspectype import PortSpec
 from toscaparser.elements.scalarunit import ScalarUnit_Frequency
 from toscaparser.elements.scalarunit import ScalarUnit_Size
@@ -28,110 +29,284 @@ from toscaparser.utils import validateutils
 log = logging.getLogger("tosca-parser")
 
 
+def _validate_timestamp(value):
+    validateutils.validate_timestamp(value)
+    return value
+
+
+def _freeze(value):
+    '''Return a hashable equivalent of a parsed YAML value.'''
+    if isinstance(value, dict):
+        return frozenset((k, _freeze(v)) for k, v in value.items())
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def _compile(cache, key, create, *args):
+    '''Return cache[key], created on first use.
+
+    Like resolved types, plans whose creation reported a validation error
+    are not kept, so that every value using them keeps reporting the error.
+    '''
+    plan = cache.get(key)
+    if plan is None:
+        reported = ExceptionCollector.reported
+        plan = create(*args)
+        if ExceptionCollector.reported == reported:
+            cache[key] = plan
+    return plan
+
+
+class ValidatorPlan(object):
+    '''Validation of the values of a type, compiled once per type universe.
+
+    Plans only hold read-only definitions: the schemas, constraints and data
+    types they need are resolved on first use and then reused for every
+    value they validate.
+    '''
+
+    SIMPLE_VALIDATORS = {
+        Schema.STRING: validateutils.validate_string,
+        Schema.INTEGER: validateutils.validate_integer,
+        Schema.FLOAT: validateutils.validate_float,
+        Schema.NUMBER: validateutils.validate_numeric,
+        Schema.BOOLEAN: validateutils.validate_boolean,
+        Schema.RANGE: validateutils.validate_range,
+        Schema.TIMESTAMP: _validate_timestamp,
+        Schema.SCALAR_UNIT_SIZE:
+            lambda value: ScalarUnit_Size(value).validate_scalar_unit(),
+        Schema.SCALAR_UNIT_FREQUENCY:
+            lambda value: ScalarUnit_Frequency(value).validate_scalar_unit(),
+        Schema.SCALAR_UNIT_TIME:
+            lambda value: ScalarUnit_Time(value).validate_scalar_unit(),
+        Schema.VERSION:
+            lambda value: validateutils.TOSCAVersionProperty(value).
+            get_version(),
+    }
+
+    COLLECTION_VALIDATORS = {
+        Schema.LIST: validateutils.validate_list,
+        Schema.MAP: validateutils.validate_map,
+    }
+
+    def __init__(self, type, entry_schema=None, custom_def=None):
+        # toscaparser.functions imports this module
+        from toscaparser.functions import is_function
+        self.is_function = is_function
+        self.type = type
+        self.entry_schema = entry_schema
+        self.custom_def = custom_def
+        self._cache = {}
+        self._validate_value = self.SIMPLE_VALIDATORS.get(type)
+        if type in self.COLLECTION_VALIDATORS:
+            self._validate_collection = self.COLLECTION_VALIDATORS[type]
+            self._validate = self._validate_entries
+        elif type == Schema.PORTSPEC:
+            self._validate = self._validate_portspec
+        else:
+            self._validate = self._validate_datatype
+
+    def validate(self, value, prop_name=None):
+        '''Validate value and return it with its type applied.'''
+        if self.is_function(value):
+            return value
+        if self._validate_value is not None:
+            return self._validate_value(value)
+        return self._validate(value, prop_name)
+
+    def _validate_entries(self, value, prop_name):
+        self._validate_collection(value)
+        if self.entry_schema:
+            entry = _compile(self._cache, 'entry', SchemaPlan, None,
+                             self.entry_schema, self.custom_def)
+            entry.validate_entries(value)
+        return value
+
+    def _validate_portspec(self, value, prop_name):
+        # TODO(TBD) bug 1567063, validate source & target as PortDef type
+        # as complex types not just as integers
+        PortSpec.validate_additional_req(value, prop_name, self.custom_def)
+
+    def _validate_datatype(self, value, prop_name):
+        plan = _compile(self._cache, 'datatype', self._create_datatype_plan)
+        return plan.validate(value)
+
+    def _create_datatype_plan(self):
+        datatype = TypeRegistry.get(DataType, self.custom_def, self.type)
+        return DataTypePlan.get(datatype)
+
+
+class SchemaPlan(object):
+    '''A property or entry schema with its constraints and value plan.'''
+
+    def __init__(self, name, schema_dict, custom_def=None):
+        from toscaparser.functions import is_function
+        self.is_function = is_function
+        self.schema = Schema(name, schema_dict)
+        self.constraints = list(self.schema.constraints)
+        self.plan = DataEntity.get_plan(self.schema.type,
+                                        self.schema.entry_schema, custom_def)
+
+    def validate_field(self, value):
+        self.plan.validate(value)
+        # check if field value meets constraints defined if not a function
+        if self.constraints and not self.is_function(value):
+            for constraint in self.constraints:
+                if isinstance(value, list):
+                    for val in value:
+                        constraint.validate(val)
+                else:
+                    constraint.validate(value)
+
+    def validate_entries(self, value):
+        valuelist = value
+        if isinstance(value, dict):
+            valuelist = list(value.values())
+        for v in valuelist:
+            self.plan.validate(v)
+            for constraint in self.constraints:
+                constraint.validate(v)
+        return value
+
+
+class DataTypePlan(object):
+    '''Validation of the values of a complex data type.'''
+
+    def __init__(self, datatype):
+        self.datatype = datatype
+        self.custom_def = datatype.custom_def
+        self.value_type = datatype.value_type
+        self.allowed_props = set()
+        self.required_props = []
+        self.default_props = []
+        self.field_schemas = {}
+        self._fields = {}
+        self._value_constraints = {}
+        schema = datatype.get_all_properties()
+        if schema:
+            for name, prop_def in schema.items():
+                self.allowed_props.add(name)
+                if prop_def.required:
+                    self.required_props.append(name)
+                if prop_def.default:
+                    self.default_props.append((name, prop_def.default))
+                if prop_def.schema:
+                    self.field_schemas[name] = prop_def.schema
+
+    @staticmethod
+    def get(datatype):
+        '''Return the plan of a data type, compiled on first use.'''
+        return datatype._get_view('validator_plan',
+                                  lambda: DataTypePlan(datatype))
+
+    def validate(self, value, prop_name=None):
+        '''Validate the value by the definition of the datatype.'''
+
+        # A datatype can not have both 'type' and 'properties' definitions.
+        # If the datatype has 'type' definition
+        if self.value_type:
+            value = DataEntity.validate_datatype(self.value_type, value,
+                                                 None, self.custom_def)
+            constraints = _compile(self._value_constraints, prop_name,
+                                   self._create_value_constraints,
+                                   prop_name)
+            for constraint in constraints:
+                constraint.validate(value)
+            return value
+
+        # If the datatype has 'properties' definition
+        datatype = self.datatype.type
+        if not isinstance(value, dict):
+            ExceptionCollector.appendException(
+                TypeMismatchError(what=value, type=datatype))
+
+        # check allowed field
+        try:
+            for value_key in value.keys():
+                if value_key not in self.allowed_props:
+                    log.info("Unknown field data {}: {}".
+                             format(datatype, value_key))
+                    ExceptionCollector.appendException(
+                        UnknownFieldError(what=(_('Data value of type "%s"')
+                                                % datatype),
+                                          field=value_key))
+        except Exception as e:
+            log.error("Value: {}: {}".format(value, e))
+            raise e
+
+        # check default field
+        for def_key, def_value in self.default_props:
+            if def_key not in value:
+                value[def_key] = def_value
+
+        # check missing field
+        missingprop = [req_key for req_key in self.required_props
+                       if req_key not in value]
+        if missingprop:
+            log.info("Missing field data {}: {}".
+                     format(datatype, missingprop))
+            ExceptionCollector.appendException(
+                MissingRequiredFieldError(
+                    what=(_('Data value of type "%s"') % datatype),
+                    required=missingprop))
+
+        # check every field
+        for name, field_value in list(value.items()):
+            if name not in self.field_schemas:
+                continue
+            field = _compile(self._fields, name, SchemaPlan, name,
+                             self.field_schemas[name], self.custom_def)
+            field.validate_field(field_value)
+
+        return value
+
+    def _create_value_constraints(self, prop_name):
+        return list(Schema(prop_name, self.datatype.defs).constraints)
+
+
 class DataEntity(object):
     '''A complex data value entity.'''
 
     def __init__(self, datatypename, value_dict, custom_def=None,
                  prop_name=None):
         self.custom_def = custom_def
-        self.datatype = DataType(datatypename, custom_def)
+        self.datatype = TypeRegistry.get(DataType, custom_def, datatypename)
         self.schema = self.datatype.get_all_properties()
         self.value = value_dict
         self.property_name = prop_name
 
     def validate(self):
         '''Validate the value by the definition of the datatype.'''
-
-        # A datatype can not have both 'type' and 'properties' definitions.
-        # If the datatype has 'type' definition
         log.debug("{}: Data type validate: {}, {}".
                   format(self.datatype.type,
                          self.datatype.value_type,
                          self.value))
-        if self.datatype.value_type:
-            self.value = DataEntity.validate_datatype(self.datatype.value_type,
-                                                      self.value,
-                                                      None,
-                                                      self.custom_def)
-            schema = Schema(self.property_name, self.datatype.defs)
-            for constraint in schema.constraints:
-                constraint.validate(self.value)
-        # If the datatype has 'properties' definition
-        else:
-            if not isinstance(self.value, dict):
-                ExceptionCollector.appendException(
-                    TypeMismatchError(what=self.value,
-                                      type=self.datatype.type))
-            allowed_props = []
-            required_props = []
-            default_props = {}
-            if self.schema:
-                allowed_props = self.schema.keys()
-                for name, prop_def in self.schema.items():
-                    if prop_def.required:
-                        required_props.append(name)
-                    if prop_def.default:
-                        default_props[name] = prop_def.default
-
-            # check allowed field
-            try:
-                for value_key in list(self.value.keys()):
-                    if value_key not in allowed_props:
-                        log.info("Unknown field data {}: {}".
-                                 format(self.datatype.type, value_key))
-                        ExceptionCollector.appendException(
-                            UnknownFieldError(what=(_('Data value of type "%s"')
-                                                    % self.datatype.type),
-                                              field=value_key))
-            except Exception as e:
-                log.error("Value: {}: {}".format(self.value, e))
-                raise e
-
-            # check default field
-            for def_key, def_value in list(default_props.items()):
-                if def_key not in list(self.value.keys()):
-                    self.value[def_key] = def_value
-
-            # check missing field
-            missingprop = []
-            for req_key in required_props:
-                if req_key not in list(self.value.keys()):
-                    missingprop.append(req_key)
-            if missingprop:
-                log.info("Missing field data {}: {}".
-                         format(self.datatype.type, missingprop))
-                ExceptionCollector.appendException(
-                    MissingRequiredFieldError(
-                        what=(_('Data value of type "%s"')
-                              % self.datatype.type), required=missingprop))
-
-            # check every field
-            for name, value in list(self.value.items()):
-                schema_name = self._find_schema(name)
-                if not schema_name:
-                    continue
-                log.debug("Name: {}, Schema: {}".format(name, schema_name))
-                prop_schema = Schema(name, schema_name)
-                # check if field value meets type defined
-                DataEntity.validate_datatype(prop_schema.type, value,
-                                             prop_schema.entry_schema,
-                                             self.custom_def)
-                # check if field value meets constraints defined if not a function
-                from toscaparser.functions import is_function
-                if prop_schema.constraints and is_function(value) is False:
-                    for constraint in prop_schema.constraints:
-                        if isinstance(value, list):
-                            for val in value:
-                                constraint.validate(val)
-                        else:
-                            constraint.validate(value)
-
+        self.value = DataTypePlan.get(self.datatype).validate(
+            self.value, self.property_name)
         return self.value
 
     def _find_schema(self, name):
         if self.schema and name in self.schema.keys():
             return self.schema[name].schema
 
+    @staticmethod
+    def get_plan(type, entry_schema=None, custom_def=None):
+        '''Return the validator plan of a type and entry schema.
+
+        Plans are compiled once per type universe, see TypeRegistry.
+        '''
+        if entry_schema is None or type not in (Schema.LIST, Schema.MAP):
+            return TypeRegistry.cached(custom_def, (ValidatorPlan, type),
+                                       ValidatorPlan, type, None, custom_def)
+        try:
+            key = (ValidatorPlan, type, _freeze(entry_schema))
+            hash(key)
+        except TypeError:
+            return ValidatorPlan(type, entry_schema, custom_def)
+        return TypeRegistry.cached(custom_def, key, ValidatorPlan, type,
+                                   entry_schema, custom_def)
+
     @staticmethod
     def validate_datatype(type, value, entry_schema=None, custom_def=None,
                           prop_name=None):
@@ -140,63 +315,11 @@ class DataEntity(object):
         If type is list or map, validate its entry by entry_schema(if defined)
         If type is a user-defined complex datatype, custom_def is required.
         '''
-        from toscaparser.functions import is_function
-        if is_function(value):
-            return value
-        if type == Schema.STRING:
-            return validateutils.validate_string(value)
-        elif type == Schema.INTEGER:
-            return validateutils.validate_integer(value)
-        elif type == Schema.FLOAT:
-            return validateutils.validate_float(value)
-        elif type == Schema.NUMBER:
-            return validateutils.validate_numeric(value)
-        elif type == Schema.BOOLEAN:
-            return validateutils.validate_boolean(value)
-        elif type == Schema.RANGE:
-            return validateutils.validate_range(value)
-        elif type == Schema.TIMESTAMP:
-            validateutils.validate_timestamp(value)
-            return value
-        elif type == Schema.LIST:
-            validateutils.validate_list(value)
-            if entry_schema:
-                DataEntity.validate_entry(value, entry_schema, custom_def)
-            return value
-        elif type == Schema.SCALAR_UNIT_SIZE:
-            return ScalarUnit_Size(value).validate_scalar_unit()
-        elif type == Schema.SCALAR_UNIT_FREQUENCY:
-            return ScalarUnit_Frequency(value).validate_scalar_unit()
-        elif type == Schema.SCALAR_UNIT_TIME:
-            return ScalarUnit_Time(value).validate_scalar_unit()
-        elif type == Schema.VERSION:
-            return validateutils.TOSCAVersionProperty(value).get_version()
-        elif type == Schema.MAP:
-            validateutils.validate_map(value)
-            if entry_schema:
-                DataEntity.validate_entry(value, entry_schema, custom_def)
-            return value
-        elif type == Schema.PORTSPEC:
-            # TODO(TBD) bug 1567063, validate source & target as PortDef type
-            # as complex types not just as integers
-            PortSpec.validate_additional_req(value, prop_name, custom_def)
-        else:
-            log.debug("Validate data {}: {}, def={}".
-                      format(type, value, custom_def))
-            data = DataEntity(type, value, custom_def)
-            return data.validate()
+        plan = DataEntity.get_plan(type, entry_schema, custom_def)
+        return plan.validate(value, prop_name)
 
     @staticmethod
     def validate_entry(value, entry_schema, custom_def=None):
         '''Validate entries for map and list.'''
-        schema = Schema(None, entry_schema)
-        valuelist = value
-        if isinstance(value, dict):
-            valuelist = list(value.values())
-        for v in valuelist:
-            DataEntity.validate_datatype(schema.type, v, schema.entry_schema,
-                                         custom_def)
-            if schema.constraints:
-                for constraint in schema.constraints:
-                    constraint.validate(v)
-        return value
+        return SchemaPlan(None, entry_schema, custom_def).validate_entries(
+            value)
@@ -38,11 +38,7 @@ class ArtifactTypeDef(StatefulEntityType):
     @property
     def parent_type(self):
         '''Return a artifact entity from which this entity is derived.'''
-        if not hasattr(self, 'defs'):
-            return None
-        partifact_entity = self.derived_from(self.defs)
-        if partifact_entity:
-            return ArtifactTypeDef(partifact_entity, self.custom_def)
+        return self._get_parent_type()
 
     def get_artifact(self, name):
         '''Return the definition of an artifact field by name.'''
@@ -35,8 +35,7 @@ class CapabilityTypeDef(StatefulEntityType):
             self.properties = self.defs[self.PROPERTIES]
         self.parent_capabilities = self._get_parent_capabilities(custom_def)
 
-    def get_properties_def_objects(self):
-        '''Return a list of property definition objects.'''
+    def _create_properties_def_objects(self):
         properties = []
         parent_properties = {}
         if self.parent_capabilities:
@@ -57,17 +56,6 @@ class CapabilityTypeDef(StatefulEntityType):
                         properties.append(PropertyDef(prop, None, schema))
         return properties
 
-    def get_properties_def(self):
-        '''Return a dictionary of property definition name-object pairs.'''
-        return {prop.name: prop
-                for prop in self.get_properties_def_objects()}
-
-    def get_property_def_value(self, name):
-        '''Return the definition of a given property name.'''
-        props_def = self.get_properties_def()
-        if props_def and name in props_def:
-            return props_def[name].value
-
     def _get_parent_capabilities(self, custom_def=None):
         capabilities = {}
         parent_cap = self.parent_type
@@ -84,12 +72,10 @@ class CapabilityTypeDef(StatefulEntityType):
     @property
     def parent_type(self):
         '''Return a capability this capability is derived from.'''
-        if not hasattr(self, 'defs'):
-            return None
-        pnode = self.derived_from(self.defs)
-        if pnode:
-            return CapabilityTypeDef(self.name, pnode,
-                                     self.nodetype, self.custom_def)
+        return self._get_parent_type()
+
+    def _parent_type_args(self, ptype):
+        return (self.name, ptype, self.nodetype)
 
     def inherits_from(self, type_names):
         '''Check this capability is in type_names
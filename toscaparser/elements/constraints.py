@@ -21,10 +21,24 @@ from toscaparser.common.exception import InvalidSchemaError
 from toscaparser.common.exception import ValidationError
 from toscaparser.elements.portspectype import PortSpec
 from toscaparser.elements import scalarunit
+from toscaparser.utils.cacheutils import LRUCache
 from toscaparser.utils.gettextutils import _
 
 log = logging.getLogger("tosca-parser")
 
+# Compiled regular expressions of the pattern constraints
+PATTERN_CACHE_SIZE = 1024
+_patterns = LRUCache(PATTERN_CACHE_SIZE)
+
+
+def compile_pattern(pattern):
+    '''Return the compiled regular expression, compiled once.'''
+    regex = _patterns.get(pattern)
+    if regex is None:
+        regex = re.compile(pattern)
+        _patterns.set(pattern, regex)
+    return regex
+
 
 class Schema(collections.Mapping):
 
@@ -590,7 +604,7 @@ class Pattern(Constraint):
             ExceptionCollector.appendException(
                 InvalidSchemaError(message=_('The property "pattern" '
                                              'expects a string.')))
-        self.match = re.compile(self.constraint_value).match
+        self.match = compile_pattern(self.constraint_value).match
 
     def _is_valid(self, value):
         match = self.match(value)
@@ -11,6 +11,7 @@
 #    under the License.
 
 
+from toscaparser.elements.entity_type import EntityType
 from toscaparser.elements.portspectype import PortSpec
 from toscaparser.elements.statefulentitytype import StatefulEntityType
 
@@ -20,23 +21,19 @@ class DataType(StatefulEntityType):
 
     NETWORK_TYPES = ('PortDef', PortSpec.SHORTNAME,
                      'PortInfo', 'NetworkInfo',)
+    NAME_PREFIXES = tuple(
+        (name, EntityType.DATATYPE_NETWORK_PREFIX) for name in NETWORK_TYPES)
 
     def __init__(self, datatypename, custom_def=None):
-        prefix = self.DATATYPE_PREFIX
-        if datatypename in self.NETWORK_TYPES:
-            prefix = self.DATATYPE_NETWORK_PREFIX
         super(DataType, self).__init__(datatypename,
-                                       prefix,
+                                       self.DATATYPE_PREFIX,
                                        custom_def)
         self.custom_def = custom_def
 
     @property
     def parent_type(self):
         '''Return a datatype this datatype is derived from.'''
-        ptype = self.derived_from(self.defs)
-        if ptype:
-            return DataType(ptype, self.custom_def)
-        return None
+        return self._get_parent_type()
 
     @property
     def value_type(self):
@@ -45,27 +42,16 @@ class DataType(StatefulEntityType):
 
     def get_all_properties_objects(self):
         '''Return all properties objects defined in type and parent type.'''
-        props_def = self.get_properties_def_objects()
-        # Get the property names
-        prop_names = [p.name for p in props_def]
-        ptype = self.parent_type
-        while ptype:
-            props = ptype.get_properties_def_objects()
-            if props:
-                for p in props:
-                    if p.name not in prop_names:
-                        props_def.append(p)
-                        prop_names.append(p.name)
-            ptype = ptype.parent_type
-        return props_def
+        # The property definitions are already merged with the ones of the
+        # parent types by get_definition()
+        return self.get_properties_def_objects()
 
     def get_all_properties(self):
         '''Return a dictionary of all property definition name-object pairs.'''
-        return {prop.name: prop
-                for prop in self.get_all_properties_objects()}
+        return self.get_properties_def()
 
     def get_all_property_value(self, name):
         '''Return the value of a given property name.'''
         props_def = self.get_all_properties()
-        if props_def and name in props_def.key():
+        if props_def and name in props_def:
             return props_def[name].value
@@ -10,18 +10,32 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+from collections import OrderedDict
 import copy
 import logging
 import os
+import threading
 
 from toscaparser.common.exception import ExceptionCollector
 from toscaparser.common.exception import ValidationError
 from toscaparser.extensions.exttools import ExtTools
+from toscaparser.utils.gettextutils import _
+from toscaparser.utils.lazyutils import LazyClassAttribute
 import toscaparser.utils.yamlparser
 
 log = logging.getLogger('tosca-parser')
 
 
+class ProfileDefinitions(object):
+    '''Definitions of the profile selected by the current thread.
+
+    See ProfileRegistry.
+    '''
+
+    def __get__(self, instance, owner):
+        return ProfileRegistry.current()
+
+
 class EntityType(object):
     '''Base class for TOSCA elements.'''
 
@@ -43,15 +57,17 @@ class EntityType(object):
 
     loader = toscaparser.utils.yamlparser.load_yaml
 
-    TOSCA_DEF_LOAD_AS_IS = loader(TOSCA_DEF_FILE)
+    @LazyClassAttribute
+    def TOSCA_DEF_LOAD_AS_IS(cls):
+        return toscaparser.utils.yamlparser.load_yaml(cls.TOSCA_DEF_FILE,
+                                                      cache=True)
 
-    # Map of definition with pre-loaded values of TOSCA_DEF_FILE_SECTIONS
-    TOSCA_DEF = {}
-    for section in TOSCA_DEF_SECTIONS:
-        if section in TOSCA_DEF_LOAD_AS_IS.keys():
-            value = TOSCA_DEF_LOAD_AS_IS[section]
-            for key in value.keys():
-                TOSCA_DEF[key] = value[key]
+    '''Map of definition with pre-loaded values of TOSCA_DEF_FILE.
+
+    Includes the definitions of the profile the template being parsed by
+    the current thread is written for.
+    '''
+    TOSCA_DEF = ProfileDefinitions()
 
     RELATIONSHIP_TYPE = (DEPENDSON, HOSTEDON, CONNECTSTO, ATTACHESTO,
                          LINKSTO, BINDSTO) = \
@@ -75,6 +91,32 @@ class EntityType(object):
     DATATYPE_NETWORK_PREFIX = DATATYPE_PREFIX + 'network.'
     TOSCA = 'tosca'
 
+    def _get_parent_type(self):
+        '''Return the shared parent type object of this type.
+
+        The parent is resolved through the TypeRegistry the first time it is
+        requested and kept on the instance afterwards, so walking up the
+        inheritance chain does not rebuild any type object.
+        '''
+        if '_parent_type' in self.__dict__:
+            return self._parent_type
+        parent = None
+        reported = ExceptionCollector.reported
+        if getattr(self, 'defs', None):
+            ptype = self.derived_from(self.defs)
+            if ptype:
+                parent = TypeRegistry.get(type(self),
+                                          getattr(self, 'custom_def', None),
+                                          *self._parent_type_args(ptype))
+        # Keep reporting errors of an invalid parent on every lookup
+        if ExceptionCollector.reported == reported:
+            self._parent_type = parent
+        return parent
+
+    def _parent_type_args(self, ptype):
+        '''Return the constructor arguments of the given parent type.'''
+        return (ptype,)
+
     def derived_from(self, defs):
         '''Return a type this type is derived from.'''
         return self.entity_value(defs, 'derived_from')
@@ -98,6 +140,22 @@ class EntityType(object):
         if defs and key in defs:
             return defs[key]
 
+    def _get_view(self, name, create, *args):
+        '''Return a flattened view of this type, created on first use.
+
+        Views whose creation reported a validation error are not kept, so
+        that every caller keeps reporting the error.
+        '''
+        views = self.__dict__.setdefault('_views', {})
+        key = (name,) + args
+        if key in views:
+            return views[key]
+        reported = ExceptionCollector.reported
+        view = create(*args)
+        if ExceptionCollector.reported == reported:
+            views[key] = view
+        return view
+
     def get_value(self, ndtype, defs=None, parent=None):
         value = None
         if defs is None:
@@ -109,33 +167,54 @@ class EntityType(object):
             # item definitions
             value = copy.copy(defs[ndtype])
         if parent:
-            p = self
-            if p:
-                while p:
-                    if p.defs and ndtype in p.defs:
-                        # get the parent value
-                        parent_value = p.defs[ndtype]
-                        if value:
-                            if isinstance(value, dict):
-                                for k, v in parent_value.items():
-                                    if k not in value.keys():
-                                        value[k] = v
-                            if isinstance(value, list):
-                                for p_value in parent_value:
-                                    if isinstance(p_value, dict):
-                                        if list(p_value.keys())[0] not in [
-                                            list(item.keys())[0] for item in
-                                            value]:
-                                            value.append(p_value)
-                                    else:
-                                        if p_value not in value:
-                                            value.append(p_value)
-                        else:
-                            value = copy.copy(parent_value)
-                    p = p.parent_type
+            inherited = self._get_view('inherited_value',
+                                       self._create_inherited_value, ndtype)
+            if value:
+                self._merge_value(value, inherited)
+            else:
+                value = copy.copy(inherited)
+        return value
+
+    def _create_inherited_value(self, ndtype):
+        '''Return ndtype merged from this type and all its parents.'''
+        value = None
+        if self.defs and ndtype in self.defs:
+            value = copy.copy(self.defs[ndtype])
+        p = self.parent_type
+        if p:
+            parent_value = p._get_view('inherited_value',
+                                       p._create_inherited_value, ndtype)
+            if value:
+                self._merge_value(value, parent_value)
+            else:
+                value = copy.copy(parent_value)
         return value
 
+    @staticmethod
+    def _merge_value(value, parent_value):
+        if not parent_value:
+            return
+        if isinstance(value, dict):
+            for k, v in parent_value.items():
+                if k not in value:
+                    value[k] = v
+        if isinstance(value, list):
+            names = set(list(item.keys())[0] for item in value
+                        if isinstance(item, dict))
+            for p_value in parent_value:
+                if isinstance(p_value, dict):
+                    name = list(p_value.keys())[0]
+                    if name not in names:
+                        value.append(p_value)
+                        names.add(name)
+                else:
+                    if p_value not in value:
+                        value.append(p_value)
+
     def get_definition(self, ndtype):
+        return self._get_view('definition', self._create_definition, ndtype)
+
+    def _create_definition(self, ndtype):
         value = None
         if not hasattr(self, 'defs'):
             defs = None
@@ -158,15 +237,163 @@ class EntityType(object):
         return value
 
 
+class TypeRegistry(object):
+    '''Process-wide registry of resolved type definitions.
+
+    Type objects are keyed by their class, their constructor arguments,
+    the identity of the custom definitions and the profile they were
+    resolved against, and are shared between every caller asking for the
+    same type.
+
+    The returned objects are shared and must be treated as read-only.
+    Types whose construction reported a validation error are never cached,
+    so that every template using them keeps reporting the error.
+    '''
+
+    MAX_UNIVERSES = 64
+
+    _universes = OrderedDict()
+    _generation = 0
+    _lock = threading.Lock()
+
+    @classmethod
+    def get(cls, type_class, custom_def, *args):
+        universe = cls._get_universe(custom_def)
+        key = (type_class,) + args
+        entity = universe.get(key)
+        if entity is None:
+            reported = ExceptionCollector.reported
+            entity = type_class(*args, custom_def=custom_def)
+            if ExceptionCollector.reported == reported:
+                universe[key] = entity
+        return entity
+
+    @classmethod
+    def cached(cls, custom_def, key, create, *args):
+        '''Return the object kept under key for the given type universe.
+
+        The object is created by create(*args) on first use and follows
+        the same rules as types: it is dropped on invalidation and is not
+        kept when its creation reported a validation error.
+        '''
+        universe = cls._get_universe(custom_def)
+        value = universe.get(key)
+        if value is None:
+            reported = ExceptionCollector.reported
+            value = create(*args)
+            if ExceptionCollector.reported == reported:
+                universe[key] = value
+        return value
+
+    @classmethod
+    def _get_universe(cls, custom_def):
+        # The custom definitions are kept alive with their universe so that
+        # their identity can not be reused by another dictionary.
+        profile = ProfileRegistry.current()
+        with cls._lock:
+            ukey = (id(custom_def), profile.version, cls._generation)
+            entry = cls._universes.pop(ukey, None)
+            if entry is None:
+                entry = (custom_def, {})
+                while len(cls._universes) >= cls.MAX_UNIVERSES:
+                    cls._universes.popitem(last=False)
+            cls._universes[ukey] = entry
+            return entry[1]
+
+    @classmethod
+    def invalidate(cls):
+        with cls._lock:
+            cls._generation += 1
+            cls._universes.clear()
+
+
+class Profile(dict):
+    '''Read-only definitions of a TOSCA profile.
+
+    Maps the names of the types of the profile to their definitions.
+    '''
+
+    def __init__(self, version, definitions):
+        super(Profile, self).__init__(definitions)
+        self.version = version
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError(_('The definitions of profile "%s" can not be '
+                          'modified.') % self.version)
+
+    __setitem__ = __delitem__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+    def __reduce__(self):
+        return Profile, (self.version, dict(self))
+
+
+class ProfileRegistry(object):
+    '''Process-wide registry of the definitions of each TOSCA profile.
+
+    The definitions of a profile are loaded once, on first use, and are
+    shared by every template written for it. The normative definitions
+    are the profile of the standard versions; the profiles of extension
+    versions add the definitions of the extension to them.
+
+    Each thread selects the profile of the template it parses, the
+    definitions of other threads are left untouched. Until a thread
+    selects one, it uses the normative definitions.
+    '''
+
+    _profiles = {}
+    _lock = threading.Lock()
+    _local = threading.local()
+
+    @classmethod
+    def get(cls, version=None):
+        '''Return the profile of the given definitions version.
+
+        Versions which are not extension versions use the normative
+        definitions.
+        '''
+        defs_file = ExtTools().get_defs_file(version) if version else None
+        if not defs_file:
+            version = None
+        profile = cls._profiles.get(version)
+        if profile is None:
+            # Extension profiles extend the normative one, which is loaded
+            # first as the lock is not reentrant
+            base = cls.get() if version else None
+            with cls._lock:
+                profile = cls._profiles.get(version)
+                if profile is None:
+                    profile = cls._profiles[version] = \
+                        cls._load(version, defs_file, base)
+        return profile
+
+    @classmethod
+    def _load(cls, version, defs_file, base=None):
+        definitions = {}
+        if base:
+            definitions.update(base)
+        loader = toscaparser.utils.yamlparser.load_yaml
+        profile_def = loader(defs_file, cache=True) if defs_file \
+            else EntityType.TOSCA_DEF_LOAD_AS_IS
+        for section in EntityType.TOSCA_DEF_SECTIONS:
+            if section in profile_def.keys():
+                definitions.update(profile_def[section])
+        return Profile(version, definitions)
+
+    @classmethod
+    def current(cls):
+        '''Return the profile selected by the current thread.'''
+        profile = getattr(cls._local, 'profile', None)
+        if profile is None:
+            profile = cls._profiles.get(None) or cls.get()
+        return profile
+
+    @classmethod
+    def select(cls, profile):
+        '''Select the profile used by the current thread.'''
+        cls._local.profile = profile
+
+
 def update_definitions(version):
-    exttools = ExtTools()
-    extension_defs_file = exttools.get_defs_file(version)
-    loader = toscaparser.utils.yamlparser.load_yaml
-    nfv_def_file = loader(extension_defs_file)
-    nfv_def = {}
-    for section in EntityType.TOSCA_DEF_SECTIONS:
-        if section in nfv_def_file.keys():
-            value = nfv_def_file[section]
-            for key in value.keys():
-                nfv_def[key] = value[key]
-    EntityType.TOSCA_DEF.update(nfv_def)
+    '''Use the definitions of the given version in the current thread.'''
+    ProfileRegistry.select(ProfileRegistry.get(version))
@@ -54,11 +54,7 @@ class GroupType(StatefulEntityType):
     @property
     def parent_type(self):
         '''Return a group statefulentity of this entity is derived from.'''
-        if not hasattr(self, 'defs'):
-            return None
-        pgroup_entity = self.derived_from(self.defs)
-        if pgroup_entity:
-            return GroupType(pgroup_entity, self.custom_def)
+        return self._get_parent_type()
 
     @property
     def description(self):
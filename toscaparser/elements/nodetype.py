@@ -15,6 +15,7 @@ import logging
 from toscaparser.common.exception import ExceptionCollector
 from toscaparser.common.exception import UnknownFieldError
 from toscaparser.elements.capabilitytype import CapabilityTypeDef
+from toscaparser.elements.entity_type import TypeRegistry
 import toscaparser.elements.interfaces as ifaces
 from toscaparser.elements.interfaces import InterfacesDef
 from toscaparser.elements.relationshiptype import RelationshipType
@@ -41,11 +42,7 @@ class NodeType(StatefulEntityType):
     @property
     def parent_type(self):
         '''Return a node this node is derived from.'''
-        if not hasattr(self, 'defs'):
-            return None
-        pnode = self.derived_from(self.defs)
-        if pnode:
-            return NodeType(pnode, self.custom_def)
+        return self._get_parent_type()
 
     @property
     def relationship(self):
@@ -56,6 +53,9 @@ class NodeType(StatefulEntityType):
         types) in a TOSCA template.
 
         '''
+        return self._get_view('relationship', self._create_relationship)
+
+    def _create_relationship(self):
         relationship = {}
         requires = self.get_all_requirements()
         if requires:
@@ -95,62 +95,47 @@ class NodeType(StatefulEntityType):
                             node_type = value
                         log.debug("{}: RelationshipType: {}, {}, {}".
                               format(self.ntype, relation or None, keyword, self.custom_def))
-                        rtype = RelationshipType(relation, keyword, self.custom_def)
-                        relatednode = NodeType(node_type, self.custom_def)
+                        rtype = TypeRegistry.get(RelationshipType,
+                                                 self.custom_def,
+                                                 relation, keyword)
+                        relatednode = TypeRegistry.get(NodeType,
+                                                       self.custom_def,
+                                                       node_type)
                         relationship[rtype] = relatednode
         return relationship
 
     def _get_node_type_by_cap(self, cap):
         '''Find the node type that has the provided capability
 
-        This method will lookup all node types if they have the
-        provided capability.
+        Node types providing the capability type itself are preferred over
+        the ones providing a type derived from it, see CapabilityIndex.
         '''
-
-        # Filter the node types
-        node_types = [node_type for node_type in self.TOSCA_DEF.keys()
-                      if node_type.startswith(self.NODE_PREFIX) and
-                      node_type != 'tosca.nodes.Root']
-        custom_node_types = [node_type for node_type in self.custom_def.keys()
-                             if node_type.startswith(self.NODE_PREFIX) and
-                             node_type != 'tosca.nodes.Root']
-
-        for node_type in node_types + custom_node_types:
-            if node_type in self.TOSCA_DEF:
-                node_def = self.TOSCA_DEF[node_type]
-            else:
-                node_def = self.custom_def[node_type]
-            if isinstance(node_def, dict) and 'capabilities' in node_def and node_def['capabilities']:
-                node_caps = node_def['capabilities']
-                for value in node_caps.values():
-                    if isinstance(value, dict) and \
-                            'type' in value and value['type'] == cap:
-                        return node_type
+        return self._get_capability_index().get_node_type(cap)
 
     def _get_relation(self, key, ndtype):
         relation = None
-        ntype = NodeType(ndtype, self.custom_def)
+        ntype = TypeRegistry.get(NodeType, self.custom_def, ndtype)
         caps = ntype.get_capabilities()
         log.debug("{}: Key: {}, Capabilities: {}".format(ndtype, key, caps))
         if caps and key in caps.keys():
-            c = caps[key]
+            rtypes = self._get_capability_index().get_relationship_types(
+                caps[key].type)
             for r in self.RELATIONSHIP_TYPE:
-                rtypedef = ntype.TOSCA_DEF[r]
-                for properties in rtypedef.values():
-                    if c.type in properties:
-                        relation = r
-                        break
-                if relation:
+                if r in rtypes:
+                    relation = r
                     break
-                else:
-                    for properties in rtypedef.values():
-                        if c.parent_type in properties:
-                            relation = r
-                            break
         return relation
 
+    def _get_capability_index(self):
+        return TypeRegistry.cached(self.custom_def, CapabilityIndex,
+                                   CapabilityIndex, self.custom_def)
+
     def get_capabilities_objects(self):
         '''Return a list of capability objects.'''
+        return list(self._get_view('capabilities_objects',
+                                   self._create_capabilities_objects))
+
+    def _create_capabilities_objects(self):
         typecapabilities = []
         caps = self.get_value(self.CAPABILITIES, None, True)
         log.debug("Capabilites: {}".format(caps))
@@ -159,13 +144,16 @@ class NodeType(StatefulEntityType):
             # 'value' is a dict { 'type': <capability type name> }
             for name, value in caps.items():
                 ctype = value.get('type')
-                cap = CapabilityTypeDef(name, ctype, self.type,
-                                        self.custom_def)
+                cap = TypeRegistry.get(CapabilityTypeDef, self.custom_def,
+                                       name, ctype, self.type)
                 typecapabilities.append(cap)
         return typecapabilities
 
     def get_capabilities(self):
         '''Return a dictionary of capability name-objects pairs.'''
+        return self._get_view('capabilities', self._create_capabilities)
+
+    def _create_capabilities(self):
         return {cap.name: cap
                 for cap in self.get_capabilities_objects()}
 
@@ -223,7 +211,7 @@ class NodeType(StatefulEntityType):
 
     def get_capability(self, name):
         caps = self.get_capabilities()
-        if caps and name in caps.keys():
+        if caps and name in caps:
             return caps[name].value
 
     def get_capability_type(self, name):
@@ -238,3 +226,89 @@ class NodeType(StatefulEntityType):
                     ExceptionCollector.appendException(
                         UnknownFieldError(what='Nodetype"%s"' % self.ntype,
                                           field=key))
+
+
+class CapabilityIndex(object):
+    '''Reverse indexes of the capability types of a type universe.
+
+    Maps capability types to the node types providing them and to the
+    relationship types accepting them as target, taking derived capability
+    types into account. Indexes are built once per type universe, see
+    TypeRegistry.
+    '''
+
+    def __init__(self, custom_def=None):
+        self.custom_def = custom_def or {}
+        # Capability type -> first node type providing it
+        self._node_types = {}
+        # Capability type -> first node type providing a type derived from it
+        self._derived_node_types = {}
+        # Capability type -> relationship types listing it as valid target
+        self._target_of = {}
+        # Capability type -> relationship types accepting it or a parent
+        self._relationship_types = {}
+
+        for ntype, ndef in self._get_definitions(NodeType.NODE_PREFIX):
+            if ntype == 'tosca.nodes.Root' or not isinstance(ndef, dict):
+                continue
+            for value in (ndef.get(NodeType.CAPABILITIES) or {}).values():
+                if not isinstance(value, dict) or 'type' not in value:
+                    continue
+                ctype = value['type']
+                self._node_types.setdefault(ctype, ntype)
+                for parent in self._get_parents(ctype):
+                    self._derived_node_types.setdefault(parent, ntype)
+
+        for rtype, rdef in self._get_definitions(NodeType.RELATIONSHIP_PREFIX):
+            if not isinstance(rdef, dict):
+                continue
+            for ctype in rdef.get('valid_target_types') or ():
+                targets = self._target_of.setdefault(ctype, [])
+                if rtype not in targets:
+                    targets.append(rtype)
+
+    def get_node_type(self, ctype):
+        '''Return a node type providing the given capability type.'''
+        node_type = self._node_types.get(ctype)
+        if node_type is None:
+            node_type = self._derived_node_types.get(ctype)
+        return node_type
+
+    def get_relationship_types(self, ctype):
+        '''Return the relationship types that can target the capability.
+
+        Relationship types accepting the capability type itself come first,
+        followed by the ones accepting its parent types, closest first.
+        '''
+        rtypes = self._relationship_types.get(ctype)
+        if rtypes is None:
+            rtypes = []
+            for captype in [ctype] + self._get_parents(ctype):
+                for rtype in self._target_of.get(captype, ()):
+                    if rtype not in rtypes:
+                        rtypes.append(rtype)
+            rtypes = self._relationship_types[ctype] = tuple(rtypes)
+        return rtypes
+
+    def _get_definitions(self, prefix):
+        '''Return the definitions with the given prefix in lookup order.'''
+        for name, value in NodeType.TOSCA_DEF.items():
+            if name.startswith(prefix):
+                yield name, value
+        for name, value in self.custom_def.items():
+            if name.startswith(prefix) and name not in NodeType.TOSCA_DEF:
+                yield name, value
+
+    def _get_parents(self, ctype):
+        '''Return the parent types of a capability type, closest first.'''
+        parents = []
+        while True:
+            cdef = NodeType.TOSCA_DEF.get(ctype) or \
+                self.custom_def.get(ctype)
+            if not isinstance(cdef, dict):
+                break
+            ctype = cdef.get(NodeType.DERIVED_FROM)
+            if not ctype or ctype in parents:
+                break
+            parents.append(ctype)
+        return parents
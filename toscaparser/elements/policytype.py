@@ -67,11 +67,7 @@ class PolicyType(StatefulEntityType):
     @property
     def parent_type(self):
         '''Return a policy statefulentity of this node is derived from.'''
-        if not hasattr(self, 'defs'):
-            return None
-        ppolicy_entity = self.derived_from(self.defs)
-        if ppolicy_entity:
-            return PolicyType(ppolicy_entity, self.custom_def)
+        return self._get_parent_type()
 
     def get_policy(self, name):
         '''Return the definition of a policy field by name.'''
@@ -34,9 +34,10 @@ class RelationshipType(StatefulEntityType):
     @property
     def parent_type(self):
         '''Return a relationship this reletionship is derived from.'''
-        prel = self.derived_from(self.defs)
-        if prel:
-            return RelationshipType(prel, self.custom_def)
+        return self._get_parent_type()
+
+    def _parent_type_args(self, ptype):
+        return (ptype, None)
 
     @property
     def valid_target_types(self):
@@ -14,11 +14,23 @@ import logging
 import re
 
 from toscaparser.common.exception import ExceptionCollector
+from toscaparser.utils.cacheutils import LRUCache
 from toscaparser.utils.gettextutils import _
 from toscaparser.utils import validateutils
 
 log = logging.getLogger('tosca-parser')
 
+SCALAR_UNIT_REGEX = re.compile(r'([0-9.]+)\s*(\w+)')
+
+# Normalized values of the scalar-unit literals met so far, keyed by their
+# scalar-unit class, literal and requested unit
+MEMO_SIZE = 4096
+_memo = LRUCache(MEMO_SIZE)
+
+
+def _upper_units(units):
+    return dict((unit.upper(), unit) for unit in units)
+
 
 class ScalarUnit(object):
     '''Parent class for scalar-unit type.'''
@@ -31,7 +43,7 @@ class ScalarUnit(object):
 
     def __init__(self, value):
         self.value = value
-        log.debug("Scalar unit init: {}".format(value))
+        log.debug("Scalar unit init: %s", value)
 
     def _check_unit_in_scalar_standard_units(self, input_unit):
         """Check whether the input unit is following specified standard
@@ -39,26 +51,46 @@ class ScalarUnit(object):
         If unit is not following specified standard, convert it to standard
         unit after displaying a warning message.
         """
-        if input_unit in self.SCALAR_UNIT_DICT.keys():
+        if input_unit in self.SCALAR_UNIT_DICT:
             return input_unit
-        else:
-            for key in self.SCALAR_UNIT_DICT.keys():
-                if key.upper() == input_unit.upper():
-                    log.warning(_('The unit "%(unit)s" does not follow '
-                                  'scalar unit standards; using "%(key)s" '
-                                  'instead.') % {'unit': input_unit,
-                                                 'key': key})
-                    return key
-            msg = (_('The unit "%(unit)s" is not valid. Valid units are '
-                     '"%(valid_units)s".') %
-                   {'unit': input_unit,
-                    'valid_units': sorted(self.SCALAR_UNIT_DICT.keys())})
-            ExceptionCollector.appendException(ValueError(msg))
+        key = self.SCALAR_UNIT_UPPER_DICT.get(input_unit.upper())
+        if key is not None:
+            log.warning(_('The unit "%(unit)s" does not follow '
+                          'scalar unit standards; using "%(key)s" '
+                          'instead.') % {'unit': input_unit,
+                                         'key': key})
+            return key
+        msg = (_('The unit "%(unit)s" is not valid. Valid units are '
+                 '"%(valid_units)s".') %
+               {'unit': input_unit,
+                'valid_units': sorted(self.SCALAR_UNIT_DICT.keys())})
+        ExceptionCollector.appendException(ValueError(msg))
+
+    def _memoized(self, key, create, *args):
+        '''Return the memoized result of create(*args).
+
+        Only results whose computation reported no error are kept, so that
+        invalid literals keep reporting their error.
+        '''
+        try:
+            key = (type(self), str(self.value)) + key
+            value = _memo.get(key)
+        except TypeError:
+            return create(*args)
+        if value is None:
+            reported = ExceptionCollector.reported
+            value = create(*args)
+            if value is not None and ExceptionCollector.reported == reported:
+                _memo.set(key, value)
+        return value
 
     def validate_scalar_unit(self):
-        regex = re.compile('([0-9.]+)\s*(\w+)')
+        self.value = self._memoized((), self._validate_scalar_unit)
+        return self.value
+
+    def _validate_scalar_unit(self):
         try:
-            result = regex.match(str(self.value)).groups()
+            result = SCALAR_UNIT_REGEX.match(str(self.value)).groups()
             validateutils.str_to_num(result[0])
             scalar_unit = self._check_unit_in_scalar_standard_units(result[1])
             self.value = ' '.join([result[0], scalar_unit])
@@ -70,6 +102,9 @@ class ScalarUnit(object):
                            % self.value))
 
     def get_num_from_scalar_unit(self, unit=None):
+        return self._memoized((unit,), self._get_num_from_scalar_unit, unit)
+
+    def _get_num_from_scalar_unit(self, unit):
         if unit:
             unit = self._check_unit_in_scalar_standard_units(unit)
         else:
@@ -77,8 +112,7 @@ class ScalarUnit(object):
         self.validate_scalar_unit()
 
         log.debug("Scalar unit: {}".format(self.value))
-        regex = re.compile('([0-9.]+)\s*(\w+)')
-        result = regex.match(str(self.value)).groups()
+        result = SCALAR_UNIT_REGEX.match(str(self.value)).groups()
         converted = (float(validateutils.str_to_num(result[0]))
                      * self.SCALAR_UNIT_DICT[result[1]]
                      / self.SCALAR_UNIT_DICT[unit])
@@ -94,6 +128,7 @@ class ScalarUnit_Size(ScalarUnit):
                         'MiB': 1048576, 'GB': 1000000000,
                         'GiB': 1073741824, 'TB': 1000000000000,
                         'TiB': 1099511627776}
+    SCALAR_UNIT_UPPER_DICT = _upper_units(SCALAR_UNIT_DICT)
 
 
 class ScalarUnit_Time(ScalarUnit):
@@ -101,6 +136,7 @@ class ScalarUnit_Time(ScalarUnit):
     SCALAR_UNIT_DEFAULT = 'ms'
     SCALAR_UNIT_DICT = {'d': 86400, 'h': 3600, 'm': 60, 's': 1,
                         'ms': 0.001, 'us': 0.000001, 'ns': 0.000000001}
+    SCALAR_UNIT_UPPER_DICT = _upper_units(SCALAR_UNIT_DICT)
 
 
 class ScalarUnit_Frequency(ScalarUnit):
@@ -108,6 +144,7 @@ class ScalarUnit_Frequency(ScalarUnit):
     SCALAR_UNIT_DEFAULT = 'GHz'
     SCALAR_UNIT_DICT = {'Hz': 1, 'kHz': 1000,
                         'MHz': 1000000, 'GHz': 1000000000}
+    SCALAR_UNIT_UPPER_DICT = _upper_units(SCALAR_UNIT_DICT)
 
 
 scalarunit_mapping = {
@@ -14,6 +14,7 @@ from toscaparser.common.exception import ExceptionCollector
 from toscaparser.common.exception import InvalidTypeError
 from toscaparser.elements.attribute_definition import AttributeDef
 from toscaparser.elements.entity_type import EntityType
+from toscaparser.elements.entity_type import TypeRegistry
 from toscaparser.elements.property_definition import PropertyDef
 from toscaparser.unsupportedtype import UnsupportedType
 
@@ -30,22 +31,19 @@ class StatefulEntityType(EntityType):
                                                     'add_target',
                                                     'remove_target']
 
+    # Pairs of short names and the prefix they are resolved with when it is
+    # not the prefix of the type
+    NAME_PREFIXES = ()
+
     def __init__(self, entitytype, prefix, custom_def=None):
-        entire_entitytype = entitytype
-        if UnsupportedType.validate_type(entire_entitytype):
+        if UnsupportedType.validate_type(entitytype):
             self.defs = None
         else:
-            if entitytype.startswith(self.TOSCA + ":"):
-                entitytype = entitytype[(len(self.TOSCA) + 1):]
-                entire_entitytype = prefix + entitytype
-            if not entitytype.startswith(self.TOSCA):
-                entire_entitytype = prefix + entitytype
-            if entire_entitytype in list(self.TOSCA_DEF.keys()):
-                self.defs = self.TOSCA_DEF[entire_entitytype]
-                entitytype = entire_entitytype
-            elif custom_def and entitytype in list(custom_def.keys()):
-                self.defs = custom_def[entitytype]
-            else:
+            resolver = TypeRegistry.cached(
+                custom_def, (TypeNameResolver, prefix, self.NAME_PREFIXES),
+                TypeNameResolver, prefix, custom_def, self.NAME_PREFIXES)
+            entitytype, self.defs = resolver.resolve(entitytype)
+            if self.defs is None:
                 # avoid errors if self.defs = none
                 self.defs = {}
                 ExceptionCollector.appendException(
@@ -54,6 +52,10 @@ class StatefulEntityType(EntityType):
 
     def get_properties_def_objects(self):
         '''Return a list of property definition objects.'''
+        return list(self._get_view('properties_def_objects',
+                                   self._create_properties_def_objects))
+
+    def _create_properties_def_objects(self):
         properties = []
         props = self.get_definition(self.PROPERTIES)
         if props:
@@ -63,17 +65,24 @@ class StatefulEntityType(EntityType):
 
     def get_properties_def(self):
         '''Return a dictionary of property definition name-object pairs.'''
+        return self._get_view('properties_def', self._create_properties_def)
+
+    def _create_properties_def(self):
         return {prop.name: prop
                 for prop in self.get_properties_def_objects()}
 
     def get_property_def_value(self, name):
         '''Return the property definition associated with a given name.'''
         props_def = self.get_properties_def()
-        if props_def and name in props_def.keys():
+        if props_def and name in props_def:
             return props_def[name].value
 
     def get_attributes_def_objects(self):
         '''Return a list of attribute definition objects.'''
+        return list(self._get_view('attributes_def_objects',
+                                   self._create_attributes_def_objects))
+
+    def _create_attributes_def_objects(self):
         attrs = self.get_value(self.ATTRIBUTES, parent=True)
         if attrs:
             return [AttributeDef(attr, None, schema)
@@ -82,11 +91,75 @@ class StatefulEntityType(EntityType):
 
     def get_attributes_def(self):
         '''Return a dictionary of attribute definition name-object pairs.'''
+        return self._get_view('attributes_def', self._create_attributes_def)
+
+    def _create_attributes_def(self):
         return {attr.name: attr
                 for attr in self.get_attributes_def_objects()}
 
     def get_attribute_def_value(self, name):
         '''Return the attribute definition associated with a given name.'''
         attrs_def = self.get_attributes_def()
-        if attrs_def and name in attrs_def.keys():
+        if attrs_def and name in attrs_def:
             return attrs_def[name].value
+
+
+class TypeNameResolver(object):
+    '''Index of the accepted spellings of the types of a type universe.
+
+    A type may be referred to by its full name, by its name without the
+    prefix of its kind, by that short name prefixed with "tosca:" or, for
+    custom types, by the name it was imported under, namespace prefix
+    included. Every spelling is mapped to the resolved name and definition
+    so that resolving a name is a single dictionary lookup. Resolvers are
+    built once per prefix and type universe, see TypeRegistry.
+    '''
+
+    def __init__(self, prefix, custom_def=None, name_prefixes=()):
+        self.prefix = prefix
+        self.custom_def = custom_def
+        self.name_prefixes = dict(name_prefixes)
+        self._index = {}
+        spellings = list(EntityType.TOSCA_DEF)
+        prefixes = set(self.name_prefixes.values())
+        prefixes.add(prefix)
+        for name in EntityType.TOSCA_DEF:
+            for type_prefix in prefixes:
+                if name.startswith(type_prefix):
+                    short_name = name[len(type_prefix):]
+                    spellings.append(short_name)
+                    spellings.append(EntityType.TOSCA + ':' + short_name)
+        for name in custom_def or ():
+            spellings.append(name)
+            spellings.append(EntityType.TOSCA + ':' + name)
+        for spelling in spellings:
+            resolved = self._resolve(spelling)
+            if resolved[1] is not None:
+                self._index[spelling] = resolved
+
+    def resolve(self, entitytype):
+        '''Return the resolved name and definition of the given type.
+
+        The definition is None when the type is not defined.
+        '''
+        resolved = self._index.get(entitytype)
+        if resolved is None:
+            # Types defined after the index was built are still found
+            resolved = self._resolve(entitytype)
+        return resolved
+
+    def _resolve(self, entitytype):
+        tosca_prefix = EntityType.TOSCA + ':'
+        if entitytype.startswith(tosca_prefix):
+            entitytype = entitytype[len(tosca_prefix):]
+            entire_entitytype = self.prefix + entitytype
+        elif entitytype.startswith(EntityType.TOSCA):
+            entire_entitytype = entitytype
+        else:
+            entire_entitytype = self.name_prefixes.get(
+                entitytype, self.prefix) + entitytype
+        if entire_entitytype in EntityType.TOSCA_DEF:
+            return entire_entitytype, EntityType.TOSCA_DEF[entire_entitytype]
+        if self.custom_def and entitytype in self.custom_def:
+            return entitytype, self.custom_def[entitytype]
+        return entitytype, None
@@ -16,6 +16,7 @@ from toscaparser.common.exception import ExceptionCollector
 from toscaparser.common.exception import InvalidTemplateVersion
 from toscaparser.common.exception import UnknownFieldError
 from toscaparser.extensions.exttools import ExtTools
+from toscaparser.utils.lazyutils import LazyClassAttribute
 
 
 class TypeValidation(object):
@@ -37,10 +38,15 @@ class TypeValidation(object):
                                   'tosca_simple_yaml_1_1',
                                   'tosca_simple_yaml_1_2']
 
-    VALID_TEMPLATE_VERSIONS = copy.deepcopy(STANDARD_TEMPLATE_VERSIONS)
+    @LazyClassAttribute
+    def exttools(cls):
+        return ExtTools()
 
-    exttools = ExtTools()
-    VALID_TEMPLATE_VERSIONS.extend(exttools.get_versions())
+    @LazyClassAttribute
+    def VALID_TEMPLATE_VERSIONS(cls):
+        versions = copy.deepcopy(cls.STANDARD_TEMPLATE_VERSIONS)
+        versions.extend(cls.exttools.get_versions())
+        return versions
 
     def __init__(self, custom_types, import_def):
         self.import_def = import_def
@@ -10,6 +10,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+from collections import OrderedDict
 import logging
 
 from toscaparser.artifacts import Artifact
@@ -19,6 +20,7 @@ from toscaparser.common.exception import MissingRequiredFieldError
 from toscaparser.common.exception import TOSCAException
 from toscaparser.common.exception import UnknownFieldError
 from toscaparser.common.exception import ValidationError
+from toscaparser.elements.entity_type import TypeRegistry
 from toscaparser.elements.grouptype import GroupType
 from toscaparser.elements.interfaces import InterfacesDef
 from toscaparser.elements.nodetype import NodeType
@@ -55,7 +57,8 @@ class EntityTemplate(object):
         type_ = self.entity_tpl.get('type')
         UnsupportedType.validate_type(type_)
         if entity_name == 'node_type':
-            self.type_definition = NodeType(type_, custom_def) \
+            self.type_definition = \
+                TypeRegistry.get(NodeType, custom_def, type_) \
                 if type_ is not None else None
         if entity_name == 'relationship_type':
             relationship = template.get('relationship')
@@ -67,8 +70,8 @@ class EntityTemplate(object):
             else:
                 type_ = self.entity_tpl['type']
             UnsupportedType.validate_type(type_)
-            self.type_definition = RelationshipType(type_,
-                                                    None, custom_def)
+            self.type_definition = TypeRegistry.get(RelationshipType,
+                                                    custom_def, type_, None)
         if entity_name == 'policy_type':
             if not type_:
                 msg = (_('Policy definition of "%(pname)s" must have'
@@ -77,9 +80,11 @@ class EntityTemplate(object):
                     ValidationError(msg))
             self.type_definition = PolicyType(type_, custom_def)
         if entity_name == 'group_type':
-            self.type_definition = GroupType(type_, custom_def) \
+            self.type_definition = \
+                TypeRegistry.get(GroupType, custom_def, type_) \
                 if type_ is not None else None
         self._properties = None
+        self._properties_index = None
         self._interfaces = None
         self._requirements = None
         self._capabilities = None
@@ -124,15 +129,21 @@ class EntityTemplate(object):
         return self._properties
 
     def get_properties(self):
-        '''Return a dictionary of property name-object pairs.'''
-        return {prop.name: prop
-                for prop in self.get_properties_objects()}
+        '''Return an ordered dictionary of property name-object pairs.
+
+        The dictionary is built once per template and shared between
+        callers, it must not be modified.
+        '''
+        if self._properties_index is None:
+            self._properties_index = OrderedDict(
+                (prop.name, prop) for prop in self.get_properties_objects())
+        return self._properties_index
 
     def get_property_value(self, name):
         '''Return the value of a given property name.'''
-        props = self.get_properties()
-        if props and name in props.keys():
-            return props[name].value
+        prop = self.get_properties().get(name)
+        if prop is not None:
+            return prop.value
 
     @property
     def interfaces(self):
@@ -312,14 +323,14 @@ class EntityTemplate(object):
         props = []
         properties = self.type_definition.get_value(self.PROPERTIES,
                                                     self.entity_tpl) or {}
+        props_def = self.type_definition.get_properties_def()
         for name, value in properties.items():
-            props_def = self.type_definition.get_properties_def()
             if props_def and name in props_def:
                 prop = Property(name, value,
                                 props_def[name].schema, self.custom_def)
                 props.append(prop)
         for p in self.type_definition.get_properties_def_objects():
-            if p.default is not None and p.name not in properties.keys():
+            if p.default is not None and p.name not in properties:
                 prop = Property(p.name, p.default, p.schema, self.custom_def)
                 props.append(prop)
         return props
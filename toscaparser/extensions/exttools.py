@@ -24,8 +24,13 @@ REQUIRED_ATTRIBUTES = ['VERSION', 'DEFS_FILE']
 
 
 class ExtTools(object):
+    # Extensions found by the first instance, they do not change at runtime
+    _extension_info = None
+
     def __init__(self):
-        self.EXTENSION_INFO = self._load_extensions()
+        if ExtTools._extension_info is None:
+            ExtTools._extension_info = self._load_extensions()
+        self.EXTENSION_INFO = ExtTools._extension_info
 
     def _load_extensions(self):
         '''Dynamically load all the extensions .'''
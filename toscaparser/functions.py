@@ -71,6 +71,13 @@ class Function(object):
         """Validates function arguments."""
         pass
 
+    def _get_node_template_by_name(self, name):
+        if hasattr(self.tosca_tpl, 'get_node_template'):
+            return self.tosca_tpl.get_node_template(name)
+        for node_template in self.tosca_tpl.nodetemplates:
+            if node_template.name == name:
+                return node_template
+
 
 class GetInput(Function):
     """Get a property value declared within the input of the service template.
@@ -284,9 +291,9 @@ class GetAttribute(Function):
             if node_template_name == SELF and \
             not isinstance(self.context, list) \
             else node_template_name
-        for node_template in self.tosca_tpl.nodetemplates:
-            if node_template.name == name:
-                return node_template
+        node_template = self._get_node_template_by_name(name)
+        if node_template is not None:
+            return node_template
         ExceptionCollector.appendException(
             KeyError(_(
                 'Node template "{0}" was not found.'
@@ -512,9 +519,9 @@ class GetProperty(Function):
             return self.context.source
         if not hasattr(self.tosca_tpl, 'nodetemplates'):
             return
-        for node_template in self.tosca_tpl.nodetemplates:
-            if node_template.name == node_template_name:
-                return node_template
+        node_template = self._get_node_template_by_name(node_template_name)
+        if node_template is not None:
+            return node_template
         ExceptionCollector.appendException(
             KeyError(_(
                 'Node template "{0}" was not found.'
@@ -719,9 +726,9 @@ class GetOperationOutput(Function):
             if node_template_name == SELF and \
             not isinstance(self.context, list) \
             else node_template_name
-        for node_template in self.tosca_tpl.nodetemplates:
-            if node_template.name == name:
-                return node_template
+        node_template = self._get_node_template_by_name(name)
+        if node_template is not None:
+            return node_template
         ExceptionCollector.appendException(
             KeyError(_(
                 'Node template "{0}" was not found.'
@@ -814,9 +821,9 @@ class GetArtifact(Function):
             if node_template_name == SELF and \
             not isinstance(self.context, list) \
             else node_template_name
-        for node_template in self.tosca_tpl.nodetemplates:
-            if node_template.name == name:
-                return node_template
+        node_template = self._get_node_template_by_name(name)
+        if node_template is not None:
+            return node_template
         ExceptionCollector.appendException(
             KeyError(_(
                 'Node template "{0}" was not found.'
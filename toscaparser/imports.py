@@ -12,6 +12,8 @@
 
 import logging
 import os
+import six
+import yaml
 
 from toscaparser.common.exception import ExceptionCollector
 from toscaparser.common.exception import InvalidPropertyValueError
@@ -27,6 +29,98 @@ YAML_LOADER = toscaparser.utils.yamlparser.load_yaml
 log = logging.getLogger("tosca-parser")
 
 
+class ImportCache(object):
+    '''Parsed import files shared by the loaders of one template.
+
+    Every file is read and parsed at most once. Local files are keyed by
+    their absolute path and modification time, so a file edited between
+    two parses is read again; remote files are keyed by their URL.
+
+    A file system can be mounted on a directory, to serve the files below
+    it instead of the disk. It must provide isfile(path) and read(path).
+    '''
+
+    def __init__(self):
+        self._templates = {}
+        self._mounts = {}
+
+    def mount(self, root, file_system):
+        self._mounts[os.path.abspath(root)] = file_system
+
+    def _get_file_system(self, path):
+        if self._mounts:
+            path = os.path.abspath(path)
+            for root, file_system in self._mounts.items():
+                if path.startswith(root + os.sep):
+                    return file_system
+
+    def is_mounted(self, path):
+        return self._get_file_system(path) is not None
+
+    def isfile(self, path):
+        '''Check that a local file exists, on disk or in a mount.'''
+        file_system = self._get_file_system(path)
+        if file_system is not None:
+            return file_system.isfile(path)
+        return os.path.isfile(path)
+
+    def read(self, path, a_file=True):
+        '''Read and parse a file, bypassing the cache.'''
+        file_system = self._get_file_system(path) if a_file else None
+        if file_system is not None:
+            return yaml.load(file_system.read(path),
+                             Loader=toscaparser.utils.yamlparser.yaml_loader)
+        return YAML_LOADER(path, a_file)
+
+    def load(self, path, a_file=True):
+        key = self._get_key(path, a_file)
+        if key not in self._templates:
+            self._templates[key] = self.read(path, a_file)
+        return self._templates[key]
+
+    def is_current(self):
+        '''Check that no local file was modified since it was read.'''
+        for path, mtime in self._templates:
+            if mtime is not None and \
+                    self._get_key(path, True) != (path, mtime):
+                return False
+        return True
+
+    def prefetch(self, urls):
+        '''Fetch and parse remote files concurrently ahead of load().
+
+        Returns the templates newly fetched, by URL. Files failing to
+        download or parse are left out, load() fetches them again and
+        reports the error.
+        '''
+        urls = [url for url in urls if (url, None) not in self._templates]
+        fetched = {}
+        url_utils = toscaparser.utils.urlutils.UrlUtils
+        results = url_utils.map_urls(url_utils.get_content, urls)
+        for url, (content, error) in results.items():
+            if error is not None:
+                log.debug("Prefetching %s failed: %s", url, error)
+                continue
+            try:
+                tpl = yaml.load(content,
+                                Loader=toscaparser.utils.yamlparser.
+                                yaml_loader)
+            except yaml.YAMLError:
+                continue
+            self._templates[(url, None)] = fetched[url] = tpl
+        return fetched
+
+    @staticmethod
+    def _get_key(path, a_file):
+        if not a_file:
+            return (path, None)
+        path = os.path.abspath(path)
+        try:
+            return (path, os.path.getmtime(path))
+        except OSError:
+            return (path, None)
+
+
 class ImportsLoader(object):
 
     IMPORTS_SECTION = (FILE, REPOSITORY, NAMESPACE_URI, NAMESPACE_PREFIX) = \
@@ -34,8 +128,9 @@ class ImportsLoader(object):
                        'namespace_prefix')
 
     def __init__(self, importslist, path, type_definition_list=None,
-                 tpl=None):
+                 tpl=None, import_cache=None):
         self.importslist = importslist
+        self.import_cache = import_cache or ImportCache()
         self.custom_defs = {}
         self.nested_tosca_tpls = []
         if not path and not tpl:
@@ -75,6 +170,8 @@ class ImportsLoader(object):
             ExceptionCollector.appendException(ValidationError(message=msg))
             return
 
+        self._prefetch_remote_imports()
+
         def update_import_entry(fpath, defs):
             if 'imports' in defs:
                 dirname = os.path.dirname(fpath)
@@ -89,6 +186,8 @@ class ImportsLoader(object):
                                 imp['file'] = os.path.abspath(os.path.join(
                                     dirname, dname, os.path.basename(fn)))
                         imports.append(imp)
+                    elif toscaparser.utils.urlutils.UrlUtils.validate_url(f):
+                        imports.append(f)
                     else:
                         dname = os.path.dirname(f)
                         fn = os.path.abspath(os.path.join(
@@ -144,12 +243,71 @@ class ImportsLoader(object):
 
             self._update_nested_tosca_tpls(full_file_name, custom_type)
 
+    def _prefetch_remote_imports(self):
+        '''Fetch the remote files of the import graph concurrently.
+
+        The imports are walked level by level, fetching all the files of a
+        level at once. Files are loaded from the cache when the imports are
+        processed, which also reports any error.
+        '''
+        urls = self._get_remote_urls(self.importslist)
+        while urls:
+            fetched = self.import_cache.prefetch(urls)
+            urls = []
+            for tpl in fetched.values():
+                if isinstance(tpl, dict):
+                    # Relative imports of nested files are resolved once
+                    # their importing file is processed
+                    urls.extend(self._get_remote_urls(tpl.get('imports'),
+                                                      absolute_only=True))
+
+    def _get_remote_urls(self, importslist, absolute_only=False):
+        '''Return the URLs the given imports resolve to, if remote.'''
+        urls = []
+        if not isinstance(importslist, list):
+            return urls
+        url_utils = toscaparser.utils.urlutils.UrlUtils
+        for import_def in importslist:
+            if isinstance(import_def, dict) and self.FILE not in import_def:
+                uri_defs = import_def.values()
+            else:
+                uri_defs = [import_def]
+            for uri_def in uri_defs:
+                if isinstance(uri_def, dict):
+                    file_name = uri_def.get(self.FILE)
+                    repository = uri_def.get(self.REPOSITORY)
+                else:
+                    file_name, repository = uri_def, None
+                if not isinstance(file_name, six.string_types):
+                    continue
+                url = None
+                if url_utils.validate_url(file_name):
+                    url = file_name
+                elif repository:
+                    repos = self.repositories
+                    repo_def = repos.get(repository) \
+                        if isinstance(repos, dict) else None
+                    if isinstance(repo_def, dict) and isinstance(
+                            repo_def.get('url'), six.string_types):
+                        url = repo_def['url'].strip().rstrip("//") + \
+                            "/" + file_name
+                elif not absolute_only and self.path and \
+                        url_utils.validate_url(self.path) and \
+                        not os.path.isabs(file_name):
+                    url = url_utils.join_url(self.path, file_name)
+                if url and url_utils.validate_url(url) and url not in urls:
+                    urls.append(url)
+        return urls
+
     def _update_custom_def(self, custom_type, namespace_prefix):
         outer_custom_types = {}
         for type_def in self.type_definition_list:
             outer_custom_types = custom_type.get(type_def)
             if outer_custom_types:
                 if type_def == "imports":
+                    # The imported template may be shared through the
+                    # import cache, so leave its own list untouched
+                    outer_custom_types = list(outer_custom_types)
                     for i in self.custom_defs.get('imports', []):
                         if i not in outer_custom_types:
                             outer_custom_types.append(i)
@@ -237,7 +395,7 @@ class ImportsLoader(object):
             return None, None
 
         if toscaparser.utils.urlutils.UrlUtils.validate_url(file_name):
-            return file_name, YAML_LOADER(file_name, False)
+            return file_name, self.import_cache.load(file_name, False)
         elif not repository:
             import_template = None
             if self.path:
@@ -255,16 +413,16 @@ class ImportsLoader(object):
                     a_file = False
                 else:
                     a_file = True
-                    main_a_file = os.path.isfile(self.path)
+                    main_a_file = self.import_cache.isfile(self.path)
 
                     if main_a_file:
-                        if os.path.isfile(file_name):
+                        if self.import_cache.isfile(file_name):
                             import_template = file_name
                         else:
                             full_path = os.path.join(
                                 os.path.dirname(os.path.abspath(self.path)),
                                 file_name)
-                            if os.path.isfile(full_path):
+                            if self.import_cache.isfile(full_path):
                                 import_template = full_path
                             else:
                                 file_path = file_name.rpartition("/")
@@ -274,7 +432,8 @@ class ImportsLoader(object):
                                         file_path[0]):
                                         import_template = dir_path + "/" +\
                                             file_path[2]
-                                        if not os.path.isfile(import_template):
+                                        if not self.import_cache.isfile(
+                                                import_template):
                                             msg = (_('"%(import_template)s" is'
                                                      'not a valid file')
                                                    % {'import_template':
@@ -283,7 +442,8 @@ class ImportsLoader(object):
                                             ExceptionCollector.appendException
                                             (ValueError(msg))
             else:  # template is pre-parsed
-                if os.path.isabs(file_name) and os.path.isfile(file_name):
+                if os.path.isabs(file_name) and \
+                        self.import_cache.isfile(file_name):
                     a_file = True
                     import_template = file_name
                 else:
@@ -301,7 +461,8 @@ class ImportsLoader(object):
                     ImportError(_('Import "%s" is not valid.') %
                                 import_uri_def))
                 return None, None
-            return import_template, YAML_LOADER(import_template, a_file)
+            return import_template, self.import_cache.load(
+                import_template, a_file)
 
         if short_import_notation:
             log.error(_('Import "%(name)s" is not valid.') % import_uri_def)
@@ -328,7 +489,7 @@ class ImportsLoader(object):
                 return None, None
 
         if toscaparser.utils.urlutils.UrlUtils.validate_url(full_url):
-            return full_url, YAML_LOADER(full_url, False)
+            return full_url, self.import_cache.load(full_url, False)
         else:
             msg = (_('repository url "%(n_uri)s" is not valid in import '
                      'definition "%(tpl)s".')
@@ -11,6 +11,7 @@
 #    under the License.
 
 
+import copy
 import logging
 
 from toscaparser.common.exception import ExceptionCollector
@@ -37,7 +38,12 @@ log = logging.getLogger('tosca-parser')
 class NodeTemplate(EntityTemplate):
     '''Node template from a Tosca profile.'''
     def __init__(self, name, node_templates, custom_def=None,
-                 available_rel_tpls=None, available_rel_types=None):
+                 available_rel_tpls=None, available_rel_types=None,
+                 available_node_tpls=None):
+        # Register first so that requirements resolved while this template
+        # is validated already point at it
+        if available_node_tpls is not None:
+            available_node_tpls.setdefault(name, self)
         super(NodeTemplate, self).__init__(name, node_templates[name],
                                            'node_type',
                                            custom_def)
@@ -48,6 +54,7 @@ class NodeTemplate(EntityTemplate):
         self.relationship_tpl = []
         self.available_rel_tpls = available_rel_tpls
         self.available_rel_types = available_rel_types
+        self.available_node_tpls = available_node_tpls
         self._relationships = {}
         self.substitution_mapped = None
         log.debug("Nodetemplate: {}".format(name))
@@ -99,7 +106,7 @@ class NodeTemplate(EntityTemplate):
                              % {'node': node, 'name': self.name}))
                 return
 
-            related_tpl = NodeTemplate(node, self.templates, self.custom_def)
+            related_tpl = self._get_node_template(node)
             relationship = value.get('relationship') \
                 if isinstance(value, dict) else None
             # check if it's type has relationship defined
@@ -147,6 +154,9 @@ class NodeTemplate(EntityTemplate):
                                            '"%s"') % related_tpl.name,
                                     required=self.TYPE))
                     for rtype in self.type_definition.relationship.keys():
+                        # The relationship types of the node type are shared,
+                        # every requirement gets its own key
+                        rtype = copy.copy(rtype)
                         if rtype.type == relationship:
                             explicit_relation[rtype] = related_tpl
                             related_tpl._add_relationship_template(req,
@@ -168,6 +178,22 @@ class NodeTemplate(EntityTemplate):
                                                 req, rtype.type, self)
         return explicit_relation
 
+    def _get_node_template(self, name):
+        """Return the node template instance for the given name
+
+        Within a topology every template is built once and shared through
+        available_node_tpls; a standalone template builds its own.
+        """
+        if self.available_node_tpls is None:
+            return NodeTemplate(name, self.templates, self.custom_def)
+        tpl = self.available_node_tpls.get(name)
+        if tpl is None:
+            tpl = NodeTemplate(name, self.templates, self.custom_def,
+                               self.available_rel_tpls,
+                               self.available_rel_types,
+                               self.available_node_tpls)
+        return tpl
+
     def _add_relationship_template(self, requirement, rtype, source):
         req = requirement.copy()
         req['type'] = rtype
@@ -175,6 +201,13 @@ class NodeTemplate(EntityTemplate):
         self.relationship_tpl.append(tpl)
 
     def get_relationship_template(self):
+        '''Return the relationship templates of this node template.
+
+        They are the relationship templates its requirements use, and the
+        ones built for the requirements targeting it. Within a topology
+        every template is shared, so the latter include the relationships
+        of all the node templates requiring it, each with its source.
+        '''
         return self.relationship_tpl
 
     def _add_next(self, nodetpl, relationship):
@@ -184,9 +217,9 @@ class NodeTemplate(EntityTemplate):
     def related_nodes(self):
         if not self.related:
             for relation, node in self.type_definition.relationship.items():
-                for tpl in self.templates:
-                    if tpl == node.type:
-                        self.related[NodeTemplate(self.name, tpl)] = relation
+                for name, tpl in self.templates.items():
+                    if isinstance(tpl, dict) and tpl.get('type') == node.type:
+                        self.related[self._get_node_template(name)] = relation
         return self.related.keys()
 
     def validate(self, tosca_tpl=None):
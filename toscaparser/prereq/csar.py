@@ -10,20 +10,25 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
+import errno
+import hashlib
+import logging
 import os
-import requests
-import shutil
 from six.moves import urllib
 import six
 import tempfile
+import time
 import yaml
 import zipfile
 
 from toscaparser.common.exception import ExceptionCollector
 from toscaparser.common.exception import URLException
 from toscaparser.common.exception import ValidationError
+from toscaparser.imports import ImportCache
 from toscaparser.imports import ImportsLoader
 from toscaparser.utils.gettextutils import _
+from toscaparser.utils import poolutils
 from toscaparser.utils.urlutils import UrlUtils
 from toscaparser.functions import is_function
 
@@ -32,16 +37,101 @@ try:  # Python 2.x
 except ImportError:  # Python 3.x
     from io import BytesIO
 
+log = logging.getLogger("tosca-parser")
+
+# Digest of a file of a CSAR checked against its manifest; digest is None
+# when the file is missing or the algorithm is not supported
+ArtifactDigest = collections.namedtuple(
+    'ArtifactDigest',
+    ['path', 'algorithm', 'expected', 'digest', 'size', 'seconds'])
+
+
+def parse_manifest(text):
+    '''Return the (source, algorithm, hash) entries of a manifest file.
+
+    The manifest lists its files in blocks of "Source", "Algorithm" and
+    "Hash" keys, as SOL004 describes; its metadata and signature are
+    ignored.
+    '''
+    entries = []
+    entry = {}
+    in_signature = False
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith('-----BEGIN'):
+            in_signature = True
+        elif line.startswith('-----END'):
+            in_signature = False
+        if in_signature or ':' not in line:
+            continue
+        key, value = [part.strip() for part in line.split(':', 1)]
+        if key == 'Source':
+            entry = {'Source': value}
+            entries.append(entry)
+        elif key in ('Algorithm', 'Hash') and entry:
+            entry[key] = value
+    return [(entry['Source'], entry.get('Algorithm'), entry.get('Hash'))
+            for entry in entries]
+
+
+class CSARFileSystem(object):
+    '''Files of a CSAR, read from the archive without extracting it.
+
+    The members are seen as files below root, a directory which does not
+    need to exist.
+    '''
+
+    def __init__(self, zfile, root):
+        self.zfile = zfile
+        self.root = os.path.abspath(root)
+        self._names = set(name for name in zfile.namelist()
+                          if not name.endswith('/'))
+
+    def get_member(self, path):
+        '''Return the name of the member at the path, if any.'''
+        path = os.path.relpath(os.path.abspath(path), self.root)
+        if path.startswith(os.pardir):
+            return None
+        name = path.replace(os.sep, '/')
+        if name in self._names:
+            return name
+
+    def namelist(self):
+        '''Return the paths of the files in the CSAR.'''
+        return sorted(self._names)
+
+    def isfile(self, path):
+        return self.get_member(path) is not None
+
+    def read(self, path):
+        name = self.get_member(path)
+        if name is None:
+            raise IOError(errno.ENOENT, os.strerror(errno.ENOENT), path)
+        return self.zfile.read(name)
+
 
 class CSAR(object):
 
-    def __init__(self, csar_file, a_file=True):
+    # Digest algorithms accepted in manifests, by hashlib name
+    DIGEST_ALGORITHMS = ('sha256', 'sha384', 'sha512')
+    # Bytes read at once when hashing a file
+    CHUNK_SIZE = 1024 * 1024
+    # Files hashed concurrently
+    MAX_WORKERS = 4
+
+    def __init__(self, csar_file, a_file=True, import_cache=None):
         self.path = csar_file
         self.a_file = a_file
+        self.import_cache = import_cache or ImportCache()
         self.is_validated = False
         self.error_caught = False
         self.csar = None
+        self.zfile = None
+        self.file_system = None
+        # Directory the members are seen in, created only when extracting
         self.temp_dir = None
+        # Reachability of the remote resources referenced, by URL
+        self._url_checks = {}
 
     def validate(self):
         """Validate the provided CSAR file."""
@@ -63,7 +153,7 @@ class CSAR(object):
                     ValidationError(message=missing_err_msg))
                 return False
             else:
-                self.csar = BytesIO(UrlUtils.get_url(self.path).content)
+                self.csar = BytesIO(UrlUtils.get_content(self.path))
 
         # validate that it is a valid zip file
         if not zipfile.is_zipfile(self.csar):
@@ -120,6 +210,10 @@ class CSAR(object):
                 ValidationError(message=err_msg))
             return False
 
+        self.temp_dir = tempfile.NamedTemporaryFile().name
+        self.file_system = CSARFileSystem(self.zfile, self.temp_dir)
+        self.import_cache.mount(self.temp_dir, self.file_system)
+
         # validate that external references in the main template actually
         # exist and are accessible
         self._validate_external_references()
@@ -146,6 +240,107 @@ class CSAR(object):
     def get_version(self):
         return self._get_metadata('CSAR-Version')
 
+    def get_manifest(self):
+        '''Return the path of the manifest file in the CSAR, if any.
+
+        It is the ETSI-Entry-Manifest metadata or else the file next to the
+        main template with the .mf extension.
+        '''
+        manifest = self._get_metadata('ETSI-Entry-Manifest')
+        if manifest:
+            return manifest
+        main_template = self.get_main_template()
+        if main_template:
+            manifest = os.path.splitext(main_template)[0] + '.mf'
+            if manifest in self.zfile.namelist():
+                return manifest
+
+    def verify_digests(self):
+        '''Check the files of the CSAR against the digests of its manifest.
+
+        Files are hashed concurrently, reading them from the archive in
+        chunks of CHUNK_SIZE bytes. Returns an ArtifactDigest per file
+        listed, in the order of the manifest; remote files are not checked.
+        '''
+        if not self.is_validated:
+            self.validate()
+        manifest = self.get_manifest() if self.zfile else None
+        if not manifest:
+            return []
+        if manifest not in self.zfile.namelist():
+            ExceptionCollector.appendException(
+                ValidationError(message=_(
+                    'The manifest "%(manifest)s" of the CSAR "%(csar)s" '
+                    'does not exist.') % {'manifest': manifest,
+                                          'csar': self.path}))
+            self.error_caught = True
+            return []
+        entries = [(source, algorithm, expected) for source, algorithm,
+                   expected in parse_manifest(
+                       self.zfile.read(manifest).decode('utf-8'))
+                   if not UrlUtils.validate_url(source)]
+        results = poolutils.map_in_threads(self._hash_member, entries,
+                                           self.MAX_WORKERS)
+        digests = []
+        for entry, (result, error) in results.items():
+            if error is not None:
+                result = ArtifactDigest(*(entry + (None, None, None)))
+            else:
+                log.debug("Hashed %s (%s bytes) in %s seconds", result.path,
+                          result.size, result.seconds)
+            digests.append(result)
+            self._report_digest(result, error)
+        return digests
+
+    def _hash_member(self, entry):
+        source, algorithm, expected = entry
+        name = self.file_system.get_member(
+            os.path.join(self.temp_dir, source))
+        hash_name = (algorithm or '').replace('-', '').lower()
+        if name is None or hash_name not in self.DIGEST_ALGORITHMS:
+            return ArtifactDigest(source, algorithm, expected, None, None,
+                                  None)
+        start = time.time()
+        digest = hashlib.new(hash_name)
+        size = 0
+        # Every thread opens the archive on its own when it is a file
+        zfile = zipfile.ZipFile(self.csar) \
+            if isinstance(self.csar, six.string_types) else self.zfile
+        try:
+            with zfile.open(name) as member:
+                while True:
+                    chunk = member.read(self.CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    size += len(chunk)
+        finally:
+            if zfile is not self.zfile:
+                zfile.close()
+        return ArtifactDigest(source, algorithm, expected, digest.hexdigest(),
+                              size, time.time() - start)
+
+    def _report_digest(self, result, error=None):
+        values = {'path': result.path, 'csar': self.path,
+                  'algorithm': result.algorithm, 'error': error}
+        if error is not None:
+            msg = _('The file "%(path)s" in the CSAR "%(csar)s" cannot be '
+                    'read: %(error)s.') % values
+        elif result.digest is not None:
+            if result.digest == (result.expected or '').lower():
+                return
+            msg = _('The digest of "%(path)s" in the CSAR "%(csar)s" does '
+                    'not match its manifest.') % values
+        elif (result.algorithm or '').replace('-', '').lower() not in \
+                self.DIGEST_ALGORITHMS:
+            msg = _('The digest algorithm "%(algorithm)s" of "%(path)s" in '
+                    'the CSAR "%(csar)s" is not supported.') % values
+        else:
+            msg = _('The file "%(path)s" listed in the manifest of the CSAR '
+                    '"%(csar)s" does not exist.') % values
+        ExceptionCollector.appendException(ValidationError(message=msg))
+        self.error_caught = True
+
     def get_main_template(self):
         entry_def = self._get_metadata('Entry-Definitions')
         if entry_def in self.zfile.namelist():
@@ -179,77 +374,106 @@ class CSAR(object):
         return self.metadata['Description']
 
     def decompress(self):
+        '''Extract all the files of the CSAR below temp_dir.'''
+        self.extract()
+
+    def extract(self, paths=None):
+        '''Extract files of the CSAR below temp_dir.
+
+        The files are given by their path in the CSAR, all of them by
+        default. Files extracted already are left as they are. Returns the
+        paths of the extracted files.
+        '''
         if not self.is_validated:
             self.validate()
-        self.temp_dir = tempfile.NamedTemporaryFile().name
-        with zipfile.ZipFile(self.csar, "r") as zf:
-            zf.extractall(self.temp_dir)
+        if self.file_system is None:
+            return []
+        if paths is None:
+            paths = self.file_system.namelist()
+        extracted = []
+        for path in paths:
+            name = self.file_system.get_member(
+                os.path.join(self.temp_dir, path))
+            if name is None:
+                raise IOError(errno.ENOENT, os.strerror(errno.ENOENT), path)
+            target = os.path.join(self.temp_dir, *name.split('/'))
+            if not os.path.isfile(target):
+                self.zfile.extract(name, self.temp_dir)
+            extracted.append(target)
+        return extracted
 
     def _validate_external_references(self):
-        """Extracts files referenced in the main template
+        """Checks the files referenced in the main template exist
 
         These references are currently supported:
         * imports
         * interface implementations
         * artifacts
         """
-        try:
-            self.decompress()
-            main_tpl_file = self.get_main_template()
-            if not main_tpl_file:
-                return
-            main_tpl = self.get_main_template_yaml()
-
-            if 'imports' in main_tpl:
-                ImportsLoader(main_tpl['imports'],
-                              os.path.join(self.temp_dir, main_tpl_file))
-
-            if 'topology_template' in main_tpl:
-                topology_template = main_tpl['topology_template']
-
-                if 'node_templates' in topology_template:
-                    node_templates = topology_template['node_templates']
-
-                    for node_template_key in node_templates:
-                        node_template = node_templates[node_template_key]
-                        if 'artifacts' in node_template:
-                            artifacts = node_template['artifacts']
-                            for artifact_key in artifacts:
-                                artifact = artifacts[artifact_key]
-                                if isinstance(artifact, six.string_types):
-                                    self._validate_external_reference(
-                                        main_tpl_file,
-                                        artifact)
-                                elif isinstance(artifact, dict):
-                                    if 'file' in artifact:
-                                        self._validate_external_reference(
-                                            main_tpl_file,
-                                            artifact['file'])
-                                else:
-                                    ExceptionCollector.appendException(
-                                        ValueError(_('Unexpected artifact '
-                                                     'definition for "%s".')
-                                                   % artifact_key))
-                                    self.error_caught = True
-                        if 'interfaces' in node_template:
-                            interfaces = node_template['interfaces']
-                            for interface_key in interfaces:
-                                interface = interfaces[interface_key]
-                                for opertation_key in interface:
-                                    operation = interface[opertation_key]
-                                    if isinstance(operation, six.string_types):
-                                        self._validate_external_reference(
+        main_tpl_file = self.get_main_template()
+        if not main_tpl_file:
+            return
+        main_tpl = self.get_main_template_yaml()
+
+        if 'imports' in main_tpl:
+            ImportsLoader(main_tpl['imports'],
+                          os.path.join(self.temp_dir, main_tpl_file),
+                          import_cache=self.import_cache)
+
+        references = []
+        if 'topology_template' in main_tpl:
+            topology_template = main_tpl['topology_template']
+
+            if 'node_templates' in topology_template:
+                node_templates = topology_template['node_templates']
+
+                for node_template_key in node_templates:
+                    node_template = node_templates[node_template_key]
+                    if 'artifacts' in node_template:
+                        artifacts = node_template['artifacts']
+                        for artifact_key in artifacts:
+                            artifact = artifacts[artifact_key]
+                            if isinstance(artifact, six.string_types):
+                                references.append((main_tpl_file,
+                                                   artifact))
+                            elif isinstance(artifact, dict):
+                                if 'file' in artifact:
+                                    references.append((main_tpl_file,
+                                                       artifact['file']))
+                            else:
+                                ExceptionCollector.appendException(
+                                    ValueError(_('Unexpected artifact '
+                                                 'definition for "%s".')
+                                               % artifact_key))
+                                self.error_caught = True
+                    if 'interfaces' in node_template:
+                        interfaces = node_template['interfaces']
+                        for interface_key in interfaces:
+                            interface = interfaces[interface_key]
+                            for opertation_key in interface:
+                                operation = interface[opertation_key]
+                                if isinstance(operation, six.string_types):
+                                    references.append((main_tpl_file,
+                                                       operation,
+                                                       False))
+                                elif isinstance(operation, dict):
+                                    if 'implementation' in operation:
+                                        references.append((
                                             main_tpl_file,
-                                            operation,
-                                            False)
-                                    elif isinstance(operation, dict):
-                                        if 'implementation' in operation:
-                                            self._validate_external_reference(
-                                                main_tpl_file,
-                                                operation['implementation'])
-        finally:
-            if self.temp_dir:
-                shutil.rmtree(self.temp_dir)
+                                            operation['implementation']))
+
+        # Check the remote resources concurrently, then report in order
+        self._check_urls(reference[1] for reference in references)
+        for reference in references:
+            self._validate_external_reference(*reference)
+
+    def _check_urls(self, resources):
+        urls = [resource for resource in resources
+                if isinstance(resource, six.string_types) and
+                UrlUtils.validate_url(resource) and
+                resource not in self._url_checks]
+        self._url_checks.update(UrlUtils.map_urls(UrlUtils.url_accessible,
+                                                  urls))
 
     def _validate_external_reference(self, tpl_file, resource_file,
                                      raise_exc=True):
@@ -266,21 +490,16 @@ class CSAR(object):
         if UrlUtils.validate_url(resource_file):
             msg = (_('The resource at "%s" cannot be accessed.') %
                    resource_file)
-            try:
-                if UrlUtils.url_accessible(resource_file):
-                    return
-                else:
-                    ExceptionCollector.appendException(
-                        URLException(what=msg))
-                    self.error_caught = True
-            except Exception:
-                ExceptionCollector.appendException(
-                    URLException(what=msg))
-                self.error_caught = True
+            if resource_file not in self._url_checks:
+                self._check_urls([resource_file])
+            if self._url_checks[resource_file][0]:
+                return
+            ExceptionCollector.appendException(URLException(what=msg))
+            self.error_caught = True
 
-        if os.path.isfile(os.path.join(self.temp_dir,
-                                       os.path.dirname(tpl_file),
-                                       resource_file)):
+        if self.file_system.isfile(os.path.join(self.temp_dir,
+                                                os.path.dirname(tpl_file),
+                                                resource_file)):
             return
 
         if raise_exc:
@@ -60,16 +60,14 @@ class RelationshipTemplate(EntityTemplate):
             properties = self.entity_tpl.get(self.PROPERTIES) or {}
 
         if properties:
+            props_def = self.type_definition.get_properties_def()
             for name, value in properties.items():
-                props_def = self.type_definition.get_properties_def()
                 if props_def and name in props_def:
-                    if name in properties.keys():
-                        value = properties.get(name)
                     prop = Property(name, value,
                                     props_def[name].schema, self.custom_def)
                     props.append(prop)
         for p in self.type_definition.get_properties_def_objects():
-            if p.default is not None and p.name not in properties.keys():
+            if p.default is not None and p.name not in properties:
                 prop = Property(p.name, p.default, p.schema, self.custom_def)
                 props.append(prop)
         return props
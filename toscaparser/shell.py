@@ -12,11 +12,17 @@
 
 
 import argparse
+import glob
+import json
 import logging
+import multiprocessing
 import os
 import sys
+import time
 
+from toscaparser.common.exception import ExceptionCollector
 from toscaparser.common.exception import ValidationError
+from toscaparser.elements.entity_type import EntityType
 from toscaparser.tosca_template import ToscaTemplate
 from toscaparser.utils.gettextutils import _
 import toscaparser.utils.urlutils
@@ -32,6 +38,7 @@ It can be used as,
 #tosca-parser --template-file=<path to the YAML template>
 #tosca-parser --template-file=<path to the CSAR zip file>
 #tosca-parser --template-file=<URL to the template or CSAR>
+#tosca-parser --batch <files, directories or glob patterns> [--jobs=<N>]
 
 e.g.
 #tosca-parser
@@ -42,6 +49,8 @@ e.g.
 
 log = logging.getLogger("tosca-parser")
 
+TEMPLATE_EXTENSIONS = ('.yaml', '.yml', '.zip', '.csar')
+
 
 class ParserShell(object):
 
@@ -60,11 +69,24 @@ class ParserShell(object):
     def get_parser(self, argv):
         parser = argparse.ArgumentParser(prog="tosca-parser")
 
-        parser.add_argument('-f', '--template-file',
+        inputs = parser.add_mutually_exclusive_group(required=True)
+        inputs.add_argument('-f', '--template-file',
                             metavar='<filename>',
-                            required=True,
                             help=_('YAML template or CSAR file to parse.'))
 
+        inputs.add_argument('--batch',
+                            metavar='<path>', nargs='+',
+                            help=_('YAML templates, CSAR files, directories '
+                                   'or glob patterns to validate in '
+                                   'parallel, reporting one JSON line per '
+                                   'template and a final summary.'))
+
+        parser.add_argument('-j', '--jobs',
+                            metavar='<number>', type=int, default=None,
+                            help=_('Number of worker processes used by '
+                                   '--batch, defaults to the number of '
+                                   'CPUs.'))
+
         parser.add_argument('-nrpv', dest='no_required_paras_check',
                             action='store_true', default=False,
                             help=_('Ignore input parameter validation '
@@ -95,6 +117,11 @@ class ParserShell(object):
             verbose = True
             self.log.setLevel(logging.DEBUG)
 
+        if args.batch:
+            failed = self.batch(args.batch, args.jobs,
+                                no_required_paras_check=nrpv)
+            return 1 if failed else 0
+
         if os.path.isfile(path):
             self.parse(path, no_required_paras_check=nrpv,
                        debug_mode=debug, verbose=verbose)
@@ -106,6 +133,43 @@ class ParserShell(object):
             raise ValueError(_('"%(path)s" is not a valid file.')
                              % {'path': path})
 
+    def batch(self, paths, jobs=None, no_required_paras_check=False,
+              out=None):
+        '''Validate many templates on a pool of worker processes.
+
+        Writes one JSON line per template, in input order, followed by a
+        summary line, and returns the number of templates that failed.
+        Workers are reused across templates so that they keep their loaded
+        type definitions warm.
+        '''
+        out = out or sys.stdout
+        start = time.time()
+        tasks = [(path, no_required_paras_check)
+                 for path in expand_template_paths(paths)]
+        summary = {'total': 0, 'valid': 0, 'invalid': 0, 'error': 0}
+
+        pool = None
+        if jobs == 1 or len(tasks) < 2:
+            results = (_validate_template(task) for task in tasks)
+        else:
+            pool = multiprocessing.Pool(jobs, _init_worker)
+            results = pool.imap(_validate_template, tasks)
+        try:
+            for result in results:
+                summary['total'] += 1
+                summary[result['status']] += 1
+                out.write(json.dumps(result, sort_keys=True) + '\n')
+                out.flush()
+        finally:
+            if pool:
+                pool.close()
+                pool.join()
+
+        summary['time'] = round(time.time() - start, 3)
+        out.write(json.dumps({'summary': summary}, sort_keys=True) + '\n')
+        out.flush()
+        return summary['invalid'] + summary['error']
+
     def parse(self, path, a_file=True, no_required_paras_check=False,
               debug_mode=False, verbose=False):
         nrpv = no_required_paras_check
@@ -186,11 +250,67 @@ class ParserShell(object):
                     print("\t" + output.name)
 
 
+def expand_template_paths(paths):
+    '''Expand files, directories and glob patterns into template paths.
+
+    Directories are searched recursively for YAML and CSAR files. Paths
+    that match nothing are kept so that they are reported as errors.
+    '''
+    templates = []
+    seen = set()
+
+    def add(path):
+        if path not in seen:
+            seen.add(path)
+            templates.append(path)
+
+    for path in paths:
+        if toscaparser.utils.urlutils.UrlUtils.validate_url(path):
+            add(path)
+            continue
+        for match in sorted(glob.glob(path)) or [path]:
+            if not os.path.isdir(match):
+                add(match)
+                continue
+            for root, dirs, files in os.walk(match):
+                dirs.sort()
+                for name in sorted(files):
+                    if name.lower().endswith(TEMPLATE_EXTENSIONS):
+                        add(os.path.join(root, name))
+    return templates
+
+
+def _init_worker():
+    # Load the normative definitions once per worker, not once per template
+    EntityType.TOSCA_DEF
+
+
+def _validate_template(task):
+    path, no_required_paras_check = task
+    start = time.time()
+    result = {'path': path, 'status': 'valid', 'errors': []}
+    a_file = not toscaparser.utils.urlutils.UrlUtils.validate_url(path)
+    try:
+        ToscaTemplate(path, None, a_file,
+                      no_required_paras_check=no_required_paras_check)
+    except ValidationError as e:
+        result['status'] = 'invalid'
+        result['errors'] = (ExceptionCollector.getExceptionsReport(False) or
+                            [e.message])
+    except Exception as e:
+        result['status'] = 'error'
+        result['errors'] = ['%s: %s' % (e.__class__.__name__, e)]
+    finally:
+        ExceptionCollector.stop()
+    result['time'] = round(time.time() - start, 3)
+    return result
+
+
 def main(args=None):
     if args is None:
         args = sys.argv[1:]
-    ParserShell().main(args)
+    return ParserShell().main(args)
 
 
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
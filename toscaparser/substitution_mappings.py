@@ -10,6 +10,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+from collections import OrderedDict
 import logging
 
 from toscaparser.common.exception import ExceptionCollector
@@ -21,6 +22,7 @@ from toscaparser.common.exception import MissingRequiredOutputError
 from toscaparser.common.exception import TOSCAException
 from toscaparser.common.exception import UnknownFieldError
 from toscaparser.common.exception import UnknownOutputError
+from toscaparser.elements.entity_type import TypeRegistry
 from toscaparser.elements.nodetype import NodeType
 from toscaparser.properties import Property
 from toscaparser.utils.gettextutils import _
@@ -51,8 +53,10 @@ class SubstitutionMappings(object):
         self.custom_defs = custom_defs or {}
         self._validate()
 
-        self.type_definition = NodeType(self.type, custom_defs)
+        self.type_definition = TypeRegistry.get(NodeType, custom_defs,
+                                                self.type)
         self._properties = None
+        self._properties_index = None
         self._capabilities = None
         self._requirements = None
         self._interfaces = None
@@ -86,7 +90,7 @@ class SubstitutionMappings(object):
 
     @property
     def node_definition(self):
-        return NodeType(self.node_type, self.custom_defs)
+        return TypeRegistry.get(NodeType, self.custom_defs, self.node_type)
 
     # Needed to support TOSCA Simple YAML 1.2
     def get_properties_objects(self):
@@ -96,28 +100,34 @@ class SubstitutionMappings(object):
         return self._properties
 
     def get_properties(self):
-        '''Return a dictionary of property name-object pairs.'''
-        return {prop.name: prop
-                for prop in self.get_properties_objects()}
+        '''Return an ordered dictionary of property name-object pairs.
+
+        The dictionary is built once and shared between callers, it must
+        not be modified.
+        '''
+        if self._properties_index is None:
+            self._properties_index = OrderedDict(
+                (prop.name, prop) for prop in self.get_properties_objects())
+        return self._properties_index
 
     def get_property_value(self, name):
         '''Return the value of a given property name.'''
-        props = self.get_properties()
-        if props and name in props.keys():
-                return props[name].value
+        prop = self.get_properties().get(name)
+        if prop is not None:
+            return prop.value
 
     def _create_properties(self):
         props = []
         properties = self.type_definition.get_value(self.PROPERTIES,
                                                     self.sub_mapping_def) or {}
+        props_def = self.type_definition.get_properties_def()
         for name, value in properties.items():
-            props_def = self.type_definition.get_properties_def()
             if props_def and name in props_def:
                 prop = Property(name, value,
                                 props_def[name].schema, self.custom_defs)
                 props.append(prop)
         for p in self.type_definition.get_properties_def_objects():
-            if p.default is not None and p.name not in properties.keys():
+            if p.default is not None and p.name not in properties:
                 prop = Property(p.name, p.default, p.schema, self.custom_defs)
                 props.append(prop)
         return props
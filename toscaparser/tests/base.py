@@ -13,13 +13,19 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import hashlib
 import os
+from six.moves import BaseHTTPServer
+from six.moves import socketserver
+import threading
+import time
 
 import fixtures
 import testscenarios
 import testtools
 
 from toscaparser.tosca_template import ToscaTemplate
+from toscaparser.utils import yamlparser
 
 _TRUE_VALUES = ('True', 'true', '1', 'yes')
 
@@ -43,6 +49,9 @@ class TestCase(testscenarios.TestWithScenarios, testtools.TestCase):
 
         self.useFixture(fixtures.NestedTempfile())
         self.useFixture(fixtures.TempHomeDir())
+        # Tests enable the caches on disk in their own directories
+        self.useFixture(fixtures.EnvironmentVariable(
+            yamlparser.CACHE_DIR_ENV))
 
         if os.environ.get('OS_STDOUT_CAPTURE') in _TRUE_VALUES:
             stdout = self.useFixture(fixtures.StringStream('stdout')).stream
@@ -63,3 +72,82 @@ class TestCase(testscenarios.TestWithScenarios, testtools.TestCase):
             os.path.dirname(os.path.abspath(__file__)),
             'data',
             filename))
+
+
+class HTTPServerFixture(fixtures.Fixture):
+
+    """Serve the files of a directory over HTTP on localhost.
+
+    The requests received are recorded in requests as (method, path) pairs
+    and their response codes in responses; max_active tells how many were
+    served at the same time. Every request waits delay seconds before being
+    answered. Files are sent with an ETag, honoured by If-None-Match.
+    """
+
+    def __init__(self, directory, delay=0):
+        super(HTTPServerFixture, self).__init__()
+        self.directory = directory
+        self.delay = delay
+
+    def _setUp(self):
+        self.requests = []
+        self.responses = []
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+        self.useFixture(fixtures.EnvironmentVariable('no_proxy', '*'))
+        fixture = self
+
+        class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+            def do_GET(self):
+                fixture._handle(self, True)
+
+            def do_HEAD(self):
+                fixture._handle(self, False)
+
+            def log_message(self, *args):
+                pass
+
+        class Server(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+            daemon_threads = True
+
+        self.server = Server(('127.0.0.1', 0), Handler)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def url(self, path):
+        return 'http://127.0.0.1:%d/%s' % (self.server.server_port, path)
+
+    def _handle(self, handler, send_body):
+        with self._lock:
+            self.requests.append((handler.command, handler.path))
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            time.sleep(self.delay)
+            path = os.path.join(self.directory, handler.path.lstrip('/'))
+            if not os.path.isfile(path):
+                self.responses.append(404)
+                handler.send_error(404)
+                return
+            with open(path, 'rb') as f:
+                content = f.read()
+            etag = '"%s"' % hashlib.sha1(content).hexdigest()
+            if handler.headers.get('If-None-Match') == etag:
+                self.responses.append(304)
+                handler.send_response(304)
+                handler.end_headers()
+                return
+            self.responses.append(200)
+            handler.send_response(200)
+            handler.send_header('Content-Length', str(len(content)))
+            handler.send_header('ETag', etag)
+            handler.end_headers()
+            if send_body:
+                handler.wfile.write(content)
+        finally:
+            with self._lock:
+                self.active -= 1
@@ -14,7 +14,9 @@ import os
 
 from testtools.testcase import skip
 from toscaparser.common import exception
+from toscaparser import dataentity
 from toscaparser.dataentity import DataEntity
+from toscaparser.elements.constraints import Schema
 from toscaparser.elements.datatype import DataType
 from toscaparser.parameters import Input
 from toscaparser.tests.base import TestCase
@@ -231,6 +233,43 @@ class DataTypeTest(TestCase):
                           DataTypeTest.custom_type_def)
         self.assertIsNotNone(data.validate())
 
+    def test_validator_plan_reused(self):
+        plan = DataEntity.get_plan('list', {'type': 'string'},
+                                   DataTypeTest.custom_type_def)
+        self.assertIs(plan, DataEntity.get_plan(
+            'list', {'type': 'string'}, DataTypeTest.custom_type_def))
+        self.assertIsNot(plan, DataEntity.get_plan(
+            'list', {'type': 'integer'}, DataTypeTest.custom_type_def))
+        self.assertIs(DataEntity.get_plan('tosca.my.datatypes.People'),
+                      DataEntity.get_plan('tosca.my.datatypes.People'))
+
+    def test_validate_many_values(self):
+        contacts = [{'contact_name': 'Tom%d' % i,
+                     'contact_email': 'tom@email.com',
+                     'contact_phone': '123456789'} for i in range(10)]
+        value = {'name': 'Mike', 'gender': 'male',
+                 'addresses': {'home': 'Main Street'}, 'contacts': contacts}
+        DataEntity.validate_datatype('tosca.my.datatypes.People', value,
+                                     None, DataTypeTest.custom_type_def)
+        schemas = []
+
+        def counting_schema(name, schema_dict):
+            schemas.append(name)
+            return Schema(name, schema_dict)
+
+        # The schemas of the fields are derived once, not for every value
+        self.patch(dataentity, 'Schema', counting_schema)
+        for i in range(100):
+            DataEntity.validate_datatype('tosca.my.datatypes.People', value,
+                                         None, DataTypeTest.custom_type_def)
+        self.assertEqual([], schemas)
+
+        value['contacts'][3]['contact_name'] = 'T'
+        self.assertRaises(exception.ValidationError,
+                          DataEntity.validate_datatype,
+                          'tosca.my.datatypes.People', value, None,
+                          DataTypeTest.custom_type_def)
+
     # [Tom, Jerry] is not a dict, it can't be a value of datatype PeopleBase
     def test_non_dict_value_for_datatype(self):
         value_snippet = '''
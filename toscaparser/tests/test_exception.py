@@ -10,8 +10,11 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import threading
+
 from toscaparser.common import exception
 from toscaparser.tests.base import TestCase
+from toscaparser.tosca_template import ToscaTemplate
 from toscaparser.utils.gettextutils import _
 
 
@@ -41,3 +44,98 @@ class ExceptionTest(TestCase):
     def _formate_exception(self):
         exception.UnknownFieldError.set_fatal_format_exception(True)
         raise exception.UnknownFieldError(what='Template')
+
+    def test_collector_context_per_thread(self):
+        collector = exception.ExceptionCollector
+        collector.start()
+        self.addCleanup(collector.stop)
+        collector.appendException(ValueError('main'))
+        errors = []
+
+        def parse():
+            collector.start()
+            collector.appendException(ValueError('thread'))
+            errors.extend(collector.getExceptionsReport(False))
+            collector.stop()
+
+        thread = threading.Thread(target=parse)
+        thread.start()
+        thread.join()
+        self.assertEqual(['ValueError: thread'], errors)
+        self.assertEqual(['ValueError: main'],
+                         collector.getExceptionsReport(False))
+        self.assertTrue(collector.collecting)
+
+    def test_collector_nested_context(self):
+        collector = exception.ExceptionCollector
+        collector.start()
+        self.addCleanup(collector.stop)
+        exception.TOSCAException.set_context('node_type', 'server')
+        self.addCleanup(exception.TOSCAException.reset_context)
+        collector.appendException(ValueError('outer'))
+        context = collector.push_context()
+        self.assertTrue(collector.collecting)
+        self.assertEqual([], collector.exceptions)
+        ex = exception.TypeMismatchError(what='port', type='integer')
+        self.assertEqual('port must be of type "integer".', str(ex))
+        collector.appendException(ValueError('inner'))
+        self.assertIs(context, collector.pop_context())
+        self.assertEqual(['ValueError: outer'],
+                         collector.getExceptionsReport(False))
+        ex = exception.TypeMismatchError(what='port', type='integer')
+        self.assertEqual('server(node_type): port must be of type '
+                         '"integer".', str(ex))
+
+    def test_collector_duplicates(self):
+        collector = exception.ExceptionCollector
+        collector.start()
+        self.addCleanup(collector.stop)
+        collector.appendException(ValueError('first'))
+        collector.appendException(KeyError('second'))
+        collector.appendException(ValueError('first'))
+        self.assertEqual(2, len(collector.exceptions))
+        self.assertTrue(collector.contains(ValueError('first')))
+        collector.removeException(ValueError)
+        self.assertFalse(collector.contains(ValueError('first')))
+        collector.appendException(ValueError('first'))
+        self.assertEqual(2, len(collector.exceptions))
+
+    def test_collector_trace(self):
+        collector = exception.ExceptionCollector
+        collector.start()
+        self.addCleanup(collector.stop)
+        collector.appendException(ValueError('traced'))
+        report = collector.getExceptionsReport()[0]
+        self.assertIn('in test_collector_trace', report)
+        self.assertIn("collector.appendException(ValueError('traced'))",
+                      report)
+        self.assertNotIn('appendException\n', report)
+
+    def test_collector_many_errors(self):
+        formatted = []
+
+        class CountedError(Exception):
+            def __str__(self):
+                formatted.append(self.args[0])
+                return self.args[0]
+
+        collector = exception.ExceptionCollector
+        collector.start()
+        self.addCleanup(collector.stop)
+        for i in range(1000):
+            collector.appendException(CountedError('error_%d' % i))
+            collector.appendException(CountedError('error_%d' % i))
+        self.assertEqual(1000, len(collector.exceptions))
+        # Each exception appended is formatted once, the ones collected
+        # before are not formatted again to look for duplicates
+        self.assertEqual(2000, len(formatted))
+
+    def test_template_many_errors(self):
+        tpl = {'tosca_definitions_version': 'tosca_simple_yaml_1_0',
+               'topology_template': {'inputs': dict(
+                   ('input_%d' % i, {'type': 'integer',
+                                     'default': 'value_%d' % i})
+                   for i in range(5000))}}
+        self.assertRaises(exception.ValidationError, ToscaTemplate,
+                          yaml_dict_tpl=tpl)
+        self.assertEqual(5000, len(exception.ExceptionCollector.exceptions))
@@ -10,10 +10,13 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import hashlib
 import os
 import shutil
 import zipfile
 
+import fixtures
+
 from toscaparser.common.exception import ExceptionCollector
 from toscaparser.common.exception import URLException
 from toscaparser.common.exception import ValidationError
@@ -232,9 +235,131 @@ class CSARPrereqTest(TestCase):
         self.assertTrue(csar.temp_dir is None or
                         not os.path.exists(csar.temp_dir))
 
+    def test_validate_without_extracting(self):
+        path = os.path.join(self.base_path, "data/CSAR/csar_wordpress.zip")
+        csar = CSAR(path)
+        self.assertTrue(csar.validate())
+        self.assertFalse(os.path.exists(csar.temp_dir))
+        main_template = os.path.join(csar.temp_dir,
+                                     csar.get_main_template())
+        self.assertTrue(csar.file_system.isfile(main_template))
+        self.assertTrue(csar.import_cache.is_mounted(main_template))
+        self.assertFalse(csar.file_system.isfile(
+            os.path.join(csar.temp_dir, 'Scripts')))
+        self.assertFalse(csar.file_system.isfile(
+            os.path.join(csar.temp_dir, '..', 'README.txt')))
+        self.assertEqual(zipfile.ZipFile(path).read('README.txt'),
+                         csar.file_system.read(
+                             os.path.join(csar.temp_dir, 'README.txt')))
+
+    def test_extract_selected_files(self):
+        path = os.path.join(self.base_path, "data/CSAR/csar_wordpress.zip")
+        csar = CSAR(path)
+        self.assertTrue(csar.validate())
+        script = os.path.join(csar.temp_dir, 'Scripts', 'WebServer',
+                              'install.sh')
+        self.addCleanup(shutil.rmtree, csar.temp_dir, True)
+        self.assertEqual([script],
+                         csar.extract(['Scripts/WebServer/install.sh']))
+        self.assertTrue(os.path.isfile(script))
+        self.assertEqual(['Scripts'], os.listdir(csar.temp_dir))
+        self.assertRaises(IOError, csar.extract, ['Scripts/missing.sh'])
+
     def test_alternate_csar_extension(self):
         path = os.path.join(self.base_path, "data/CSAR/csar_elk.csar")
         csar = CSAR(path)
         self.assertTrue(csar.validate())
         self.assertTrue(csar.temp_dir is None or
                         not os.path.exists(csar.temp_dir))
+
+
+class CSARDigestTest(TestCase):
+
+    def setUp(self):
+        super(CSARDigestTest, self).setUp()
+        ExceptionCollector.stop()
+        self.image = b''.join(hashlib.sha256(str(i).encode()).digest()
+                              for i in range(100000))
+        self.script = b'#!/bin/sh\necho installed\n'
+
+    def _make_csar(self, manifest, manifest_name='Definitions/main.mf',
+                   metadata=''):
+        path = os.path.join(self.useFixture(fixtures.TempDir()).path,
+                            'test.csar')
+        with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr('TOSCA-Metadata/TOSCA.meta',
+                        'TOSCA-Meta-File-Version: 1.0\n'
+                        'CSAR-Version: 1.1\n'
+                        'Created-By: Test\n'
+                        'Entry-Definitions: Definitions/main.yaml\n' +
+                        metadata)
+            zf.writestr('Definitions/main.yaml',
+                        'tosca_definitions_version: tosca_simple_yaml_1_0\n')
+            zf.writestr('Artifacts/image.qcow2', self.image)
+            zf.writestr('Scripts/install.sh', self.script)
+            zf.writestr(manifest_name, manifest)
+        return path
+
+    def _manifest(self, image_hash=None):
+        return ('metadata:\n'
+                '  vnf_product_name: test\n'
+                '\n'
+                'Source: Artifacts/image.qcow2\n'
+                'Algorithm: SHA-256\n'
+                'Hash: %s\n'
+                '\n'
+                'Source: Scripts/install.sh\n'
+                'Algorithm: SHA-512\n'
+                'Hash: %s\n'
+                '\n'
+                'Source: http://example.com/image.qcow2\n'
+                'Algorithm: SHA-256\n'
+                'Hash: 0000\n'
+                '\n'
+                '-----BEGIN CMS-----\n'
+                'Source: not/a/file\n'
+                '-----END CMS-----\n'
+                % (image_hash or hashlib.sha256(self.image).hexdigest(),
+                   hashlib.sha512(self.script).hexdigest()))
+
+    def test_verify_digests(self):
+        self.patch(CSAR, 'CHUNK_SIZE', 4096)
+        csar = CSAR(self._make_csar(self._manifest()))
+        digests = csar.verify_digests()
+        self.assertEqual(['Artifacts/image.qcow2', 'Scripts/install.sh'],
+                         [digest.path for digest in digests])
+        self.assertEqual([len(self.image), len(self.script)],
+                         [digest.size for digest in digests])
+        for digest in digests:
+            self.assertEqual(digest.expected, digest.digest)
+            self.assertIsNotNone(digest.seconds)
+
+    def test_verify_digests_entry_manifest(self):
+        path = self._make_csar(self._manifest(), 'manifest.mf',
+                               'ETSI-Entry-Manifest: manifest.mf\n')
+        csar = CSAR(path)
+        self.assertEqual('manifest.mf', csar.get_manifest())
+        self.assertEqual(2, len(csar.verify_digests()))
+
+    def test_verify_digests_mismatch(self):
+        path = self._make_csar(self._manifest('0' * 64))
+        csar = CSAR(path)
+        error = self.assertRaises(ValidationError, csar.verify_digests)
+        self.assertEqual(_('The digest of "Artifacts/image.qcow2" in the '
+                           'CSAR "%s" does not match its manifest.') % path,
+                         str(error))
+
+    def test_verify_digests_missing_file(self):
+        path = self._make_csar('Source: Artifacts/missing.qcow2\n'
+                               'Algorithm: SHA-256\n'
+                               'Hash: 0000\n')
+        error = self.assertRaises(ValidationError,
+                                  CSAR(path).verify_digests)
+        self.assertEqual(_('The file "Artifacts/missing.qcow2" listed in '
+                           'the manifest of the CSAR "%s" does not exist.')
+                         % path, str(error))
+
+    def test_no_manifest(self):
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            "data/CSAR/csar_wordpress.zip")
+        self.assertEqual([], CSAR(path).verify_digests())
@@ -14,6 +14,8 @@ from testtools import matchers
 
 from toscaparser.common import exception
 from toscaparser.elements.property_definition import PropertyDef
+from toscaparser.elements.statefulentitytype import StatefulEntityType
+import toscaparser.entity_template
 from toscaparser.nodetemplate import NodeTemplate
 from toscaparser.properties import Property
 from toscaparser.tests.base import TestCase
@@ -370,3 +372,53 @@ class PropertyTest(TestCase):
             rel_tpls.extend(trgt.get_relationship_template())
         self.assertEqual(expected_properties,
                          sorted(rel_tpls[0].get_properties().keys()))
+
+    def test_many_inherited_properties(self):
+        custom_def = {}
+        parent = 'tosca.nodes.Root'
+        for level in range(5):
+            name = 'tosca.nodes.test.Level%d' % level
+            props = dict(('prop_%d_%d' % (level, i),
+                          {'type': 'integer', 'default': i})
+                         for i in range(25))
+            custom_def[name] = {'derived_from': parent, 'properties': props}
+            parent = name
+        values = dict(('prop_%d_%d' % (level, i), i + 1)
+                      for level in range(5) for i in range(20))
+        nodetemplates = dict(('node%d' % n, {'type': parent,
+                                             'properties': values})
+                             for n in range(50))
+        lookups = []
+        built = []
+        get_properties_def = StatefulEntityType.get_properties_def
+
+        def counting_get_properties_def(type_def):
+            lookups.append(type_def)
+            return get_properties_def(type_def)
+
+        def counting_property(*args):
+            built.append(args[0])
+            return Property(*args)
+
+        self.patch(StatefulEntityType, 'get_properties_def',
+                   counting_get_properties_def)
+        self.patch(toscaparser.entity_template, 'Property', counting_property)
+        for name in nodetemplates:
+            del lookups[:]
+            del built[:]
+            tpl = NodeTemplate(name, nodetemplates, custom_def)
+            tpl.validate()
+            props = tpl.get_properties_objects()
+            self.assertEqual(125, len(props))
+            self.assertEqual([p.name for p in props],
+                             list(tpl.get_properties()))
+            for prop in props:
+                self.assertEqual(prop.value,
+                                 tpl.get_property_value(prop.name))
+            # The definitions are looked up and the properties built once
+            # per template, not once per property read
+            self.assertEqual(1, len(lookups))
+            self.assertEqual(125, len(built))
+        self.assertEqual(5, tpl.get_property_value('prop_0_4'))
+        self.assertEqual(24, tpl.get_property_value('prop_4_24'))
+        self.assertIs(tpl.get_properties(), tpl.get_properties())
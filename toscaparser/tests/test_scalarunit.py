@@ -11,11 +11,13 @@
 #    under the License.
 
 from toscaparser.common import exception
+from toscaparser.elements import scalarunit
 from toscaparser.elements.scalarunit import ScalarUnit_Frequency
 from toscaparser.elements.scalarunit import ScalarUnit_Size
 from toscaparser.elements.scalarunit import ScalarUnit_Time
 from toscaparser.nodetemplate import NodeTemplate
 from toscaparser.tests.base import TestCase
+from toscaparser.utils.cacheutils import LRUCache
 from toscaparser.utils.gettextutils import _
 from toscaparser.utils import yamlparser
 
@@ -357,3 +359,52 @@ class ScalarUnitNegativeTest(TestCase):
             self.assertEqual(_('The value "1 MB" of property "mem_size" is '
                                'out of range "(min:1 MiB, max:1 GiB)".'),
                              error.__str__())
+
+
+class ScalarUnitMemoTest(TestCase):
+
+    def setUp(self):
+        TestCase.setUp(self)
+        exception.ExceptionCollector.stop()
+        # Values memoized by other tests are not seen
+        self.patch(scalarunit, '_memo', LRUCache(scalarunit.MEMO_SIZE))
+
+    def _count_calls(self, cls, name):
+        calls = []
+        method = getattr(cls, name)
+
+        def counting_method(unit, *args):
+            calls.append(args)
+            return method(unit, *args)
+
+        self.patch(cls, name, counting_method)
+        return calls
+
+    def test_memoized_value(self):
+        validated = self._count_calls(ScalarUnit_Size,
+                                      '_validate_scalar_unit')
+        computed = self._count_calls(ScalarUnit_Size,
+                                     '_get_num_from_scalar_unit')
+        for i in range(2):
+            self.assertEqual('1 KiB', ScalarUnit_Size('1 kib').
+                             validate_scalar_unit())
+            self.assertEqual(1024, ScalarUnit_Size('1 kib').
+                             get_num_from_scalar_unit())
+            self.assertEqual(1, ScalarUnit_Size('1 kib').
+                             get_num_from_scalar_unit('KiB'))
+        self.assertEqual(1, len(validated))
+        self.assertEqual([(None,), ('KiB',)], computed)
+        # Other scalar-unit types have their own values
+        self.assertEqual(0.001, ScalarUnit_Time('1 ms').
+                         get_num_from_scalar_unit('s'))
+
+    def test_invalid_value_not_memoized(self):
+        validated = self._count_calls(ScalarUnit_Frequency,
+                                      '_validate_scalar_unit')
+        for i in range(2):
+            error = self.assertRaises(ValueError,
+                                      ScalarUnit_Frequency('1 Jz').
+                                      validate_scalar_unit)
+            self.assertEqual(_('"1 Jz" is not a valid scalar-unit.'),
+                             error.__str__())
+        self.assertEqual(2, len(validated))
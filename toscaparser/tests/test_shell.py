@@ -10,8 +10,12 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import json
 import os
 
+import fixtures
+import six
+
 from toscaparser.common import exception
 import toscaparser.shell as shell
 from toscaparser.tests.base import TestCase
@@ -53,3 +57,46 @@ class ShellTest(TestCase):
             shell.main([arg])
         except Exception:
             self.fail(_('The program raised an exception unexpectedly.'))
+
+    def _batch(self, paths, jobs):
+        out = six.StringIO()
+        failed = shell.ParserShell().batch(paths, jobs, out=out)
+        lines = [json.loads(line) for line in out.getvalue().splitlines()]
+        return failed, lines[:-1], lines[-1]['summary']
+
+    def test_batch(self):
+        data_dir = os.path.dirname(self.tosca_helloworld)
+        for jobs in (1, 2):
+            failed, results, summary = self._batch(
+                [self.tosca_helloworld, self.errornous_template,
+                 os.path.join(data_dir, 'tosca_helloworld.y*ml'),
+                 'template.yaml'], jobs)
+            self.assertEqual(2, failed)
+            self.assertEqual(
+                [(self.tosca_helloworld, 'valid'),
+                 (self.errornous_template, 'invalid'),
+                 ('template.yaml', 'error')],
+                [(r['path'], r['status']) for r in results])
+            self.assertEqual([], results[0]['errors'])
+            self.assertIn('InvalidTemplateVersion: The template version '
+                          '"tosca_simple_yaml_1" is invalid. Valid versions '
+                          'are', results[1]['errors'][0])
+            self.assertEqual(3, summary['total'])
+            self.assertEqual(1, summary['valid'])
+            self.assertEqual(1, summary['invalid'])
+            self.assertEqual(1, summary['error'])
+
+    def test_batch_directory(self):
+        csar_dir = os.path.join(os.path.dirname(self.tosca_helloworld),
+                                'CSAR')
+        paths = shell.expand_template_paths([csar_dir])
+        self.assertIn(os.path.join(csar_dir, 'csar_hello_world.zip'), paths)
+        self.assertTrue(all(p.endswith(shell.TEMPLATE_EXTENSIONS)
+                            for p in paths))
+
+    def test_batch_exit_status(self):
+        out = self.useFixture(fixtures.StringStream('stdout')).stream
+        self.useFixture(fixtures.MonkeyPatch('sys.stdout', out))
+        self.assertEqual(0, shell.main(['--batch', self.tosca_helloworld]))
+        self.assertEqual(1, shell.main(['--batch', self.errornous_template,
+                                        '--jobs', '1']))
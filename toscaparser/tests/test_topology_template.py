@@ -11,14 +11,18 @@
 #    under the License.
 
 import os
+import six
 import testtools
 
 from toscaparser.common import exception
+import toscaparser.imports
 from toscaparser.substitution_mappings import SubstitutionMappings
 from toscaparser.tests.base import TestCase
 from toscaparser.topology_template import TopologyTemplate
+import toscaparser.tosca_template
 from toscaparser.tosca_template import ToscaTemplate
 from toscaparser.utils.gettextutils import _
+from toscaparser.utils import poolutils
 import toscaparser.utils.yamlparser
 
 YAML_LOADER = toscaparser.utils.yamlparser.load_yaml
@@ -170,6 +174,33 @@ class TopologyTemplateTest(TestCase):
                 if props and 'mem_size' in props.keys():
                     self.assertEqual(props['mem_size'].value, '4096 MB')
 
+    def test_lookup_indexes(self):
+        server = self.topo.get_node_template('server')
+        self.assertEqual('server', server.name)
+        self.assertIn(server, self.topo.nodetemplates)
+        self.assertIsNone(self.topo.get_node_template('missing'))
+        self.assertIsNone(self.topo.get_node_template(['server']))
+        self.assertEqual(
+            [server],
+            self.topo.get_node_templates_by_type('tosca.nodes.Compute'))
+        self.assertEqual([], self.topo.get_node_templates_by_type('missing'))
+        group = self.topo.get_group('webserver_group')
+        self.assertIs(self.topo.groups[0], group)
+        self.assertIsNone(self.topo.get_group('missing'))
+        self.assertEqual([server],
+                         self.topo._get_group_members(['server']))
+        self.assertEqual([group],
+                         self.topo._get_policy_groups(['webserver_group']))
+
+    def test_relationship_targets_are_topology_templates(self):
+        nodetemplates = self.topo.nodetemplates
+        self.assertEqual(len(nodetemplates),
+                         len(set(tpl.name for tpl in nodetemplates)))
+        for tpl in nodetemplates:
+            for target in tpl.relationships.values():
+                self.assertIs(self.topo.get_node_template(target.name),
+                              target)
+
     def test_system_template(self):
         tpl_path = os.path.join(
             os.path.dirname(os.path.abspath(__file__)),
@@ -181,6 +212,63 @@ class TopologyTemplateTest(TestCase):
                 nested_tosca_templates_with_topology), 4)
         self.assertTrue(system_tosca_template.has_nested_templates())
 
+    def test_requirements_with_same_relationship_type(self):
+        tpl_path = os.path.join(
+            os.path.dirname(os.path.abspath(__file__)),
+            "data/topology_template/system.yaml")
+        tosca = ToscaTemplate(tpl_path)
+        mq = tosca.topology_template.get_node_template('mq')
+        relationships = mq.relationships
+        self.assertEqual(['tosca.relationships.ConnectsTo'] * 2,
+                         [rtype.type for rtype in relationships])
+        self.assertEqual(['trans1', 'trans2'],
+                         sorted(tpl.name for tpl in relationships.values()))
+
+    def test_relationship_templates_of_shared_target(self):
+        tpl_path = os.path.join(
+            os.path.dirname(os.path.abspath(__file__)),
+            "data/test_credential_datatype.yaml")
+        topology = ToscaTemplate(tpl_path).topology_template
+        server = topology.get_node_template('server')
+        rel_tpls = server.get_relationship_template()
+        self.assertEqual(['mysql_dbms', 'webserver'],
+                         sorted(rel.source.name for rel in rel_tpls))
+        for rel in rel_tpls:
+            self.assertEqual('tosca.relationships.HostedOn', rel.type)
+            self.assertIs(server, rel.target)
+            self.assertIs(rel.source,
+                          topology.get_node_template(rel.source.name))
+            self.assertEqual([server], list(rel.source.relationships.values()))
+
+    def test_nested_templates_reuse_loaded_files(self):
+        tpl_path = os.path.join(
+            os.path.dirname(os.path.abspath(__file__)),
+            "data/topology_template/system.yaml")
+        loaded = []
+        yaml_loader = toscaparser.imports.YAML_LOADER
+
+        def counting_loader(path, a_file=True):
+            loaded.append(os.path.basename(path))
+            return yaml_loader(path, a_file)
+
+        self.patch(toscaparser.imports, 'YAML_LOADER', counting_loader)
+        self.patch(toscaparser.tosca_template, 'YAML_LOADER', counting_loader)
+        tosca = ToscaTemplate(tpl_path)
+        self.assertEqual(len(loaded), len(set(loaded)))
+        transactions = [
+            nested for nested in tosca.nested_tosca_templates_with_topology
+            if nested.path.endswith('transactionsubsystem.yaml')]
+        self.assertEqual(2, len(transactions))
+        # the types of the second one are those built for the first one,
+        # or for the system template when it has the same definitions
+        custom_defs = transactions[1].topology_template.custom_defs
+        self.assertEqual(transactions[0].topology_template.custom_defs,
+                         custom_defs)
+        self.assertTrue(
+            custom_defs is transactions[0].topology_template.custom_defs or
+            custom_defs is tosca.topology_template.custom_defs)
+        self.assertIsNot(transactions[0].tpl, transactions[1].tpl)
+
     def test_invalid_keyname(self):
         tpl_snippet = '''
         substitution_mappings:
@@ -265,6 +353,46 @@ class TopologyTemplateTest(TestCase):
         exception.ExceptionCollector.assertExceptionMessage(
             exception.MissingRequiredInputError, errormsg)
 
+    def test_nested_template_params_copied(self):
+        tpl_path = os.path.join(
+            os.path.dirname(os.path.abspath(__file__)),
+            "data/topology_template/system.yaml")
+        tosca = ToscaTemplate(tpl_path, parsed_params={'tags': ['a']})
+        self.assertTrue(tosca.has_nested_templates())
+        for nested in tosca.nested_tosca_templates_with_topology:
+            self.assertEqual(['a'], nested.parsed_params['tags'])
+            self.assertIsNot(tosca.parsed_params['tags'],
+                             nested.parsed_params['tags'])
+
+    @testtools.skipIf(poolutils.get_fork_context() is None,
+                      "Nested templates are parsed apart in forked processes")
+    def test_nested_templates_parsed_in_processes(self):
+        data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "data/topology_template")
+        tpl_path = os.path.join(data_dir, "system.yaml")
+        serial = ToscaTemplate(tpl_path)
+        tosca = ToscaTemplate(tpl_path, nested_jobs=2)
+        self.assertEqual(
+            [nested.path for nested in
+             serial.nested_tosca_templates_with_topology],
+            [nested.path for nested in
+             tosca.nested_tosca_templates_with_topology])
+        for nested in tosca.nested_tosca_templates_with_topology:
+            nodetemplate = nested.sub_mapped_node_template
+            self.assertIn(nodetemplate, tosca.nodetemplates)
+            self.assertIs(nested, nodetemplate.substitution_mapped)
+            self.assertIs(tosca.import_cache, nested.import_cache)
+
+        # errors of nested templates are reported as when parsed in turn
+        tpl_path = os.path.join(data_dir, "validate/system_invalid_input.yaml")
+        self.assertRaises(exception.ValidationError, ToscaTemplate, tpl_path)
+        report = exception.ExceptionCollector.getExceptionsReport(False)
+        self.assertRaises(exception.ValidationError, ToscaTemplate, tpl_path,
+                          nested_jobs=2)
+        self.assertEqual(report,
+                         exception.ExceptionCollector.getExceptionsReport(
+                             False))
+
     @testtools.skip("Not valid after adding additonal checks from ONAP")
     def test_substitution_mappings_valid_output(self):
         tpl_path = os.path.join(
@@ -280,7 +408,10 @@ class TopologyTemplateTest(TestCase):
             "test_substitution_mappings_invalid_output.yaml")
         errormsg = _('\'Attribute "my_cpu_output" was not found in node '
                      'template "substitute_app".\'')
-        self.assertRaises(exception.ValidationError,
-                          lambda: ToscaTemplate(tpl_path))
+        err = self.assertRaises(exception.ValidationError,
+                                lambda: ToscaTemplate(tpl_path))
         exception.ExceptionCollector.assertExceptionMessage(
             KeyError, errormsg)
+        # The errors of the template come along with the nested ones
+        self.assertIn('KeyError: ' + errormsg, six.text_type(err))
+        self.assertIn('MissingRequiredOutputError', six.text_type(err))
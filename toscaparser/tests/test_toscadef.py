@@ -10,14 +10,24 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import pickle
+import subprocess
+import sys
+import threading
+
 from toscaparser.common import exception
 from toscaparser.common.exception import ExceptionCollector
 from toscaparser.elements.artifacttype import ArtifactTypeDef
+from toscaparser.elements.datatype import DataType
 from toscaparser.elements.entity_type import EntityType
+from toscaparser.elements.entity_type import ProfileRegistry
+from toscaparser.elements.entity_type import TypeRegistry
 from toscaparser.elements.grouptype import GroupType
 import toscaparser.elements.interfaces as ifaces
+from toscaparser.elements.nodetype import CapabilityIndex
 from toscaparser.elements.nodetype import NodeType
 from toscaparser.elements.policytype import PolicyType
+from toscaparser.elements.statefulentitytype import TypeNameResolver
 from toscaparser.tests.base import TestCase
 
 compute_type = NodeType('tosca.nodes.Compute')
@@ -349,3 +359,137 @@ class ToscaDefTest(TestCase):
             sorted(['protocol', 'target', 'target_range', 'source',
                     'source_range']),
             sorted(properties.keys()))
+
+    def test_type_registry(self):
+        compute = TypeRegistry.get(NodeType, None, 'tosca.nodes.Compute')
+        self.assertIs(compute,
+                      TypeRegistry.get(NodeType, None, 'tosca.nodes.Compute'))
+        self.assertIs(compute.parent_type,
+                      TypeRegistry.get(NodeType, None, 'tosca.nodes.Root'))
+        self.assertIs(compute_type.parent_type, compute_type.parent_type)
+
+        custom_def = {'tosca.nodes.Custom':
+                      {'derived_from': 'tosca.nodes.Compute'}}
+        custom = TypeRegistry.get(NodeType, custom_def, 'tosca.nodes.Custom')
+        self.assertIs(custom.parent_type.parent_type,
+                      TypeRegistry.get(NodeType, custom_def,
+                                       'tosca.nodes.Root'))
+        self.assertIsNot(custom.parent_type, compute)
+
+    def test_type_registry_skips_invalid_types(self):
+        ExceptionCollector.start()
+        first = TypeRegistry.get(NodeType, None, 'tosca.nodes.Invalid')
+        second = TypeRegistry.get(NodeType, None, 'tosca.nodes.Invalid')
+        ExceptionCollector.stop()
+        self.assertIsNot(first, second)
+        self.assertRaises(exception.InvalidTypeError, TypeRegistry.get,
+                          NodeType, None, 'tosca.nodes.Invalid')
+
+    def test_type_name_resolver(self):
+        custom_def = {'Custom': {'derived_from': 'tosca.nodes.Root'},
+                      'ns.Custom': {'derived_from': 'tosca.nodes.Compute'},
+                      'tosca.nodes.Compute': {}}
+        resolver = TypeNameResolver(EntityType.NODE_PREFIX, custom_def)
+        compute = EntityType.TOSCA_DEF['tosca.nodes.Compute']
+        for spelling in ('Compute', 'tosca:Compute', 'tosca.nodes.Compute'):
+            self.assertEqual(('tosca.nodes.Compute', compute),
+                             resolver.resolve(spelling))
+        for spelling in ('Custom', 'tosca:Custom'):
+            self.assertEqual(('Custom', custom_def['Custom']),
+                             resolver.resolve(spelling))
+        self.assertEqual(('ns.Custom', custom_def['ns.Custom']),
+                         resolver.resolve('ns.Custom'))
+        self.assertEqual(('Invalid', None), resolver.resolve('tosca:Invalid'))
+        # types defined after the index was built are still resolved
+        custom_def['Late'] = {}
+        self.assertEqual(('Late', {}), resolver.resolve('Late'))
+
+        self.assertEqual('tosca.datatypes.network.PortSpec',
+                         DataType('PortSpec').type)
+        self.assertEqual('tosca.datatypes.Credential',
+                         DataType('tosca:Credential').type)
+        self.assertEqual('tosca.nodes.Compute',
+                         NodeType('tosca:Compute', custom_def).type)
+        self.assertEqual('ns.Custom', NodeType('ns.Custom', custom_def).type)
+
+    def test_capability_index(self):
+        custom_def = {'tosca.capabilities.Endpoint.Custom':
+                      {'derived_from': 'tosca.capabilities.Endpoint.Admin'},
+                      'tosca.nodes.Custom':
+                      {'derived_from': 'tosca.nodes.Root',
+                       'capabilities': {'custom': {
+                           'type': 'tosca.capabilities.Endpoint.Custom'}}}}
+        index = CapabilityIndex(custom_def)
+        self.assertEqual('tosca.nodes.Database', index.get_node_type(
+            'tosca.capabilities.Endpoint.Database'))
+        self.assertEqual('tosca.nodes.Custom', index.get_node_type(
+            'tosca.capabilities.Endpoint.Custom'))
+        # providers of derived capability types are used as a last resort
+        self.assertEqual('tosca.nodes.Compute', index.get_node_type(
+            'tosca.capabilities.Root'))
+        self.assertIsNone(index.get_node_type('tosca.capabilities.Invalid'))
+        self.assertEqual(('tosca.relationships.HostedOn',),
+                         index.get_relationship_types(
+                             'tosca.capabilities.Container'))
+        self.assertEqual(('tosca.relationships.ConnectsTo',
+                          'tosca.relationships.RoutesTo'),
+                         index.get_relationship_types(
+                             'tosca.capabilities.Endpoint.Custom'))
+        self.assertEqual('tosca.relationships.HostedOn',
+                         webserver_type._get_relation('host',
+                                                      'tosca.nodes.Compute'))
+
+    def test_profile_registry(self):
+        version = 'tosca_simple_profile_for_nfv_1_0_0'
+        profile = ProfileRegistry.get(version)
+        self.assertIs(profile, ProfileRegistry.get(version))
+        self.assertIs(ProfileRegistry.get(),
+                      ProfileRegistry.get('tosca_simple_yaml_1_0'))
+        self.assertIn('tosca.nodes.nfv.VDU', profile)
+        self.assertIn('tosca.nodes.Compute', profile)
+        self.assertNotIn('tosca.nodes.nfv.VDU', EntityType.TOSCA_DEF)
+        self.assertRaises(TypeError, profile.update, {'Invalid': {}})
+        self.assertRaises(TypeError, profile.__setitem__, 'Invalid', {})
+        self.assertEqual(profile, pickle.loads(pickle.dumps(profile)))
+
+        self.addCleanup(ProfileRegistry.select, ProfileRegistry.get())
+        ProfileRegistry.select(profile)
+        self.assertIs(profile, EntityType.TOSCA_DEF)
+        self.assertEqual('tosca.nodes.nfv.VDU',
+                         TypeRegistry.get(NodeType, None, 'nfv.VDU').type)
+
+    def test_extension_profile_loaded_first(self):
+        # The normative profile is loaded on the way, in a fresh process
+        code = ('from toscaparser.elements.entity_type import EntityType\n'
+                'from toscaparser.elements.entity_type import '
+                'update_definitions\n'
+                'update_definitions("tosca_simple_profile_for_nfv_1_0_0")\n'
+                'print("tosca.nodes.nfv.VDU" in EntityType.TOSCA_DEF)\n')
+        process = subprocess.Popen([sys.executable, '-c', code],
+                                   stdout=subprocess.PIPE)
+        watchdog = threading.Timer(60, process.kill)
+        watchdog.start()
+        try:
+            output = process.communicate()[0]
+        finally:
+            watchdog.cancel()
+        self.assertEqual(0, process.returncode)
+        self.assertEqual('True', output.decode().strip())
+
+    def test_flattened_views(self):
+        self.assertIs(compute_type.get_properties_def(),
+                      compute_type.get_properties_def())
+        self.assertIs(compute_type.get_capabilities(),
+                      compute_type.get_capabilities())
+        self.assertIs(compute_type.relationship, compute_type.relationship)
+        # list views are handed out as copies
+        caps = compute_type.get_capabilities_objects()
+        caps.pop()
+        self.assertEqual(len(compute_type.get_capabilities()),
+                         len(compute_type.get_capabilities_objects()))
+        reqs = compute_type.requirements
+        reqs.append({'extra': {}})
+        self.assertNotIn({'extra': {}}, compute_type.requirements)
+        self.assertEqual(['local_storage', 'dependency'],
+                         [list(r.keys())[0]
+                          for r in compute_type.requirements])
@@ -10,16 +10,23 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import copy
 import os
 import six
+import tempfile
+import threading
 from toscaparser.common import exception
+from toscaparser.elements.entity_type import ProfileRegistry
 import toscaparser.elements.interfaces as ifaces
 from toscaparser.elements.nodetype import NodeType
 from toscaparser.elements.portspectype import PortSpec
 from toscaparser.functions import GetInput
 from toscaparser.functions import GetProperty
+import toscaparser.imports
 from toscaparser.nodetemplate import NodeTemplate
 from toscaparser.tests.base import TestCase
+from toscaparser.topology_template import TopologyTemplate
+from toscaparser.tosca_template import iter_validate
 from toscaparser.tosca_template import ToscaTemplate
 from toscaparser.utils.gettextutils import _
 import toscaparser.utils.yamlparser
@@ -507,6 +514,24 @@ class ToscaTemplateTest(TestCase):
                                                      "db_port": 3306,
                                                      "cpus": 4}))
 
+    def test_csar_parsed_without_extracting(self):
+        csar_archive = os.path.join(
+            os.path.dirname(os.path.abspath(__file__)),
+            'data/CSAR/csar_wordpress.zip')
+        tosca = ToscaTemplate(csar_archive,
+                              parsed_params={"db_name": "mysql",
+                                             "db_user": "mysql",
+                                             "db_root_pwd": "1234",
+                                             "db_pwd": "5678",
+                                             "db_port": 3306,
+                                             "cpus": 4})
+        self.assertIn('tosca.nodes.WebApplication.WordPress',
+                      tosca.topology_template.custom_defs)
+        self.assertFalse(os.path.exists(tosca.csar.temp_dir))
+        # The files are extracted when the path of the template is needed
+        self.assertTrue(os.path.isfile(tosca.path))
+        self.assertTrue(tosca.path.startswith(tosca.csar.temp_dir))
+
     def test_csar_parsing_elk_url_based(self):
         csar_archive = ('https://raw.githubusercontent.com/openstack/tosca-parser/master/'
                         'toscaparser/tests/data/CSAR/csar_elk.zip')
@@ -529,6 +554,123 @@ class ToscaTemplateTest(TestCase):
         self.assertItemsEqual(tosca.topology_template.custom_defs.keys(),
                               expected_custom_types)
 
+    def test_concurrent_parses(self):
+        data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "data")
+        paths = [os.path.join(data_dir, name) for name in
+                 ("tosca_helloworld.yaml",
+                  "test_multiple_validation_errors.yaml",
+                  "tosca_elk.yaml")] * 4
+        results = {}
+
+        def parse(index, path):
+            try:
+                ToscaTemplate(path)
+                results[index] = []
+            except exception.ValidationError:
+                results[index] = exception.ExceptionCollector.\
+                    getExceptionsReport(False)
+            finally:
+                exception.ExceptionCollector.stop()
+
+        threads = [threading.Thread(target=parse, args=(index, path))
+                   for index, path in enumerate(paths)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for index in range(0, len(paths), 3):
+            self.assertEqual([], results[index])
+            self.assertEqual(results[1], results[index + 1])
+            self.assertEqual([], results[index + 2])
+        self.assertEqual(12, len(results[1]))
+
+    def test_profiles_isolated(self):
+        nfv_tpl = os.path.join(
+            os.path.dirname(os.path.abspath(__file__)),
+            "../extensions/nfv/tests/data/tosca_helloworld_nfv_0.yaml")
+        tpl = {'tosca_definitions_version': 'tosca_simple_yaml_1_0',
+               'topology_template': {'node_templates': {
+                   'vdu': {'type': 'tosca.nodes.nfv.VDU'}}}}
+        errors = []
+
+        def parse(path):
+            try:
+                for i in range(3):
+                    ToscaTemplate(path)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=parse, args=(nfv_tpl,))
+                   for i in range(2)]
+        for thread in threads:
+            thread.start()
+        # NFV types are not defined for templates of other versions, even
+        # while NFV templates are being parsed
+        for i in range(3):
+            err = self.assertRaises(exception.ValidationError, ToscaTemplate,
+                                    None, None, False, copy.deepcopy(tpl))
+            self.assertIn('tosca.nodes.nfv.VDU', six.text_type(err))
+        for thread in threads:
+            thread.join()
+        self.assertEqual([], errors)
+        self.assertEqual('tosca_simple_profile_for_nfv_1_0_0',
+                         ToscaTemplate(nfv_tpl).version)
+
+    def test_profile_selection_restored(self):
+        nfv_tpl = os.path.join(
+            os.path.dirname(os.path.abspath(__file__)),
+            "../extensions/nfv/tests/data/tosca_helloworld_nfv_0.yaml")
+        tpl = {'tosca_definitions_version':
+               'tosca_simple_profile_for_nfv_1_0_0',
+               'topology_template': {'node_templates': {
+                   'vdu': {'type': 'tosca.nodes.Unknown'}}}}
+        profile = ProfileRegistry.current()
+        tosca = ToscaTemplate(nfv_tpl)
+        self.assertEqual('tosca_simple_profile_for_nfv_1_0_0', tosca.version)
+        self.assertIs(profile, ProfileRegistry.current())
+        # Also when the template is invalid
+        self.assertRaises(exception.ValidationError, ToscaTemplate,
+                          None, None, False, tpl)
+        self.assertIs(profile, ProfileRegistry.current())
+
+    def test_cyclic_imports_loaded_once(self):
+        tosca_tpl = os.path.join(
+            os.path.dirname(os.path.abspath(__file__)),
+            "data/test_cyclic_imports.yaml")
+        loaded = []
+        yaml_loader = toscaparser.imports.YAML_LOADER
+
+        def counting_loader(path, a_file=True):
+            loaded.append(os.path.basename(path))
+            return yaml_loader(path, a_file)
+
+        self.patch(toscaparser.imports, 'YAML_LOADER', counting_loader)
+        tosca = ToscaTemplate(tosca_tpl)
+        self.assertEqual(
+            ['tosca.nodes.SoftwareComponent.CyclicA',
+             'tosca.nodes.SoftwareComponent.CyclicB',
+             'tosca.nodes.SoftwareComponent.CyclicCommon'],
+            sorted(tosca.topology_template.custom_defs.keys()))
+        self.assertEqual(['cyclic_import_a.yaml', 'cyclic_import_b.yaml',
+                          'cyclic_import_common.yaml'], sorted(loaded))
+
+    def test_import_cache_reloads_modified_file(self):
+        fd, path = tempfile.mkstemp(suffix='.yaml')
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+        with open(path, 'w') as f:
+            f.write('tosca_definitions_version: tosca_simple_yaml_1_0\n')
+        cache = toscaparser.imports.ImportCache()
+        tpl = cache.load(path)
+        self.assertIs(tpl, cache.load(path))
+        self.assertTrue(cache.is_current())
+        mtime = os.path.getmtime(path)
+        os.utime(path, (mtime, mtime + 1))
+        self.assertFalse(cache.is_current())
+        self.assertIsNot(tpl, cache.load(path))
+        self.assertEqual(tpl, cache.load(path))
+
     def test_invalid_template_file(self):
         template_file = 'invalid template file'
         expected_msg = (_('"%s" is not a valid file.') % template_file)
@@ -538,6 +680,155 @@ class ToscaTemplateTest(TestCase):
         exception.ExceptionCollector.assertExceptionMessage(ValueError,
                                                             expected_msg)
 
+    def test_iter_validate(self):
+        tosca_tpl = os.path.join(
+            os.path.dirname(os.path.abspath(__file__)),
+            "data/test_multiple_validation_errors.yaml")
+        self.assertRaises(exception.ValidationError, ToscaTemplate, tosca_tpl)
+        expected = exception.ExceptionCollector.getExceptionsReport(False)
+        records = list(iter_validate(tosca_tpl))
+        self.assertEqual(expected, ['%s: %s' % (record.kind, record.message)
+                                    for record in records])
+        self.assertEqual((None, 'InvalidTemplateVersion'),
+                         (records[0].section, records[0].kind))
+        self.assertEqual(('imports', ImportError),
+                         (records[1].section, type(records[1].exception)))
+        wordpress = [r for r in records if r.name == 'wordpress']
+        self.assertEqual(['node_templates'], [r.section for r in wordpress])
+
+        fields = [record[:4] for record in records]
+        self.assertEqual(fields[:1], [record[:4] for record in
+                                      iter_validate(tosca_tpl,
+                                                    fail_fast=True)])
+        self.assertEqual(fields[:3], [record[:4] for record in
+                                      iter_validate(tosca_tpl,
+                                                    max_errors=3)])
+        errors = iter_validate(tosca_tpl)
+        self.assertEqual(fields[0], next(errors)[:4])
+        errors.close()
+
+    def test_iter_validate_valid_template(self):
+        tosca_tpl = os.path.join(
+            os.path.dirname(os.path.abspath(__file__)),
+            "data/tosca_single_instance_wordpress.yaml")
+        records = list(iter_validate(tosca_tpl))
+        self.assertEqual(['inputs'], [r.section for r in records])
+        self.assertEqual(
+            [], list(iter_validate(tosca_tpl, no_required_paras_check=True)))
+
+    def test_revalidate_modified_template(self):
+        tpl = toscaparser.utils.yamlparser.load_yaml(os.path.join(
+            os.path.dirname(os.path.abspath(__file__)),
+            "data/test_incremental_validation.yaml"))
+        params = {'db_name': 'db1'}
+
+        def parse(tpl, params=params, previous=None):
+            return ToscaTemplate(parsed_params=params, a_file=False,
+                                 yaml_dict_tpl=copy.deepcopy(tpl),
+                                 previous=previous)
+
+        def node_templates(tosca):
+            return dict((tpl.name, tpl) for tpl in tosca.nodetemplates)
+
+        first = parse(tpl)
+        old = node_templates(first)
+        tpl['topology_template']['node_templates']['dbms'][
+            'properties']['port'] = 3307
+        second = parse(tpl, previous=first)
+        new = node_templates(second)
+        self.assertEqual(sorted(old), sorted(new))
+        for name in ('db_server', 'web_server', 'webserver'):
+            self.assertIs(old[name], new[name])
+        for name in ('dbms', 'database'):
+            self.assertIsNot(old[name], new[name])
+        self.assertEqual(
+            3307, new['database'].get_property_value('port').result())
+        self.assertEqual(
+            [new['db_server']],
+            [tpl for tpl in second.graph.vertex('dbms').related_nodes])
+        self.assertEqual(
+            set(['database']),
+            set(rel.source.name
+                for rel in new['dbms'].get_relationship_template()))
+
+        # Changing an input rebuilds the templates using it only
+        third = parse(tpl, {'db_name': 'db2'}, second)
+        self.assertIs(new['dbms'], node_templates(third)['dbms'])
+        database = node_templates(third)['database']
+        self.assertIsNot(new['database'], database)
+        self.assertEqual('db2', database.get_property_value('name').result())
+
+        tpl['topology_template']['node_templates']['dbms'][
+            'properties']['port'] = 'invalid'
+        self.assertRaises(exception.ValidationError, parse, tpl,
+                          previous=third)
+
+    def test_incremental_validation_keywords(self):
+        relationship = {
+            'type': 'tosca.relationships.HostedOn',
+            'interfaces': {'Configure': {'pre_configure_source': {
+                'implementation': 'configure.sh',
+                'inputs': {
+                    'target_address': {'get_attribute': [
+                        'TARGET', 'private_address']},
+                    'source_state': {'get_attribute': [
+                        'SOURCE', 'state']}}}}}}
+        tpl = {'tosca_definitions_version': 'tosca_simple_yaml_1_0',
+               'topology_template': {'node_templates': {
+                   'db_server': {'type': 'tosca.nodes.Compute'},
+                   'web_server': {'type': 'tosca.nodes.Compute'},
+                   'webserver': {'type': 'tosca.nodes.WebServer',
+                                 'requirements': [{'host': {
+                                     'node': 'web_server',
+                                     'relationship': relationship}}]},
+                   'dbms': {'type': 'tosca.nodes.DBMS',
+                            'properties': {'root_password': 'secret',
+                                           'port': 3306},
+                            'requirements': [{'host': 'db_server'}]},
+                   'database': {
+                       'type': 'tosca.nodes.Database',
+                       'properties': {
+                           'name': 'db',
+                           'port': {'get_property': ['HOST', 'port']}},
+                       'attributes': {
+                           'address': {'get_attribute': [
+                               'HOST', 'private_address']},
+                           'name': {'get_property': ['SELF', 'name']}},
+                       'requirements': [{'host': 'dbms'}]}}}}
+        nodetemplates = tpl['topology_template']['node_templates']
+        # The keywords are not taken for node template names
+        self.assertEqual(set(['dbms']), TopologyTemplate._get_dependencies(
+            nodetemplates['database']))
+        self.assertEqual(set(['web_server']),
+                         TopologyTemplate._get_dependencies(
+                             nodetemplates['webserver']))
+
+        def parse(tpl, previous=None):
+            return ToscaTemplate(a_file=False,
+                                 yaml_dict_tpl=copy.deepcopy(tpl),
+                                 previous=previous)
+
+        def node_templates(tosca):
+            return dict((tpl.name, tpl) for tpl in tosca.nodetemplates)
+
+        first = parse(tpl)
+        self.assertEqual(set(['dbms', 'database']),
+                         first.topology_template.get_affected_nodetemplates(
+                             ['dbms']))
+        self.assertEqual(set(['db_server', 'dbms', 'database']),
+                         first.topology_template.get_affected_nodetemplates(
+                             ['db_server']))
+        old = node_templates(first)
+        nodetemplates['dbms']['properties']['port'] = 3307
+        second = parse(tpl, previous=first)
+        new = node_templates(second)
+        for name in ('db_server', 'web_server', 'webserver'):
+            self.assertIs(old[name], new[name])
+        for name in ('dbms', 'database'):
+            self.assertIsNot(old[name], new[name])
+        self.assertEqual(
+            3307, new['database'].get_property_value('port').result())
+
     def test_multiple_validation_errors(self):
         tosca_tpl = os.path.join(
             os.path.dirname(os.path.abspath(__file__)),
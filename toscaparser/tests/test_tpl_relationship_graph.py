@@ -0,0 +1,86 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+
+from toscaparser.common import exception
+from toscaparser.tests.base import TestCase
+from toscaparser.tosca_template import ToscaTemplate
+import toscaparser.utils.yamlparser
+
+
+class ToscaGraphTest(TestCase):
+
+    def _get_graph(self, filename, **kwargs):
+        tosca_tpl = os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), "data", filename)
+        return ToscaTemplate(tosca_tpl, **kwargs).graph
+
+    def _names(self, nodetemplates):
+        return [tpl.name for tpl in nodetemplates]
+
+    def test_edges(self):
+        graph = self._get_graph("tosca_single_instance_wordpress.yaml",
+                                parsed_params={'db_root_pwd': '12345678'})
+        self.assertEqual(['mysql_dbms', 'webserver'],
+                         sorted(graph.sources('server')))
+        self.assertEqual(['webserver', 'mysql_database'],
+                         list(graph.targets('wordpress')))
+        self.assertEqual(['tosca.relationships.ConnectsTo'],
+                         [rel.type for rel in
+                          graph.targets('wordpress')['mysql_database']])
+        self.assertEqual({}, graph.targets('server'))
+        self.assertIn(graph.vertex('server'),
+                      graph.vertex('webserver').related_nodes)
+
+    def test_topological_order(self):
+        graph = self._get_graph("tosca_single_instance_wordpress.yaml",
+                                parsed_params={'db_root_pwd': '12345678'})
+        order = self._names(graph.topological_order())
+        self.assertEqual(sorted(graph.vertices), sorted(order))
+        for name in order:
+            for target in graph.targets(name):
+                if target != 'mysql_database':
+                    self.assertLess(order.index(target), order.index(name))
+        self.assertEqual(order, self._names(graph.topological_order()))
+
+    def test_connected_components(self):
+        graph = self._get_graph("test_incremental_validation.yaml",
+                                parsed_params={'db_name': 'db1'})
+        self.assertEqual([['db_server', 'dbms', 'database'],
+                          ['web_server', 'webserver']],
+                         [self._names(component) for component in
+                          graph.connected_components()])
+
+    def test_dependency_cycle(self):
+        tpl = toscaparser.utils.yamlparser.simple_parse('''
+        tosca_definitions_version: tosca_simple_yaml_1_0
+        topology_template:
+          node_templates:
+            server:
+              type: tosca.nodes.Compute
+            first:
+              type: tosca.nodes.SoftwareComponent
+              requirements:
+                - host: server
+                - dependency: second
+            second:
+              type: tosca.nodes.SoftwareComponent
+              requirements:
+                - host: server
+                - dependency: first
+        ''')
+        graph = ToscaTemplate(a_file=False, yaml_dict_tpl=tpl).graph
+        err = self.assertRaises(exception.DependencyCycleError,
+                                graph.topological_order)
+        self.assertEqual('Node templates depend on each other in a cycle: '
+                         '"first" -> "second" -> "first".', str(err))
@@ -10,7 +10,24 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import errno
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import fixtures
+import requests
+import testtools
+
+from toscaparser.elements.entity_type import EntityType
+from toscaparser.tests.base import HTTPServerFixture
 from toscaparser.tests.base import TestCase
+from toscaparser.tosca_template import ToscaTemplate
+from toscaparser.utils import httpcache
+from toscaparser.utils import poolutils
+from toscaparser.utils.lazyutils import LazyClassAttribute
 import toscaparser.utils.urlutils
 import toscaparser.utils.yamlparser
 
@@ -46,3 +63,341 @@ class UrlUtilsTest(TestCase):
             self.url_utils.join_url("http://github.com/proj1/scripts",
                                     "scripts/b.js"),
             "http://github.com/proj1/scripts/b.js")
+
+
+class RemoteFetchTest(TestCase):
+
+    url_utils = toscaparser.utils.urlutils.UrlUtils
+
+    def setUp(self):
+        super(RemoteFetchTest, self).setUp()
+        self.dir = self.useFixture(fixtures.TempDir()).path
+        self.server = self.useFixture(HTTPServerFixture(self.dir, 0.2))
+
+    def _write(self, name, content):
+        with open(os.path.join(self.dir, name), 'w') as f:
+            f.write(content)
+
+    def _types(self, name, imports=()):
+        content = ('tosca_definitions_version: tosca_simple_yaml_1_0\n'
+                   'node_types:\n'
+                   '  example.%s:\n'
+                   '    derived_from: tosca.nodes.Root\n' % name)
+        if imports:
+            content += 'imports:\n' + ''.join(
+                '  - %s\n' % self.server.url(i) for i in imports)
+        self._write(name + '.yaml', content)
+
+    def test_map_urls(self):
+        self._write('a.txt', 'a')
+        self._write('b.txt', 'b')
+        urls = [self.server.url(name)
+                for name in ('a.txt', 'missing.txt', 'b.txt')]
+        results = self.url_utils.map_urls(
+            lambda url: self.url_utils.get_url(url).text, urls)
+        self.assertEqual(urls, list(results))
+        self.assertEqual(('a', None), results[urls[0]])
+        self.assertIsInstance(results[urls[1]][1],
+                              requests.exceptions.HTTPError)
+        self.assertEqual(('b', None), results[urls[2]])
+        self.assertEqual(3, self.server.max_active)
+
+    def test_url_accessible_uses_head(self):
+        self._write('a.txt', 'a')
+        self.assertTrue(self.url_utils.url_accessible(
+            self.server.url('a.txt')))
+        self.assertRaises(requests.exceptions.HTTPError,
+                          self.url_utils.url_accessible,
+                          self.server.url('missing.txt'))
+        self.assertEqual([('HEAD', '/a.txt'), ('HEAD', '/missing.txt')],
+                         self.server.requests)
+
+    def test_remote_imports_fetched_concurrently(self):
+        self._types('common')
+        self._types('first', ['common.yaml'])
+        self._types('second', ['common.yaml'])
+        self._types('third')
+        tpl = toscaparser.utils.yamlparser.simple_parse('''
+        tosca_definitions_version: tosca_simple_yaml_1_0
+        repositories:
+          types:
+            url: %s
+        imports:
+          - %s
+          - %s
+          - third:
+              file: third.yaml
+              repository: types
+        topology_template:
+          node_templates:
+            first:
+              type: example.first
+            common:
+              type: example.common
+            third:
+              type: example.third
+        ''' % (self.server.url(''), self.server.url('first.yaml'),
+               self.server.url('second.yaml')))
+        tosca = ToscaTemplate(yaml_dict_tpl=tpl, a_file=False)
+        self.assertEqual(['common', 'first', 'third'],
+                         sorted(tpl.name for tpl in tosca.nodetemplates))
+        self.assertEqual(
+            ['/common.yaml', '/first.yaml', '/second.yaml', '/third.yaml'],
+            sorted(path for method, path in self.server.requests))
+        self.assertEqual(3, self.server.max_active)
+
+
+class PoolUtilsTest(TestCase):
+
+    @testtools.skipIf(poolutils.get_fork_context() is None,
+                      "Workers are forked")
+    def test_map_in_processes(self):
+        shared = {'key': 'value'}
+
+        def function(item):
+            if item is None:
+                raise ValueError('invalid')
+            return os.getpid(), item, shared
+
+        results = poolutils.map_in_processes(function, [1, None, 3], 2,
+                                             [shared])
+        self.assertEqual([1, None, 3],
+                         [result[1] if result else None
+                          for result, error in results])
+        self.assertIsInstance(results[1][1], ValueError)
+        self.assertNotEqual(os.getpid(), results[0][0][0])
+        # shared objects come back as the objects of this process
+        self.assertIs(shared, results[0][0][2])
+
+    def test_map_in_processes_with_threads(self):
+        release = threading.Event()
+        thread = threading.Thread(target=release.wait)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(release.set)
+
+        def function(item):
+            if item is None:
+                raise ValueError('invalid')
+            return os.getpid(), item
+
+        # Workers are not forked while other threads may hold locks
+        results = poolutils.map_in_processes(function, [1, None], 2)
+        self.assertEqual(((os.getpid(), 1), None), results[0])
+        self.assertIsInstance(results[1][1], ValueError)
+
+
+class HTTPCacheTest(TestCase):
+
+    def setUp(self):
+        super(HTTPCacheTest, self).setUp()
+        self.dir = self.useFixture(fixtures.TempDir()).path
+        self.server = self.useFixture(HTTPServerFixture(self.dir))
+        self.cache_dir = self.useFixture(fixtures.TempDir()).path
+        self.session = toscaparser.utils.urlutils.UrlUtils.get_session()
+
+    def _write(self, name, content):
+        with open(os.path.join(self.dir, name), 'w') as f:
+            f.write(content)
+
+    def _cache(self, **kwargs):
+        return httpcache.HTTPCache(self.cache_dir, **kwargs)
+
+    def test_revalidate(self):
+        self._write('a.yaml', 'a: 1')
+        url = self.server.url('a.yaml')
+        self.assertEqual(b'a: 1', self._cache().get(url, self.session))
+        self.assertEqual(b'a: 1', self._cache().get(url, self.session))
+        self._write('a.yaml', 'a: 2')
+        self.assertEqual(b'a: 2', self._cache().get(url, self.session))
+        self.assertEqual([200, 304, 200], self.server.responses)
+
+    def test_ttl(self):
+        self._write('a.yaml', 'a: 1')
+        url = self.server.url('a.yaml')
+        self._cache(ttl=3600).get(url, self.session)
+        self._write('a.yaml', 'a: 2')
+        self.assertEqual(b'a: 1',
+                         self._cache(ttl=3600).get(url, self.session))
+        self.assertEqual([200], self.server.responses)
+
+    def test_offline(self):
+        self._write('a.yaml', 'a: 1')
+        url = self.server.url('a.yaml')
+        self._cache().get(url, self.session)
+        self.assertEqual(b'a: 1',
+                         self._cache(offline=True).get(url, self.session))
+        self.assertRaises(requests.exceptions.ConnectionError,
+                          self._cache(offline=True).get,
+                          self.server.url('b.yaml'), self.session)
+        self.assertEqual([200], self.server.responses)
+
+    def test_evict_least_recently_used(self):
+        for name in ('a', 'b', 'c'):
+            self._write(name + '.yaml', name * 10)
+        cache = self._cache(ttl=3600, max_size=25)
+        for name in ('a', 'b'):
+            cache.get(self.server.url(name + '.yaml'), self.session)
+            time.sleep(0.01)
+        cache.get(self.server.url('a.yaml'), self.session)
+        time.sleep(0.01)
+        cache.get(self.server.url('c.yaml'), self.session)
+        del self.server.requests[:]
+        for name in ('a', 'c', 'b'):
+            cache.get(self.server.url(name + '.yaml'), self.session)
+        self.assertEqual([('GET', '/b.yaml')], self.server.requests)
+        self.assertEqual(2, len(os.listdir(
+            os.path.join(self.cache_dir, 'objects'))))
+
+    def test_shared_content(self):
+        self._write('a.yaml', 'same')
+        self._write('b.yaml', 'same')
+        cache = self._cache()
+        cache.get(self.server.url('a.yaml'), self.session)
+        cache.get(self.server.url('b.yaml'), self.session)
+        self.assertEqual(1, len(os.listdir(
+            os.path.join(self.cache_dir, 'objects'))))
+
+    def test_incomplete_entry(self):
+        self._write('a.yaml', 'a: 1')
+        url = self.server.url('a.yaml')
+        cache = self._cache(ttl=3600)
+        cache.get(url, self.session)
+        with open(cache._entry_path(url), 'w') as f:
+            f.write('{"url": "%s"}' % url)
+        self.assertEqual(b'a: 1', cache.get(url, self.session))
+        self.assertEqual([200, 200], self.server.responses)
+
+    def test_oversized_not_stored(self):
+        self._write('a.yaml', 'a' * 30)
+        url = self.server.url('a.yaml')
+        cache = self._cache(ttl=3600, max_size=25)
+        self.assertEqual(b'a' * 30, cache.get(url, self.session))
+        self.assertFalse(os.path.exists(os.path.join(self.cache_dir,
+                                                     'objects')))
+        self.assertEqual(b'a' * 30, cache.get(url, self.session))
+        self.assertEqual([200, 200], self.server.responses)
+
+    def test_remote_imports_cached(self):
+        self._write('types.yaml',
+                    'tosca_definitions_version: tosca_simple_yaml_1_0\n'
+                    'node_types:\n'
+                    '  example.Node:\n'
+                    '    derived_from: tosca.nodes.Root\n')
+        self.useFixture(fixtures.EnvironmentVariable(
+            toscaparser.utils.yamlparser.CACHE_DIR_ENV, self.cache_dir))
+        self.useFixture(fixtures.EnvironmentVariable(httpcache.TTL_ENV,
+                                                     '3600'))
+        tpl = {'tosca_definitions_version': 'tosca_simple_yaml_1_0',
+               'imports': [self.server.url('types.yaml')],
+               'topology_template': {'node_templates': {
+                   'node': {'type': 'example.Node'}}}}
+        for i in range(2):
+            ToscaTemplate(yaml_dict_tpl=dict(tpl), a_file=False)
+        self.assertEqual([('GET', '/types.yaml')], self.server.requests)
+
+
+class YamlParserCacheTest(TestCase):
+
+    def setUp(self):
+        super(YamlParserCacheTest, self).setUp()
+        self.cache_dir = self.useFixture(fixtures.TempDir()).path
+        self.useFixture(fixtures.EnvironmentVariable(
+            toscaparser.utils.yamlparser.CACHE_DIR_ENV, self.cache_dir))
+
+    def test_cached_load_matches_parse(self):
+        defs_file = EntityType.TOSCA_DEF_FILE
+        expected = YAML_LOADER(defs_file)
+        self.assertEqual(expected, YAML_LOADER(defs_file, cache=True))
+        self.assertEqual(1, len(os.listdir(self.cache_dir)))
+        self.assertEqual(expected, YAML_LOADER(defs_file, cache=True))
+        self.assertEqual(1, len(os.listdir(self.cache_dir)))
+
+    def test_cached_load_keyed_by_content(self):
+        path = os.path.join(self.cache_dir, 'defs.yaml')
+        with open(path, 'w') as f:
+            f.write('node_types: {}\n')
+        self.assertEqual({'node_types': {}}, YAML_LOADER(path, cache=True))
+        with open(path, 'w') as f:
+            f.write('data_types: {}\n')
+        self.assertEqual({'data_types': {}}, YAML_LOADER(path, cache=True))
+
+    def test_cached_load_ignores_corrupt_entry(self):
+        defs_file = EntityType.TOSCA_DEF_FILE
+        YAML_LOADER(defs_file, cache=True)
+        for name in os.listdir(self.cache_dir):
+            with open(os.path.join(self.cache_dir, name), 'w') as f:
+                f.write('corrupt')
+        self.assertEqual(YAML_LOADER(defs_file),
+                         YAML_LOADER(defs_file, cache=True))
+
+    def test_cache_disabled(self):
+        self.useFixture(fixtures.EnvironmentVariable(
+            toscaparser.utils.yamlparser.CACHE_DIR_ENV, ''))
+        defs_file = EntityType.TOSCA_DEF_FILE
+        self.assertEqual(YAML_LOADER(defs_file),
+                         YAML_LOADER(defs_file, cache=True))
+        self.assertEqual([], os.listdir(self.cache_dir))
+
+    def test_cache_disabled_by_default(self):
+        self.useFixture(fixtures.EnvironmentVariable(
+            toscaparser.utils.yamlparser.CACHE_DIR_ENV))
+        self.assertIsNone(toscaparser.utils.yamlparser.get_cache_dir())
+        defs_file = EntityType.TOSCA_DEF_FILE
+        self.assertEqual(YAML_LOADER(defs_file),
+                         YAML_LOADER(defs_file, cache=True))
+        self.assertEqual([], os.listdir(os.path.expanduser('~')))
+
+    def test_failed_store_removed(self):
+        def failing_rename(src, dst):
+            raise OSError(errno.EACCES, os.strerror(errno.EACCES), dst)
+
+        self.patch(os, 'rename', failing_rename)
+        defs_file = EntityType.TOSCA_DEF_FILE
+        self.assertEqual(YAML_LOADER(defs_file),
+                         YAML_LOADER(defs_file, cache=True))
+        self.assertEqual([], os.listdir(self.cache_dir))
+
+
+class LazyImportTest(TestCase):
+
+    def test_lazy_class_attribute(self):
+        calls = []
+
+        class Base(object):
+            @LazyClassAttribute
+            def VALUE(cls):
+                calls.append(cls)
+                return [cls.__name__]
+
+        class Derived(Base):
+            pass
+
+        self.assertEqual(['Base'], Derived().VALUE)
+        self.assertIs(Derived.VALUE, Base.VALUE)
+        self.assertEqual([Base], calls)
+
+    def test_import_tosca_template(self):
+        # No YAML file is loaded and nothing is looked up until used
+        code = ('import sys, yaml\n'
+                'loaded = []\n'
+                'load = yaml.load\n'
+                'yaml.load = lambda *args, **kwargs: (loaded.append(args), '
+                'load(*args, **kwargs))[1]\n'
+                'import toscaparser.tosca_template\n'
+                'print(len(loaded))\n'
+                'from toscaparser.elements.entity_type import EntityType\n'
+                'print("TOSCA_DEF" in vars(EntityType) and not isinstance('
+                'vars(EntityType)["TOSCA_DEF"], dict))\n'
+                'from toscaparser.tosca_template import ToscaTemplate\n'
+                'from toscaparser.utils.lazyutils import LazyClassAttribute\n'
+                'print(isinstance(vars(ToscaTemplate)["exttools"], '
+                'LazyClassAttribute))\n'
+                'print("requests" in sys.modules)\n')
+        output = subprocess.check_output([sys.executable, '-c', code])
+        loaded, lazy_defs, lazy_exttools, requests_loaded = \
+            output.decode().split()
+        self.assertEqual('0', loaded)
+        self.assertEqual('True', lazy_defs)
+        self.assertEqual('True', lazy_exttools)
+        self.assertEqual('False', requests_loaded)
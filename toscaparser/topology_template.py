@@ -12,6 +12,7 @@
 
 
 import logging
+import six
 
 from toscaparser.common import exception
 from toscaparser.dataentity import DataEntity
@@ -35,33 +36,69 @@ SECTIONS = (DESCRIPTION, INPUTS, NODE_TEMPLATES,
             'relationship_templates', 'outputs', 'groups',
             'substitution_mappings', 'policies')
 
+# Function arguments naming node templates relative to the one using them
+NODE_KEYWORDS = (functions.SELF, functions.HOST, functions.SOURCE,
+                 functions.TARGET)
+
 log = logging.getLogger("tosca-parser")
 
 
 class TopologyTemplate(object):
 
-    '''Load the template data.'''
+    '''Load the template data.
+
+    When given the topology of a previous parse of the same template with
+    the same custom definitions, the node templates unaffected by the
+    changes made since are taken over from it instead of being built and
+    validated again. The previous topology must not be used afterwards.
+    '''
     def __init__(self, template, custom_defs,
                  rel_types=None, parsed_params=None,
-                 sub_mapped_node_template=None):
+                 sub_mapped_node_template=None, previous=None):
         self.tpl = template
         self.sub_mapped_node_template = sub_mapped_node_template
+        self._fingerprints = None
         if self.tpl:
             self.custom_defs = custom_defs
             self.rel_types = rel_types
             self.parsed_params = parsed_params
+            self._fingerprints = self._get_fingerprints()
+            self._previous = None
+            self._reused = {}
+            if previous is not None and previous._fingerprints and \
+                    previous._fingerprints[RELATIONSHIP_TEMPLATES] == \
+                    self._fingerprints[RELATIONSHIP_TEMPLATES]:
+                self._previous = previous
+                self._reused = self._get_reusable_nodetemplates(previous)
+            exception.ExceptionCollector.set_section('topology_template')
             self._validate_field()
             self.description = self._tpl_description()
+            exception.ExceptionCollector.set_section(INPUTS)
             self.inputs = self._inputs()
+            exception.ExceptionCollector.set_section(RELATIONSHIP_TEMPLATES)
             self.relationship_templates = self._relationship_templates()
+            exception.ExceptionCollector.set_section(NODE_TEMPLATES)
             self.nodetemplates = self._nodetemplates()
+            self._index_nodetemplates()
+            exception.ExceptionCollector.set_section(OUTPUTS)
             self.outputs = self._outputs()
             if hasattr(self, 'nodetemplates'):
+                # Relationships are resolved while building the graph
+                exception.ExceptionCollector.set_section(NODE_TEMPLATES)
                 self.graph = ToscaGraph(self.nodetemplates)
+            exception.ExceptionCollector.set_section(GROUPS)
             self.groups = self._groups()
+            self._index_groups()
+            exception.ExceptionCollector.set_section(POLICIES)
             self.policies = self._policies()
+            # Functions are used by node templates and outputs
+            exception.ExceptionCollector.set_section(NODE_TEMPLATES)
             self._process_intrinsic_functions()
+            self._rebind_reused_nodetemplates()
+            exception.ExceptionCollector.set_section(SUBSTITUION_MAPPINGS)
             self.substitution_mappings = self._substitution_mappings()
+            self._previous = None
+            self._reused = {}
 
     def _inputs(self):
         inputs = []
@@ -101,10 +138,19 @@ class TopologyTemplate(object):
         nodetemplates = []
         tpls = self._tpl_nodetemplates()
         if tpls:
+            # Templates built while resolving the requirements of another
+            # one are reused, so that every template is built once
+            available_node_tpls = {}
+            self._take_over_nodetemplates(tpls, available_node_tpls)
             for name in tpls:
-                tpl = NodeTemplate(name, tpls, self.custom_defs,
-                                   self.relationship_templates,
-                                   self.rel_types)
+                tpl = available_node_tpls.get(name)
+                if name in self._reused:
+                    nodetemplates.append(tpl)
+                    continue
+                if tpl is None:
+                    tpl = NodeTemplate(name, tpls, self.custom_defs,
+                                       self.relationship_templates,
+                                       self.rel_types, available_node_tpls)
                 if (tpl.type_definition and
                     (tpl.type in tpl.type_definition.TOSCA_DEF or
                      (tpl.type not in tpl.type_definition.TOSCA_DEF and
@@ -113,7 +159,145 @@ class TopologyTemplate(object):
                     nodetemplates.append(tpl)
         return nodetemplates
 
+    def _take_over_nodetemplates(self, tpls, available_node_tpls):
+        '''Attach the reused node templates to this topology.'''
+        reused_ids = set(id(tpl) for tpl in self._reused.values())
+        for name, tpl in self._reused.items():
+            tpl.templates = tpls
+            tpl.available_node_tpls = available_node_tpls
+            available_node_tpls[name] = tpl
+            # Edges from the templates built again are added back when
+            # their requirements are resolved
+            tpl.related = {}
+            tpl.relationship_tpl = [
+                rel_tpl for rel_tpl in tpl.relationship_tpl
+                if id(getattr(rel_tpl, 'source', None)) in reused_ids]
+
+    def _rebind_reused_nodetemplates(self):
+        '''Make the functions of the reused node templates use this
+        topology.'''
+        for tpl in self._reused.values():
+            values = [prop.value for prop in tpl.get_properties_objects()]
+            values.extend(interface.inputs for interface in tpl.interfaces)
+            values.append(tpl.requirements)
+            for rel_tpl in tpl.relationship_tpl:
+                values.extend(interface.inputs
+                              for interface in rel_tpl.interfaces)
+            while values:
+                value = values.pop()
+                if isinstance(value, functions.Function):
+                    value.tosca_tpl = self
+                    values.append(value.args)
+                elif isinstance(value, dict):
+                    values.extend(value.values())
+                elif isinstance(value, list):
+                    values.extend(value)
+
+    def _get_fingerprints(self):
+        '''Return comparable snapshots of the sections of the template.
+
+        They are taken before parsing, which replaces parts of the template
+        with function objects.
+        '''
+        params = self.parsed_params or {}
+        nodetemplates = self._tpl_nodetemplates()
+        if not isinstance(nodetemplates, dict):
+            nodetemplates = {}
+        inputs = self._tpl_inputs()
+        if not isinstance(inputs, dict):
+            inputs = {}
+        return {
+            RELATIONSHIP_TEMPLATES: repr(self._tpl_relationship_templates()),
+            NODE_TEMPLATES: dict((name, repr(tpl))
+                                 for name, tpl in nodetemplates.items()),
+            INPUTS: dict((name, repr((tpl, name in params,
+                                      params.get(name))))
+                         for name, tpl in inputs.items()),
+        }
+
+    def _get_reusable_nodetemplates(self, previous):
+        '''Return the node templates of a previous topology not affected
+        by the changes made since, by name.'''
+        changed = {}
+        for section in (NODE_TEMPLATES, INPUTS):
+            old = previous._fingerprints[section]
+            new = self._fingerprints[section]
+            changed[section] = set(name for name in set(old) | set(new)
+                                   if old.get(name) != new.get(name))
+        affected = self.get_affected_nodetemplates(changed[NODE_TEMPLATES],
+                                                   changed[INPUTS])
+        return dict((tpl.name, tpl) for tpl in previous.nodetemplates
+                    if tpl.name not in affected)
+
+    def get_affected_nodetemplates(self, names, inputs=()):
+        '''Return the names of the node templates affected by a change.
+
+        These are the given node templates and the ones depending on them or
+        on the given inputs, directly or not, through their requirements or
+        the node templates and inputs their functions refer to.
+        '''
+        dependents = {}
+        nodetemplates = self._tpl_nodetemplates()
+        if not isinstance(nodetemplates, dict):
+            nodetemplates = {}
+        for name, tpl in nodetemplates.items():
+            for dependency in self._get_dependencies(tpl):
+                dependents.setdefault(dependency, set()).add(name)
+        affected = set(names)
+        pending = list(names) + [(INPUTS, name) for name in inputs]
+        while pending:
+            for dependent in dependents.get(pending.pop(), ()):
+                if dependent not in affected:
+                    affected.add(dependent)
+                    pending.append(dependent)
+        return affected
+
+    @staticmethod
+    def _get_dependencies(tpl):
+        '''Return the node templates and inputs a node template refers to.
+
+        Inputs are returned as (INPUTS, name) tuples. They are found in the
+        template as written, as the function objects of functions.py only
+        exist once the node templates are built. The node templates the
+        SELF, HOST, SOURCE and TARGET keywords refer to are the template
+        itself or reached through its requirements, which are already
+        dependencies.
+        '''
+        dependencies = set()
+        if not isinstance(tpl, dict):
+            return dependencies
+        requirements = tpl.get('requirements')
+        if isinstance(requirements, list):
+            for req in requirements:
+                if not isinstance(req, dict):
+                    continue
+                for value in req.values():
+                    if isinstance(value, dict):
+                        value = value.get('node')
+                    if isinstance(value, six.string_types):
+                        dependencies.add(value)
+        values = [tpl]
+        while values:
+            value = values.pop()
+            if isinstance(value, dict):
+                if len(value) == 1:
+                    func_name, args = list(value.items())[0]
+                    if func_name in functions.function_mappings:
+                        if not isinstance(args, list):
+                            args = [args]
+                        if args and isinstance(args[0], six.string_types):
+                            if func_name == functions.GET_INPUT:
+                                dependencies.add((INPUTS, args[0]))
+                            elif args[0] not in NODE_KEYWORDS:
+                                dependencies.add(args[0])
+                values.extend(value.values())
+            elif isinstance(value, list):
+                values.extend(value)
+        return dependencies
+
     def _relationship_templates(self):
+        if self._previous is not None:
+            return self._previous.relationship_templates
         rel_templates = []
         tpls = self._tpl_relationship_templates()
         for name in tpls:
@@ -189,29 +373,60 @@ class TopologyTemplate(object):
         exception.TOSCAException.reset_context()
         return groups
 
+    def _index_nodetemplates(self):
+        self._nodetemplates_by_name = {}
+        self._nodetemplates_by_type = {}
+        for node in self.nodetemplates:
+            self._nodetemplates_by_name.setdefault(node.name, node)
+            self._nodetemplates_by_type.setdefault(node.type, []).append(node)
+
+    def _index_groups(self):
+        self._groups_by_name = {}
+        for group in self.groups:
+            self._groups_by_name.setdefault(group.name, group)
+
+    def get_node_template(self, name):
+        '''Return the node template with the given name, or None.'''
+        try:
+            return self._nodetemplates_by_name.get(name)
+        except TypeError:
+            # An invalid template may reference a node with a list or map
+            return None
+
+    def get_node_templates_by_type(self, type):
+        '''Return the node templates of exactly the given type.'''
+        try:
+            return list(self._nodetemplates_by_type.get(type, []))
+        except TypeError:
+            return []
+
+    def get_group(self, name):
+        '''Return the group with the given name, or None.'''
+        try:
+            return self._groups_by_name.get(name)
+        except TypeError:
+            return None
+
     def _get_group_members(self, member_names):
         member_nodes = []
         self._validate_group_members(member_names)
         for member in member_names:
-            for node in self.nodetemplates:
-                if node.name == member:
-                    member_nodes.append(node)
+            node = self.get_node_template(member)
+            if node:
+                member_nodes.append(node)
         return member_nodes
 
     def _get_policy_groups(self, member_names):
         member_groups = []
         for member in member_names:
-            for group in self.groups:
-                if group.name == member:
-                    member_groups.append(group)
+            group = self.get_group(member)
+            if group:
+                member_groups.append(group)
         return member_groups
 
     def _validate_group_members(self, members):
-        node_names = []
-        for node in self.nodetemplates:
-            node_names.append(node.name)
         for member in members:
-            if member not in node_names:
+            if self.get_node_template(member) is None:
                 exception.ExceptionCollector.appendException(
                     exception.InvalidGroupTargetException(
                         message=_('Target member "%s" is not found in '
@@ -292,6 +507,9 @@ class TopologyTemplate(object):
         """
         if hasattr(self, 'nodetemplates'):
             for node_template in self.nodetemplates:
+                if node_template.name in self._reused:
+                    # Processed already, only rebound to this topology
+                    continue
                 for prop in node_template.get_properties_objects():
                     prop.value = functions.get_function(self,
                                                         node_template,
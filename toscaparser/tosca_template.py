@@ -11,11 +11,14 @@
 #    under the License.
 
 
+import collections
 import logging
 import os
 import sys
+import threading
 
 from copy import deepcopy
+from six.moves import queue
 from toscaparser.common.exception import ExceptionCollector
 from toscaparser.common.exception import InvalidTemplateVersion
 from toscaparser.common.exception import MissingRequiredFieldError
@@ -25,7 +28,7 @@ from toscaparser.common.exception import MissingRequiredOutputError
 from toscaparser.common.exception import MissingRequiredParameterError
 from toscaparser.common.exception import UnknownFieldError
 from toscaparser.common.exception import ValidationError
-from toscaparser.elements.entity_type import update_definitions
+from toscaparser.elements.entity_type import ProfileRegistry
 from toscaparser.elements.tosca_type_validation import TypeValidation
 from toscaparser.extensions.exttools import ExtTools
 import toscaparser.imports
@@ -34,6 +37,8 @@ from toscaparser.repositories import Repository
 from toscaparser.topology_template import TopologyTemplate
 from toscaparser.tpl_relationship_graph import ToscaGraph
 from toscaparser.utils.gettextutils import _
+from toscaparser.utils.lazyutils import LazyClassAttribute
+from toscaparser.utils import poolutils
 import toscaparser.utils.yamlparser
 
 
@@ -61,17 +66,49 @@ YAML_LOADER = toscaparser.utils.yamlparser.load_yaml
 
 class ToscaTemplate(object):
 
-    VALID_TEMPLATE_VERSIONS = TypeValidation.VALID_TEMPLATE_VERSIONS
-
-    ADDITIONAL_SECTIONS = {k: SPECIAL_SECTIONS for k in TypeValidation.STANDARD_TEMPLATE_VERSIONS}
-
-    exttools = ExtTools()
-    ADDITIONAL_SECTIONS.update(exttools.get_sections())
-
-    '''Load the template data.'''
+    @LazyClassAttribute
+    def VALID_TEMPLATE_VERSIONS(cls):
+        return TypeValidation.VALID_TEMPLATE_VERSIONS
+
+    @LazyClassAttribute
+    def exttools(cls):
+        return ExtTools()
+
+    @LazyClassAttribute
+    def ADDITIONAL_SECTIONS(cls):
+        sections = {k: SPECIAL_SECTIONS
+                    for k in TypeValidation.STANDARD_TEMPLATE_VERSIONS}
+        sections.update(cls.exttools.get_sections())
+        return sections
+
+    '''Load the template data.
+
+    A template parsed before from the same definitions can be given as
+    previous, so that only the node templates affected by the changes made
+    to the topology since are built and validated again. Its objects are
+    taken over by the new template, so it must not be used afterwards.
+
+    Templates parsed on behalf of another one share its import_cache. They
+    are parsed from the copy of their file loaded with the imports of the
+    other one, and are given its custom_defs when they resolve to the same
+    custom definitions.
+
+    The templates substituting node templates are parsed one after the
+    other, or on nested_jobs forked processes when greater than one and
+    the platform can fork. As forking is only safe from a single threaded
+    process, they are parsed one after the other while other threads run.
+    Either way they are merged in the same order, and so are their errors:
+    grouped by nested template file, then in the order the node templates
+    they substitute are declared.
+
+    A CSAR is parsed without extracting it, its files are extracted below
+    csar.temp_dir when path is first accessed.
+    '''
     def __init__(self, path=None, parsed_params=None, a_file=True,
                  yaml_dict_tpl=None, sub_mapped_node_template=None,
-                 no_required_paras_check=False, debug=False, verbose=False):
+                 no_required_paras_check=False, debug=False, verbose=False,
+                 previous=None, import_cache=None, custom_defs=None,
+                 nested_jobs=None):
         # Set the global logging level
         fmt = logging.Formatter(
             '%(asctime)-23s %(levelname)-5s  (%(name)s@%(process)d:' \
@@ -82,25 +119,56 @@ class ToscaTemplate(object):
             log.setLevel(logging.DEBUG)
         else:
             log.setLevel(logging.ERROR)
-        log.addHandler(stderr_handler)
+        # Every template used to add one more handler, repeating each
+        # message once per template parsed by the process
+        if not log.handlers:
+            log.addHandler(stderr_handler)
         self.verbose = verbose
 
         if sub_mapped_node_template is None:
             ExceptionCollector.start()
+        # Restored once done, this template may select another profile
+        profile = ProfileRegistry.current()
+        if sub_mapped_node_template is None:
+            ProfileRegistry.select(ProfileRegistry.get())
+        try:
+            self._parse(path, parsed_params, a_file, yaml_dict_tpl,
+                        sub_mapped_node_template, no_required_paras_check,
+                        previous, import_cache, custom_defs, nested_jobs)
+        finally:
+            ProfileRegistry.select(profile)
+
+    def _parse(self, path, parsed_params, a_file, yaml_dict_tpl,
+               sub_mapped_node_template, no_required_paras_check,
+               previous, import_cache, custom_defs, nested_jobs):
         self.a_file = a_file
         self.input_path = None
-        self.path = None
+        self._path = None
         self.tpl = None
         self.sub_mapped_node_template = sub_mapped_node_template
         self.nested_tosca_tpls_with_topology = {}
         self.nested_tosca_templates_with_topology = []
         self.no_required_paras_check = no_required_paras_check
+        self.import_cache = import_cache or \
+            toscaparser.imports.ImportCache()
+        self.csar = None
+        self._definitions = None
+        self._previous = None
+        self._custom_defs = custom_defs
+        self.nested_jobs = nested_jobs
 
         if path:
             self.input_path = path
-            self.path = self._get_path(path)
-            if self.path:
-                self.tpl = YAML_LOADER(self.path, self.a_file)
+            self._path = self._get_path(path)
+            if self._path and sub_mapped_node_template is not None:
+                # Parsing changes the template, the loaded one is shared
+                self.tpl = deepcopy(self.import_cache.load(self._path,
+                                                           self.a_file))
+            elif self._path and self.a_file and \
+                    self.import_cache.is_mounted(self._path):
+                self.tpl = self.import_cache.read(self._path)
+            elif self._path:
+                self.tpl = YAML_LOADER(self._path, self.a_file)
             if yaml_dict_tpl:
                 msg = (_('Both path and yaml_dict_tpl arguments were '
                          'provided. Using path and ignoring yaml_dict_tpl.'))
@@ -119,12 +187,21 @@ class ToscaTemplate(object):
 
         if self.tpl:
             self.parsed_params = parsed_params
+            self._definitions = repr(
+                (self._path, [(k, v) for k, v in self.tpl.items()
+                              if k != TOPOLOGY_TEMPLATE]))
+            if self._can_reuse(previous):
+                self._previous = previous
+                self.import_cache = previous.import_cache
             self._validate_field()
             self.version = self._tpl_version()
             self.metadata = self._tpl_metadata()
+            ExceptionCollector.set_section(IMPORTS)
             self.relationship_types = self._tpl_relationship_types()
             self.description = self._tpl_description()
+            # The topology template marks the sections it goes through
             self.topology_template = self._topology_template()
+            ExceptionCollector.set_section(REPOSITORIES)
             self.repositories = self._tpl_repositories()
             if self.topology_template.tpl:
                 self.inputs = self._inputs()
@@ -134,8 +211,10 @@ class ToscaTemplate(object):
                 self.groups = self._groups()
                 self.policies = self._policies()
                 self.substitution_mappings = self._substitution_mappings()
+                ExceptionCollector.set_section(IMPORTS)
                 self._handle_nested_tosca_templates_with_topology()
                 self.graph = ToscaGraph(self.nodetemplates)
+            self._previous = None
 
         self.verify_template()
         if sub_mapped_node_template is None:
@@ -150,9 +229,48 @@ class ToscaTemplate(object):
             return s
         return ''
 
+    @property
+    def path(self):
+        '''Return the path of the template file.
+
+        The files of the CSAR it is read from are extracted if needed, for
+        the path to exist.
+        '''
+        if self.csar is not None and self._path and \
+                not os.path.isfile(self._path):
+            self.csar.decompress()
+        return self._path
+
+    @path.setter
+    def path(self, path):
+        self._path = path
+
+    def _can_reuse(self, previous):
+        '''Check that a previous template has the same definitions.'''
+        return (previous is not None and
+                previous._definitions == self._definitions and
+                previous.a_file == self.a_file and
+                self.sub_mapped_node_template is None and
+                getattr(previous, 'topology_template', None) is not None and
+                previous.topology_template.tpl and
+                not previous.nested_tosca_tpls_with_topology and
+                previous.import_cache.is_current())
+
     def _topology_template(self):
+        previous = self._previous
+        if previous is not None:
+            # The definitions are unchanged, so are the custom types and
+            # the type universe built from them
+            return TopologyTemplate(self._tpl_topology_template(),
+                                    previous.topology_template.custom_defs,
+                                    self.relationship_types,
+                                    self.parsed_params,
+                                    previous=previous.topology_template)
+        custom_defs = self._custom_defs
+        if custom_defs is None:
+            custom_defs = self._get_all_custom_defs()
         return TopologyTemplate(self._tpl_topology_template(),
-                                self._get_all_custom_defs(),
+                                custom_defs,
                                 self.relationship_types,
                                 self.parsed_params,
                                 self.sub_mapped_node_template)
@@ -211,16 +329,23 @@ class ToscaTemplate(object):
     def _substitution_mappings(self):
         return self.topology_template.substitution_mappings
 
-    def _get_all_custom_defs(self, imports=None):
+    def _get_all_custom_defs(self, imports=None, resolved_imports=None):
         types = [IMPORTS, NODE_TYPES, CAPABILITY_TYPES, RELATIONSHIP_TYPES,
                  DATA_TYPES, INTERFACE_TYPES, POLICY_TYPES, GROUP_TYPES]
+        if resolved_imports is None:
+            resolved_imports = []
+        resolved_imports.extend(imports or self._tpl_imports() or [])
         custom_defs_final = {}
         custom_defs = self._get_custom_types(types, imports)
         if custom_defs:
             custom_defs_final.update(custom_defs)
-            if custom_defs.get(IMPORTS):
-                import_defs = self._get_all_custom_defs(
-                    custom_defs.get(IMPORTS))
+            # Skip the imports already resolved on the way here so that
+            # cyclic imports terminate and shared ones load only once
+            nested_imports = [i for i in custom_defs.get(IMPORTS) or []
+                              if i not in resolved_imports]
+            if nested_imports:
+                import_defs = self._get_all_custom_defs(nested_imports,
+                                                        resolved_imports)
                 custom_defs_final.update(import_defs)
 
         # As imports are not custom_types, removing from the dict
@@ -246,8 +371,8 @@ class ToscaTemplate(object):
 
         if imports:
             custom_service = toscaparser.imports.\
-                ImportsLoader(imports, self.path,
-                              type_defs, self.tpl)
+                ImportsLoader(imports, self._path,
+                              type_defs, self.tpl, self.import_cache)
 
             nested_tosca_tpls = custom_service.get_nested_tosca_tpls()
             self._update_nested_tosca_tpls_with_topology(nested_tosca_tpls)
@@ -273,38 +398,101 @@ class ToscaTemplate(object):
                 self.nested_tosca_tpls_with_topology.update(tpl)
 
     def _handle_nested_tosca_templates_with_topology(self):
+        # The node templates substituted, with their template file, grouped
+        # by file as when they were parsed one after the other
+        tasks = []
+        substituted = set()
         for fname, tosca_tpl in self.nested_tosca_tpls_with_topology.items():
-            for nodetemplate in self.nodetemplates:
-                if self._is_sub_mapped_node(nodetemplate, tosca_tpl):
-                    parsed_params = self._get_params_for_nested_template(
-                        nodetemplate)
-
-                    cache_exeptions = deepcopy(ExceptionCollector.exceptions)
-                    cache_exeptions_state = \
-                        deepcopy(ExceptionCollector.collecting)
-                    nested_template = None
-                    try:
-                        nrpv = self.no_required_paras_check
-                        nested_template = ToscaTemplate(
-                            path=fname, parsed_params=parsed_params,
-                            sub_mapped_node_template=nodetemplate,
-                            no_required_paras_check=nrpv)
-                    except ValidationError as e:
-                        log.error(e.message)
-                        raise e
-
-                    ExceptionCollector.exceptions = deepcopy(cache_exeptions)
-                    ExceptionCollector.collecting = \
-                        deepcopy(cache_exeptions_state)
-
-                    if nested_template and \
-                            nested_template._has_substitution_mappings():
-                        # Record the nested templates in top level template
-                        self.nested_tosca_templates_with_topology.\
-                            append(nested_template)
-                        # Set the substitution toscatemplate for mapped node
-                        nodetemplate.substitution_mapped = \
-                            nested_template
+            node_type = self.get_sub_mapping_node_type(tosca_tpl)
+            for nodetemplate in self.topology_template.\
+                    get_node_templates_by_type(node_type):
+                if self._is_sub_mapped_node(nodetemplate, tosca_tpl) and \
+                        nodetemplate not in substituted:
+                    substituted.add(nodetemplate)
+                    tasks.append((fname, nodetemplate))
+
+        if (self.nested_jobs or 1) > 1 and len(tasks) > 1 and \
+                poolutils.get_fork_context() is not None:
+            results = poolutils.map_in_processes(
+                self._parse_nested_template, tasks, self.nested_jobs,
+                self._get_shared_objects())
+        else:
+            results = self._parse_nested_templates(tasks)
+
+        for (fname, nodetemplate), (result, error) in zip(tasks, results):
+            if error is not None:
+                raise error
+            nested_template, errors, failure = result
+            if failure is not None:
+                # The errors of the nested template are reported along
+                # with the ones this template collected so far
+                for error in errors:
+                    ExceptionCollector.appendException(error)
+                raise self._get_validation_error(fname) or failure
+
+            if nested_template and self.csar is not None:
+                # Read from the same CSAR
+                nested_template.csar = self.csar
+            if nested_template and \
+                    nested_template._has_substitution_mappings():
+                # Record the nested templates in top level template
+                self.nested_tosca_templates_with_topology.\
+                    append(nested_template)
+                # Set the substitution toscatemplate for mapped node
+                nodetemplate.substitution_mapped = \
+                    nested_template
+
+    def _parse_nested_templates(self, tasks):
+        '''Parse the nested templates one after the other.'''
+        # Custom definitions resolved by the nested templates, by file
+        custom_defs = {}
+        for fname, nodetemplate in tasks:
+            result = self._parse_nested_template((fname, nodetemplate),
+                                                 custom_defs.get(fname))
+            nested_topology = getattr(result[0], 'topology_template', None)
+            if nested_topology and fname not in custom_defs:
+                nested_defs = nested_topology.custom_defs
+                # Share the types of this template when possible
+                if nested_defs == self.topology_template.custom_defs:
+                    nested_defs = self.topology_template.custom_defs
+                custom_defs[fname] = nested_defs
+            yield result, None
+
+    def _parse_nested_template(self, task, custom_defs=None):
+        '''Parse the template substituting a node template.
+
+        Returns the template, the errors it collected and the validation
+        error it failed with, if any.
+        '''
+        fname, nodetemplate = task
+        parsed_params = self._get_params_for_nested_template(nodetemplate)
+        # The nested template collects its errors in its own context, they
+        # are reported by the caller only if it fails
+        context = ExceptionCollector.push_context()
+        try:
+            nested_template = ToscaTemplate(
+                path=fname, parsed_params=parsed_params,
+                sub_mapped_node_template=nodetemplate,
+                no_required_paras_check=self.no_required_paras_check,
+                import_cache=self.import_cache, custom_defs=custom_defs)
+        except ValidationError as e:
+            log.error(e.message)
+            return None, context.exceptions, e
+        finally:
+            ExceptionCollector.pop_context()
+        return nested_template, context.exceptions, None
+
+    def _get_shared_objects(self):
+        '''Return the objects nested templates parsed apart refer to.
+
+        They are restored as references to the objects of this template,
+        see poolutils.map_in_processes.
+        '''
+        profile = ProfileRegistry.current()
+        custom_defs = self.topology_template.custom_defs or {}
+        return ([self, self.topology_template, self.import_cache,
+                 custom_defs, profile] + list(self.nodetemplates) +
+                list(custom_defs.values()) + list(profile.values()))
 
     def _validate_field(self):
         version = self._tpl_version()
@@ -330,17 +518,21 @@ class ToscaTemplate(object):
                     valid_versions=', '. join(sorted(self.VALID_TEMPLATE_VERSIONS))))
         else:
             if version not in TypeValidation.STANDARD_TEMPLATE_VERSIONS:
-                update_definitions(version)
+                # Templates of standard versions keep the definitions of
+                # the template they are parsed for, if any
+                ProfileRegistry.select(ProfileRegistry.get(version))
 
     def _get_path(self, path):
         if path.lower().endswith('.yaml') or path.lower().endswith('.yml'):
             return path
         elif path.lower().endswith(('.zip', '.csar')):
             # a CSAR archive
-            csar = CSAR(path, self.a_file)
+            csar = CSAR(path, self.a_file, self.import_cache)
             if csar.validate():
-                csar.decompress()
-                self.a_file = True  # the file has been decompressed locally
+                # The files of the CSAR are read from the archive through
+                # the import cache, as if extracted in temp_dir
+                self.a_file = True
+                self.csar = csar
                 return os.path.join(csar.temp_dir, csar.get_main_template())
         else:
             ExceptionCollector.appendException(
@@ -348,6 +540,20 @@ class ToscaTemplate(object):
                            % {'path': path}))
 
     def verify_template(self):
+        exceptions = self._get_validation_error(self.input_path)
+        if exceptions:
+            raise exceptions
+        else:
+            if self.input_path:
+                msg = (_('The input "%(path)s" successfully passed '
+                         'validation.') % {'path': self.input_path})
+            else:
+                msg = _('The pre-parsed input successfully passed validation.')
+
+            log.info(msg)
+
+    def _get_validation_error(self, input_path):
+        '''Return the error reporting the exceptions collected, if any.'''
         if self.no_required_paras_check:
             ExceptionCollector.removeException(
                 MissingRequiredParameterError)
@@ -358,27 +564,18 @@ class ToscaTemplate(object):
             ExceptionCollector.removeException(
                 MissingRequiredOutputError)
 
-        if ExceptionCollector.exceptionsCaught():
-            if self.input_path:
-                exceptions = ValidationError(
-                    message=(_('\nThe input "%(path)s" failed validation with '
-                               'the following error(s): \n\n\t')
-                             % {'path': self.input_path}) +
-                    '\n\t'.join(ExceptionCollector.getExceptionsReport(full=self.verbose)))
-            else:
-                exceptions = ValidationError(
-                    message=_('\nThe pre-parsed input failed validation with '
-                              'the following error(s): \n\n\t') +
-                    '\n\t'.join(ExceptionCollector.getExceptionsReport(full=self.verbose)))
-            raise exceptions
-        else:
-            if self.input_path:
-                msg = (_('The input "%(path)s" successfully passed '
-                         'validation.') % {'path': self.input_path})
-            else:
-                msg = _('The pre-parsed input successfully passed validation.')
-
-            log.info(msg)
+        if not ExceptionCollector.exceptionsCaught():
+            return None
+        report = '\n\t'.join(
+            ExceptionCollector.getExceptionsReport(full=self.verbose))
+        if input_path:
+            return ValidationError(
+                message=(_('\nThe input "%(path)s" failed validation with '
+                           'the following error(s): \n\n\t')
+                         % {'path': input_path}) + report)
+        return ValidationError(
+            message=_('\nThe pre-parsed input failed validation with '
+                      'the following error(s): \n\n\t') + report)
 
     def _is_sub_mapped_node(self, nodetemplate, tosca_tpl):
         """Return True if the nodetemple is substituted."""
@@ -391,6 +588,7 @@ class ToscaTemplate(object):
 
     def _get_params_for_nested_template(self, nodetemplate):
         """Return total params for nested_template."""
+        # Nested templates may change the values of their inputs
         parsed_params = deepcopy(self.parsed_params) \
             if self.parsed_params else {}
         if nodetemplate:
@@ -414,3 +612,89 @@ class ToscaTemplate(object):
         """Return True if the tosca template has nested templates."""
         return self.nested_tosca_templates_with_topology is not None and \
             len(self.nested_tosca_templates_with_topology) >= 1
+
+
+class ValidationRecord(collections.namedtuple(
+        'ValidationRecord', 'section, name, kind, message, exception')):
+    '''An error found by iter_validate.
+
+    section is the template section being parsed when the error was found,
+    None for the top level fields, name the entity in progress if any, kind
+    the exception class name and message the exception text.
+    '''
+
+
+class _ValidationCancelled(BaseException):
+    '''Unwinds a parse whose errors are no longer wanted.
+
+    It does not derive from Exception so that the handlers recovering from
+    template errors let it through.
+    '''
+
+
+def iter_validate(path=None, parsed_params=None, a_file=True,
+                  yaml_dict_tpl=None, no_required_paras_check=False,
+                  fail_fast=False, max_errors=None):
+    '''Validate a template, yielding a ValidationRecord per error found.
+
+    The template is parsed like ToscaTemplate does, in a worker thread that
+    is paused on each error until the caller asks for the next one, so the
+    first error is available as soon as it is found. The parse stops after
+    the first error with fail_fast, after max_errors errors if given, or
+    when the caller stops iterating.
+    '''
+    if fail_fast:
+        max_errors = 1
+    skipped = ()
+    if no_required_paras_check:
+        skipped = (MissingRequiredParameterError, MissingDefaultValueError,
+                   MissingRequiredInputError, MissingRequiredOutputError)
+    records = queue.Queue()
+    resume = queue.Queue()
+
+    def report(error):
+        if isinstance(error, skipped):
+            return
+        context = ExceptionCollector.get_context()
+        records.put(ValidationRecord(context.section, context.node,
+                                     error.__class__.__name__, str(error),
+                                     error))
+        if not resume.get():
+            raise _ValidationCancelled()
+
+    def parse():
+        ExceptionCollector.get_context().listener = report
+        try:
+            ToscaTemplate(path, parsed_params, a_file, yaml_dict_tpl,
+                          no_required_paras_check=no_required_paras_check)
+        except _ValidationCancelled:
+            pass
+        except Exception as error:
+            # Errors raised past the collector end the parse, the summary
+            # of the collected ones was already reported
+            if not (isinstance(error, ValidationError) and
+                    ExceptionCollector.exceptionsCaught()):
+                try:
+                    report(error)
+                except _ValidationCancelled:
+                    pass
+        finally:
+            records.put(None)
+
+    worker = threading.Thread(target=parse, name='tosca-iter-validate')
+    worker.daemon = True
+    worker.start()
+    count = 0
+    try:
+        while True:
+            record = records.get()
+            if record is None:
+                break
+            yield record
+            count += 1
+            if max_errors is not None and count >= max_errors:
+                break
+            resume.put(True)
+    finally:
+        resume.put(False)
+        worker.join()
@@ -11,20 +11,45 @@
 #    under the License.
 
 
+from collections import OrderedDict
+import heapq
+
+from toscaparser.common.exception import DependencyCycleError
+from toscaparser.elements.entity_type import EntityType
+
+
 class ToscaGraph(object):
-    '''Graph of Tosca Node Templates.'''
+    '''Graph of Tosca Node Templates.
+
+    Vertices are keyed by node template name. Every edge goes from the
+    node template holding a requirement to the one fulfilling it and
+    carries the relationship types between the two.
+    '''
+
+    # Relationships whose target has to be deployed before their source
+    ORDERING_RELATIONSHIPS = (EntityType.HOSTEDON, EntityType.DEPENDSON)
+
     def __init__(self, nodetemplates):
         self.nodetemplates = nodetemplates
-        self.vertices = {}
+        self.vertices = OrderedDict()
+        self._targets = {}
+        self._sources = {}
+        self._topological_order = None
         self._create()
 
     def _create_vertex(self, node):
-        if node not in self.vertices:
+        if node.name not in self.vertices:
             self.vertices[node.name] = node
+            self._targets[node.name] = OrderedDict()
+            self._sources[node.name] = OrderedDict()
 
     def _create_edge(self, node1, node2, relationship):
-        if node1 not in self.vertices:
-            self._create_vertex(node1)
+        self._create_vertex(node1)
+        self._create_vertex(node2)
+        self._targets[node1.name].setdefault(node2.name, []).append(
+            relationship)
+        self._sources[node2.name].setdefault(node1.name, []).append(
+            relationship)
         self.vertices[node1.name]._add_next(node2,
                                             relationship)
 
@@ -35,12 +60,103 @@ class ToscaGraph(object):
     def __iter__(self):
         return iter(self.vertices.values())
 
+    def targets(self, node):
+        '''Return the relationship types to the node templates the given
+        one requires, by target name.'''
+        return self._targets[node]
+
+    def sources(self, node):
+        '''Return the relationship types from the node templates requiring
+        the given one, by source name.'''
+        return self._sources[node]
+
     def _create(self):
+        for node in self.nodetemplates:
+            self._create_vertex(node)
         for node in self.nodetemplates:
             relation = node.relationships
             if relation:
                 for rel, nodetpls in relation.items():
-                    for tpl in self.nodetemplates:
-                        if tpl.name == nodetpls.name:
-                            self._create_edge(node, tpl, rel)
-            self._create_vertex(node)
+                    tpl = self.vertices.get(nodetpls.name)
+                    if tpl is not None:
+                        self._create_edge(node, tpl, rel)
+
+    def _is_ordering(self, relationships):
+        for rel in relationships:
+            for rel_type in self.ORDERING_RELATIONSHIPS:
+                if rel.is_derived_from(rel_type):
+                    return True
+        return False
+
+    def topological_order(self):
+        '''Return the node templates in deployment order.
+
+        Every node template comes after the ones it is hosted on or depends
+        on; the others keep the order of the template. Raises
+        DependencyCycleError if no such order exists.
+        '''
+        if self._topological_order is None:
+            requires = dict((name, set(
+                target for target, rels in self._targets[name].items()
+                if self._is_ordering(rels))) for name in self.vertices)
+            required_by = dict((name, []) for name in self.vertices)
+            for name, targets in requires.items():
+                for target in targets:
+                    required_by[target].append(name)
+            pending = dict((name, len(targets))
+                           for name, targets in requires.items())
+            # Take the earliest declared node template first so the order
+            # is stable
+            ready = [(i, name) for i, name in enumerate(self.vertices)
+                     if not pending[name]]
+            position = dict((name, i) for i, name in enumerate(self.vertices))
+            order = []
+            while ready:
+                name = heapq.heappop(ready)[1]
+                order.append(self.vertices[name])
+                for source in required_by[name]:
+                    pending[source] -= 1
+                    if not pending[source]:
+                        heapq.heappush(ready, (position[source], source))
+            if len(order) < len(self.vertices):
+                raise DependencyCycleError(
+                    cycle=' -> '.join('"%s"' % name for name in
+                                      self._find_cycle(requires, pending)))
+            self._topological_order = order
+        return list(self._topological_order)
+
+    @staticmethod
+    def _find_cycle(requires, pending):
+        # Every node template left pending requires another pending one,
+        # so following them from any of those must come back on itself
+        name = next(name for name in sorted(pending) if pending[name])
+        path = []
+        while name not in path:
+            path.append(name)
+            name = sorted(target for target in requires[name]
+                          if pending[target])[0]
+        return path[path.index(name):] + [name]
+
+    def connected_components(self):
+        '''Return the groups of node templates linked by relationships.
+
+        Relationships are followed in both directions. Components and the
+        node templates in them keep the order of the template.
+        '''
+        components = []
+        component_of = {}
+        for name, node in self.vertices.items():
+            if name in component_of:
+                components[component_of[name]].append(node)
+                continue
+            component_of[name] = len(components)
+            components.append([node])
+            pending = [name]
+            while pending:
+                current = pending.pop()
+                for other in list(self._targets[current]) + \
+                        list(self._sources[current]):
+                    if other not in component_of:
+                        component_of[other] = component_of[name]
+                        pending.append(other)
+        return components
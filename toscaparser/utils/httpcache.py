@@ -0,0 +1,230 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import hashlib
+import json
+import logging
+import os
+import six
+import tempfile
+import threading
+import time
+
+from toscaparser.utils.gettextutils import _
+from toscaparser.utils import yamlparser
+
+log = logging.getLogger("tosca-parser")
+
+# Seconds a remote file is used without asking the server whether it changed
+TTL_ENV = 'TOSCA_PARSER_HTTP_CACHE_TTL'
+# Bytes of remote files kept, the least recently used are evicted first
+MAX_SIZE_ENV = 'TOSCA_PARSER_HTTP_CACHE_SIZE'
+# Serve remote files from the cache only, whatever their age
+OFFLINE_ENV = 'TOSCA_PARSER_OFFLINE'
+
+DEFAULT_TTL = 0
+DEFAULT_MAX_SIZE = 100 * 1024 * 1024
+_TRUE_VALUES = ('True', 'true', '1', 'yes')
+
+# Stores and evictions of the threads fetching concurrently are serialized
+_lock = threading.Lock()
+
+
+def get_http_cache():
+    '''Return the cache of remote files configured by the environment.
+
+    Returns None unless a cache directory is set.
+    '''
+    cache_dir = yamlparser.get_cache_dir()
+    if not cache_dir:
+        return None
+    return HTTPCache(os.path.join(cache_dir, 'http'),
+                     float(os.environ.get(TTL_ENV, DEFAULT_TTL)),
+                     int(os.environ.get(MAX_SIZE_ENV, DEFAULT_MAX_SIZE)),
+                     os.environ.get(OFFLINE_ENV) in _TRUE_VALUES)
+
+
+class HTTPCache(object):
+    '''Cache of remote files on disk.
+
+    Contents are stored once under objects/, named by their SHA-256, and
+    every URL has an entry under urls/ holding the digest of its content
+    and the validators sent by the server. An entry is used as is for ttl
+    seconds after it was fetched or revalidated, then it is revalidated
+    with a conditional request. When the contents exceed max_size bytes,
+    the least recently used entries are evicted. Offline, entries are used
+    whatever their age and a missing one is an error.
+    '''
+
+    def __init__(self, directory, ttl=DEFAULT_TTL, max_size=DEFAULT_MAX_SIZE,
+                 offline=False):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_size = max_size
+        self.offline = offline
+
+    def get(self, url, session, **kwargs):
+        '''Return the content of the URL, fetched with session if needed.
+
+        Extra arguments are passed on to session.get.
+        '''
+        import requests
+        entry = self._read_entry(url)
+        content = self._read_object(entry['digest']) if entry else None
+        if content is not None:
+            if self.offline or time.time() - entry['checked'] < self.ttl:
+                self._touch(url)
+                return content
+        elif self.offline:
+            raise requests.exceptions.ConnectionError(
+                _('"%s" is not cached and remote files cannot be fetched '
+                  'offline.') % url)
+
+        headers = {}
+        if content is not None:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        r = session.get(url, headers=headers, **kwargs)
+        if r.status_code == 304 and content is not None:
+            log.debug("Cached %s is still valid", url)
+            entry['checked'] = time.time()
+            with _lock:
+                self._store_entry(url, entry)
+            return content
+        r.raise_for_status()
+        self.put(url, r.content, r.headers.get('ETag'),
+                 r.headers.get('Last-Modified'))
+        return r.content
+
+    def put(self, url, content, etag=None, last_modified=None):
+        '''Store the content of the URL.
+
+        Contents larger than max_size are not stored, they would be
+        evicted at once.
+        '''
+        if len(content) > self.max_size:
+            log.debug("Not caching %s, larger than the cache", url)
+            return
+        digest = hashlib.sha256(content).hexdigest()
+        entry = {'url': url, 'digest': digest, 'etag': etag,
+                 'last_modified': last_modified, 'checked': time.time()}
+        with _lock:
+            try:
+                object_path = self._object_path(digest)
+                if not os.path.isfile(object_path):
+                    self._write(object_path, content)
+            except (IOError, OSError) as e:
+                log.debug("Caching %s failed: %s", url, e)
+                return
+            if self._store_entry(url, entry):
+                self._evict()
+
+    def _store_entry(self, url, entry):
+        try:
+            self._write(self._entry_path(url), json.dumps(entry))
+        except (IOError, OSError) as e:
+            log.debug("Caching %s failed: %s", url, e)
+            return False
+        return True
+
+    def _evict(self):
+        try:
+            self._evict_entries()
+        except (IOError, OSError) as e:
+            # Another process evicted the same files
+            log.debug("Evicting from %s failed: %s", self.directory, e)
+
+    def _evict_entries(self):
+        entries = []
+        for name in os.listdir(os.path.join(self.directory, 'urls')):
+            path = os.path.join(self.directory, 'urls', name)
+            try:
+                with open(path) as f:
+                    digest = json.load(f)['digest']
+                entries.append((os.path.getmtime(path), path, digest))
+            except (IOError, OSError, ValueError, KeyError, TypeError):
+                continue
+        sizes = {}
+        for name in os.listdir(os.path.join(self.directory, 'objects')):
+            sizes[name] = os.path.getsize(
+                os.path.join(self.directory, 'objects', name))
+        # Evict the least recently used entries first
+        entries.sort(reverse=True)
+        kept = set()
+        size = 0
+        for used, path, digest in entries:
+            if digest in kept:
+                continue
+            if digest in sizes and size + sizes[digest] <= self.max_size:
+                kept.add(digest)
+                size += sizes[digest]
+            else:
+                os.remove(path)
+        for digest in set(sizes) - kept:
+            os.remove(self._object_path(digest))
+
+    def _read_entry(self, url):
+        try:
+            with open(self._entry_path(url)) as f:
+                entry = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+        # Entries written by other versions or altered are missed
+        if not isinstance(entry, dict) or \
+                not isinstance(entry.get('digest'), six.string_types) or \
+                not isinstance(entry.get('checked'), (int, float)):
+            return None
+        return entry
+
+    def _read_object(self, digest):
+        try:
+            with open(self._object_path(digest), 'rb') as f:
+                content = f.read()
+        except (IOError, OSError):
+            return None
+        # A truncated or altered file is fetched again
+        if hashlib.sha256(content).hexdigest() == digest:
+            return content
+
+    def _touch(self, url):
+        try:
+            os.utime(self._entry_path(url), None)
+        except OSError:
+            pass
+
+    def _entry_path(self, url):
+        return os.path.join(self.directory, 'urls', hashlib.sha256(
+            url.encode('utf-8')).hexdigest() + '.json')
+
+    def _object_path(self, digest):
+        return os.path.join(self.directory, 'objects', digest)
+
+    @staticmethod
+    def _write(path, content):
+        directory = os.path.dirname(path)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        mode = 'wb' if isinstance(content, bytes) else 'w'
+        f = tempfile.NamedTemporaryFile(mode, dir=directory, delete=False)
+        try:
+            with f:
+                f.write(content)
+            # Concurrent processes may race here, the rename keeps it atomic
+            os.rename(f.name, path)
+        except (IOError, OSError):
+            try:
+                os.remove(f.name)
+            except OSError:
+                pass
+            raise
@@ -0,0 +1,34 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+
+class LazyClassAttribute(object):
+    '''Class attribute computed on first access.
+
+    The decorated function receives the class that defines the attribute
+    and its result replaces the descriptor on that class, so that later
+    lookups from the class, its subclasses and their instances are plain
+    attribute reads.
+    '''
+
+    def __init__(self, func):
+        self.func = func
+        self.name = func.__name__
+        self.__doc__ = func.__doc__
+
+    def __get__(self, instance, owner):
+        for cls in owner.__mro__:
+            if cls.__dict__.get(self.name) is self:
+                break
+        value = self.func(cls)
+        setattr(cls, self.name, value)
+        return value
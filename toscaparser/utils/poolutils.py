@@ -0,0 +1,151 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from collections import OrderedDict
+import io
+import itertools
+import multiprocessing
+import os
+import pickle
+from six.moves import queue
+import threading
+
+# Calls of map_in_processes in progress, by token, inherited by the workers
+_forked_calls = {}
+_tokens = itertools.count()
+
+
+def map_in_threads(function, items, max_workers):
+    '''Call function on every item from a bounded pool of threads.
+
+    Returns an ordered dict of (result, exception) pairs by item, in the
+    order of items. Errors are returned rather than reported, as the
+    threads do not take part in the parse collecting them.
+    '''
+    results = OrderedDict((item, None) for item in items)
+    pending = queue.Queue()
+    for item in results:
+        pending.put(item)
+
+    def work():
+        while True:
+            try:
+                item = pending.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                results[item] = (function(item), None)
+            except Exception as e:
+                results[item] = (None, e)
+
+    workers = [threading.Thread(target=work)
+               for i in range(min(max_workers, len(results)))]
+    for worker in workers:
+        worker.daemon = True
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return results
+
+
+def get_fork_context():
+    '''Return the multiprocessing context forking the workers.
+
+    Returns None on platforms which can not fork.
+    '''
+    if not hasattr(os, 'fork'):
+        return None
+    get_context = getattr(multiprocessing, 'get_context', None)
+    if get_context is None:
+        # Python 2 always forks
+        return multiprocessing
+    return get_context('fork')
+
+
+def map_in_processes(function, items, max_workers, shared=()):
+    '''Call function on every item from a pool of forked processes.
+
+    The workers inherit the memory of this process, so function and items
+    are not sent to them and only the results are sent back. The objects
+    in shared are sent back as references to the objects of this process
+    rather than as copies, so results can keep pointing to them.
+
+    Returns a list of (result, exception) pairs, in the order of items.
+    Requires a platform which can fork, see get_fork_context.
+
+    A worker forked while another thread holds a lock, like the ones of
+    the type registries or of logging, would wait for it forever. When
+    other threads are running, function is called on every item in turn
+    in this process instead.
+    '''
+    if threading.active_count() > 1:
+        return [_call(function, item) for item in items]
+    token = next(_tokens)
+    _forked_calls[token] = (function, items, shared)
+    try:
+        pool = get_fork_context().Pool(min(max_workers, len(items)))
+        try:
+            dumped = pool.map(_call_forked,
+                              [(token, index) for index in range(len(items))])
+        finally:
+            pool.close()
+            pool.join()
+    finally:
+        del _forked_calls[token]
+    return [_SharedUnpickler(io.BytesIO(data), shared).load()
+            for data in dumped]
+
+
+def _call(function, item):
+    try:
+        return function(item), None
+    except Exception as e:
+        return None, e
+
+
+def _call_forked(task):
+    token, index = task
+    function, items, shared = _forked_calls[token]
+    result = _call(function, items[index])
+    shared_ids = dict((id(obj), str(index))
+                      for index, obj in enumerate(shared))
+    try:
+        return _dumps(result, shared_ids)
+    except Exception as e:
+        return _dumps((None, pickle.PicklingError(
+            '%s: %s' % (e.__class__.__name__, e))), shared_ids)
+
+
+def _dumps(obj, shared_ids):
+    data = io.BytesIO()
+    _SharedPickler(data, shared_ids).dump(obj)
+    return data.getvalue()
+
+
+class _SharedPickler(pickle.Pickler):
+
+    def __init__(self, file, shared_ids):
+        pickle.Pickler.__init__(self, file, pickle.HIGHEST_PROTOCOL)
+        self.shared_ids = shared_ids
+
+    def persistent_id(self, obj):
+        return self.shared_ids.get(id(obj))
+
+
+class _SharedUnpickler(pickle.Unpickler):
+
+    def __init__(self, file, shared):
+        pickle.Unpickler.__init__(self, file)
+        self.shared = shared
+
+    def persistent_load(self, pid):
+        return self.shared[int(pid)]
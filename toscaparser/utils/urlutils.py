@@ -14,9 +14,10 @@
 import os
 from six.moves.urllib.parse import urljoin
 from six.moves.urllib.parse import urlparse
+import threading
 from toscaparser.common.exception import ExceptionCollector
 from toscaparser.utils.gettextutils import _
-import requests
+from toscaparser.utils import poolutils
 # try:
 #     # Python 3.x
 #     import urllib.request as urllib2
@@ -25,8 +26,17 @@ import requests
 #     import urllib2
 
 
+_session = None
+_session_lock = threading.Lock()
+
+
 class UrlUtils(object):
 
+    # Seconds to wait for a server to connect and to answer
+    TIMEOUT = 30
+    # Concurrent requests when fetching several URLs
+    MAX_WORKERS = 8
+
     @staticmethod
     def validate_url(path):
         """Validates whether the given path is a URL or not.
@@ -63,8 +73,15 @@ class UrlUtils(object):
         Returns true if the get call returns a 200 response code.
         Otherwise, returns false.
         """
-        # return urllib2.urlopen(url).getcode() == 200
-        r = requests.get(url, proxies=UrlUtils.get_proxies(url))
+        # The content is not needed, ask for the headers only and fall back
+        # to GET for servers not supporting HEAD
+        session = UrlUtils.get_session()
+        r = session.head(url, proxies=UrlUtils.get_proxies(url),
+                         timeout=UrlUtils.TIMEOUT, allow_redirects=True)
+        if r.status_code in (405, 501):
+            r = session.get(url, proxies=UrlUtils.get_proxies(url),
+                            timeout=UrlUtils.TIMEOUT, stream=True)
+            r.close()
         r.raise_for_status()
         return r.status_code == 200
 
@@ -79,9 +96,53 @@ class UrlUtils(object):
             proxies={'no_proxy': o.netloc}
         return proxies
 
+    @staticmethod
+    def get_session():
+        """Return the session shared by all requests.
+
+        Connections to a server are kept open and reused across requests,
+        including the concurrent ones of map_urls.
+        """
+        global _session
+        with _session_lock:
+            if _session is None:
+                import requests
+                session = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(
+                    pool_maxsize=UrlUtils.MAX_WORKERS)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                _session = session
+            return _session
+
     @staticmethod
     def get_url(url):
         """Open the url and return a response object."""
-        r = requests.get(url, proxies=UrlUtils.get_proxies(url))
+        r = UrlUtils.get_session().get(url,
+                                       proxies=UrlUtils.get_proxies(url),
+                                       timeout=UrlUtils.TIMEOUT)
         r.raise_for_status()
         return r
+
+    @staticmethod
+    def get_content(url):
+        """Return the content at the url, through the cache of remote files.
+
+        See toscaparser.utils.httpcache for its configuration.
+        """
+        from toscaparser.utils import httpcache
+        cache = httpcache.get_http_cache()
+        if cache is None:
+            return UrlUtils.get_url(url).content
+        return cache.get(url, UrlUtils.get_session(),
+                         proxies=UrlUtils.get_proxies(url),
+                         timeout=UrlUtils.TIMEOUT)
+
+    @staticmethod
+    def map_urls(function, urls):
+        """Call function on every URL from a bounded pool of threads.
+
+        See poolutils.map_in_threads for the results.
+        """
+        return poolutils.map_in_threads(function, urls,
+                                        UrlUtils.MAX_WORKERS)
@@ -12,9 +12,12 @@
 
 import codecs
 from collections import OrderedDict
+import hashlib
 import os
-import requests
+from six.moves import cPickle as pickle
 from six.moves import urllib
+import sys
+import tempfile
 import yaml
 
 from toscaparser.common.exception import ExceptionCollector
@@ -28,42 +31,94 @@ if hasattr(yaml, 'CSafeLoader'):
 else:
     yaml_loader = yaml.SafeLoader
 
+# Directory of the parsed definition file cache, disabled unless set. The
+# files cached are trusted, the directory must not be writable by others.
+CACHE_DIR_ENV = 'TOSCA_PARSER_CACHE_DIR'
 
-def load_yaml(path, a_file=True):
-    f = None
 
-    try:
-        if a_file:
-            f = codecs.open(path, encoding='utf-8', errors='strict')
+def get_cache_dir():
+    return os.environ.get(CACHE_DIR_ENV) or None
+
+
+def load_yaml(path, a_file=True, cache=False):
+    if cache and a_file:
+        return _load_cached_yaml(path)
+
+    if a_file:
+        with codecs.open(path, encoding='utf-8', errors='strict') as f:
             s = f.read()
-        else:
+    else:
+        s = _get_url_content(path)
+        if s is None:
+            return
+    return yaml.load(s, Loader=yaml_loader)
+
 
-            s = UrlUtils.get_url(path).content
+def _get_url_content(path):
+    # requests is only needed for remote files, import it on first use
+    import requests
+
+    try:
+        return UrlUtils.get_content(path)
 
     except requests.exceptions.Timeout as e:
         msg = (_('Timeout reaching server "%(path)s": Reason is %(reason)s.') %
                {'path': path, 'reason': e})
         ExceptionCollector.appendException(URLException(what=msg))
-        return
 
     except requests.exceptions.ConnectionError as e:
         msg = (_('Error reaching server "%(path)s": Reason is %(reason)s.') %
                {'path': path, 'reason': e})
         ExceptionCollector.appendException(URLException(what=msg))
-        return
 
     except requests.exceptions.HTTPError as e:
         msg = (_('Request error "%(path)s": Reason is %(reason)s.') %
                {'path': path, 'reason': e})
         ExceptionCollector.appendException(URLException(what=msg))
-        return
 
-    except Exception as e:
-        raise
+
+def _load_cached_yaml(path):
+    '''Load a local YAML file through the on-disk cache.
+
+    When a cache directory is set, the parsed content is pickled under it,
+    keyed by the SHA-256 of the file content, so later processes skip YAML
+    parsing as long as the file is unchanged.
+    '''
+    with open(path, 'rb') as f:
+        content = f.read()
+    cache_dir = get_cache_dir()
+    if not cache_dir:
+        return yaml.load(content.decode('utf-8'), Loader=yaml_loader)
+
+    cache_file = os.path.join(cache_dir, '%s-py%d.pickle' % (
+        hashlib.sha256(content).hexdigest(), sys.version_info[0]))
+    try:
+        with open(cache_file, 'rb') as f:
+            return pickle.load(f)
+    except Exception:
+        # Missing or unreadable entry, parse the file again
+        pass
+
+    tpl = yaml.load(content.decode('utf-8'), Loader=yaml_loader)
+    temp_file = None
+    try:
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        with tempfile.NamedTemporaryFile(dir=cache_dir, delete=False) as f:
+            temp_file = f.name
+            pickle.dump(tpl, f, pickle.HIGHEST_PROTOCOL)
+        # Concurrent processes may race here, the rename keeps it atomic
+        os.rename(temp_file, cache_file)
+        temp_file = None
+    except (IOError, OSError):
+        pass
     finally:
-        if f:
-            f.close()
-    return yaml.load(s, Loader=yaml_loader)
+        if temp_file is not None:
+            try:
+                os.remove(temp_file)
+            except OSError:
+                pass
+    return tpl
 
 
 def simple_parse(tmpl_str):